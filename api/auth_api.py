@@ -1,6 +1,6 @@
-import http.client
 import json
 import os
+from brokers.angel_scheduler import angel_connection
 
 def authenticate_broker(clientcode, broker_pin, totp_code):
     """
@@ -9,7 +9,7 @@ def authenticate_broker(clientcode, broker_pin, totp_code):
     api_key = os.getenv('BROKER_API_KEY')
 
     try:
-        conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
+        conn = angel_connection()
         payload = json.dumps({
             "clientcode": clientcode,
             "password": broker_pin,
@@ -0,0 +1,140 @@
+# api/book_cache.py
+
+"""
+Short-TTL, per-user cache for broker read endpoints (order book, trade book,
+positions, holdings, RMS) with single-flight request coalescing.
+
+Concurrent identical fetches share one broker call; the raw response body is
+cached for a few seconds and every caller parses its own copy, so in-place
+mapping in the blueprints never leaks between requests. Entries are owned by
+the broker account (connection ID, else the login's client name) rather than
+by an auth token, so an order placed, modified or cancelled through
+api/order_api.py, by webhook or dashboard, invalidates every cached view of
+that account.
+"""
+
+import json
+import os
+import threading
+
+from cachetools import TTLCache
+
+BOOK_CACHE_TTL = float(os.getenv('BOOK_CACHE_TTL', '3'))
+# How long an owner's invalidation count is kept; must outlast an entry and a fetch
+# started before the invalidation (broker calls time out after ANGEL_CALL_TIMEOUT)
+BOOK_CACHE_GENERATION_TTL = float(os.getenv('BOOK_CACHE_GENERATION_TTL', '60'))
+
+class _InFlight:
+    __slots__ = ('event', 'body', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.body = None
+        self.error = None
+
+def _is_success(body):
+    """Only successful broker responses are worth caching"""
+    try:
+        response = json.loads(body.decode("utf-8"))
+    except (ValueError, AttributeError):
+        return False
+    return isinstance(response, dict) and response.get('status') is True
+
+class BrokerResponseCache:
+    """Per-owner (broker account) response cache with single-flight loading"""
+
+    def __init__(self, ttl=BOOK_CACHE_TTL, max_entries=1024, generation_ttl=BOOK_CACHE_GENERATION_TTL):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (owner, endpoint) -> (generation, body); full caches evict the least recently used
+        # entry (owners that stop polling would accumulate otherwise)
+        self.entries = TTLCache(maxsize=max_entries, ttl=ttl)
+        self.in_flight = {}    # (owner, endpoint) -> _InFlight
+        # owner -> generation, bumped on invalidation; dropped once no entry or fetch can predate it
+        self.generations = TTLCache(maxsize=max_entries, ttl=max(ttl, generation_ttl))
+        self.epoch = 0         # bumped when every owner is invalidated
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def _generation(self, owner):
+        return (self.epoch, self.generations.get(owner, 0))
+
+    def fetch(self, owner, endpoint, loader):
+        """
+        Return the cached body for (owner, endpoint) or load it once
+
+        Args:
+            owner: Cache owner, the broker account (connection ID or login name)
+            endpoint (str): Broker endpoint path
+            loader (callable): Zero-argument function returning the response body bytes
+
+        Returns:
+            bytes: Response body
+        """
+        key = (owner, endpoint)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == self._generation(owner):
+                self.hits += 1
+                return entry[1]
+            flight = self.in_flight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                flight = self.in_flight[key] = _InFlight()
+                generation = self._generation(owner)
+                leader = True
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.body
+
+        try:
+            flight.body = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            cacheable = flight.error is None and _is_success(flight.body)
+            with self._lock:
+                self.in_flight.pop(key, None)
+                # Skip storing if an order invalidated this owner while the fetch was running
+                if cacheable and generation == self._generation(owner):
+                    self.entries[key] = (generation, flight.body)
+            flight.event.set()
+        return flight.body
+
+    def invalidate(self, owner=None):
+        """
+        Drop cached responses for an owner, or for everyone when owner is None
+        (e.g. webhook orders that are not tied to a dashboard session)
+        """
+        with self._lock:
+            if owner is None:
+                self.epoch += 1
+                self.generations.clear()
+                self.entries.clear()
+            else:
+                self.generations[owner] = self.generations.get(owner, 0) + 1
+                for key in [key for key in self.entries if key[0] == owner]:
+                    self.entries.pop(key, None)
+
+    def get_metrics(self):
+        """Hit, miss and coalesced request counters"""
+        with self._lock:
+            return {
+                "ttl_seconds": self.ttl,
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced
+            }
+
+# Global cache shared by the order, dashboard and funds read paths
+book_cache = BrokerResponseCache()
@@ -1,19 +1,20 @@
 # api/funds.py
 
 import os
-import http.client
 import json
+from brokers.angel_scheduler import angel_scheduler
+from api.book_cache import book_cache
 
-def get_margin_data(auth_token, api_key=None):
+def get_margin_data(auth_token, api_key=None, tenant=None):
     """Fetch margin data from the broker's API using the provided auth token and api_key.
     If api_key is not provided, it will try to get it from environment variables.
+    tenant is the broker account (client code) the RMS call is paced under.
     """
     try:
         if api_key is None:
             # Fallback to environment variable if api_key is not provided
             api_key = os.getenv('BROKER_API_KEY')
             
-        conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
         headers = {
             'Authorization': f'Bearer {auth_token}',
             'Content-Type': 'application/json',
@@ -25,10 +26,12 @@ def get_margin_data(auth_token, api_key=None):
             'X-MACAddress': 'MAC_ADDRESS',
             'X-PrivateKey': api_key
         }
-        conn.request("GET", "/rest/secure/angelbroking/user/v1/getRMS", '', headers)
+        def load():
+            res, data = angel_scheduler.request("rms", "GET", "/rest/secure/angelbroking/user/v1/getRMS", '', headers, tenant=tenant)
+            return data
 
-        res = conn.getresponse()
-        data = res.read()
+        # Dashboard tabs polling together share one RMS call per few seconds
+        data = book_cache.fetch(tenant if tenant is not None else auth_token, "/rest/secure/angelbroking/user/v1/getRMS", load)
         margin_data = json.loads(data.decode("utf-8"))
 
         print(f"Margin Data {margin_data}")
@@ -1,12 +1,13 @@
-import http.client
 import json
 import os
-from database.auth_db import get_auth_token
+from database.credential_store import credential_store
 from database.token_db import get_token
 from mapping.transform_data import transform_data , map_product_type, reverse_map_product_type, transform_modify_order_data
+from brokers.angel_scheduler import angel_scheduler
+from api.book_cache import book_cache
 
 
-def get_api_response(endpoint, method="GET", payload='', auth_token=None, api_key=None):
+def get_api_response(endpoint, method="GET", payload='', auth_token=None, api_key=None, endpoint_class="books", use_cache=True, tenant=None):
     # If auth_token and api_key are not provided, try to get them from session
     from flask import session
     
@@ -18,6 +19,8 @@ def get_api_response(endpoint, method="GET", payload='', auth_token=None, api_ke
         if auth_token is None:
             print("ERROR: No AUTH_TOKEN found in session")
             return {"status": "error", "message": "Authentication token not found. Please log in again."}
+        if tenant is None:
+            tenant = session_tenant()
     
     if api_key is None:
         # Try to get from session first
@@ -35,7 +38,6 @@ def get_api_response(endpoint, method="GET", payload='', auth_token=None, api_ke
         return api_key
         
     try:
-        conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
         headers = {
           'Authorization': f'Bearer {auth_token}',
           'Content-Type': 'application/json',
@@ -47,32 +49,82 @@ def get_api_response(endpoint, method="GET", payload='', auth_token=None, api_ke
           'X-MACAddress': 'MAC_ADDRESS',
           'X-PrivateKey': api_key
         }
-        conn.request(method, endpoint, payload, headers)
-        res = conn.getresponse()
-        data = res.read()
+        def load():
+            res, data = angel_scheduler.request(endpoint_class, method, endpoint, payload, headers, tenant=tenant)
+            return data
+
+        if use_cache and method == "GET":
+            # Concurrent dashboard polls for the same book share one broker call
+            data = book_cache.fetch(tenant if tenant is not None else auth_token, endpoint, load)
+        else:
+            data = load()
         return json.loads(data.decode("utf-8"))
     except Exception as e:
         print(f"API Error: {str(e)}")
         return {"status": "error", "message": f"API Connection Error: {str(e)}"}
 
-def get_order_book():
+def get_order_book(use_cache=True, auth_token=None, api_key=None, tenant=None):
     try:
-        return get_api_response("/rest/secure/angelbroking/order/v1/getOrderBook")
+        return get_api_response("/rest/secure/angelbroking/order/v1/getOrderBook", auth_token=auth_token, api_key=api_key, use_cache=use_cache, tenant=tenant)
     except Exception as e:
         print(f"Error in get_order_book: {str(e)}")
         return {"status": "error", "message": str(e)}
 
-def get_trade_book():
-    return get_api_response("/rest/secure/angelbroking/order/v1/getTradeBook")
+def get_trade_book(use_cache=True):
+    return get_api_response("/rest/secure/angelbroking/order/v1/getTradeBook", use_cache=use_cache)
+
+def get_positions(use_cache=True, auth_token=None, api_key=None, tenant=None):
+    return get_api_response("/rest/secure/angelbroking/order/v1/getPosition", auth_token=auth_token, api_key=api_key, use_cache=use_cache, tenant=tenant)
+
+def get_holdings(use_cache=True):
+    return get_api_response("/rest/secure/angelbroking/portfolio/v1/getAllHolding", use_cache=use_cache)
+
+def invalidate_book_cache(tenant):
+    """Drop the cached books of the broker account an order changed, whichever
+    session or token they were fetched with (all accounts when it is unknown)"""
+    book_cache.invalidate(tenant)
+
+def session_tenant():
+    """Broker account of the logged-in session (its Angel client code), else the
+    LOGIN_USERNAME account webhook orders without a session are placed for"""
+    from flask import session
+    return session.get('user') or os.getenv('LOGIN_USERNAME')
+
+def get_order_credentials(credentials=None):
+    """
+    Broker auth token and API key for an order: the routed connection's when given,
+    the session's when logged in, otherwise the webhook account's from the credential
+    store (no DB access once loaded)
 
-def get_positions():
-    return get_api_response("/rest/secure/angelbroking/order/v1/getPosition")
+    Args:
+        credentials (Credentials): Resolved by credential_store.for_api_key for /api/v1 requests
 
-def get_holdings():
-    return get_api_response("/rest/secure/angelbroking/portfolio/v1/getAllHolding")
+    Returns:
+        tuple: (auth_token, api_key, tenant); tenant is the broker account the request is
+            paced, pooled and cached under: the connection ID, else the session/legacy client code
+    """
+    if credentials is not None:
+        return credentials.auth_token, credentials.api_key, credentials.connection_id or session_tenant()
 
-def get_open_position(tradingsymbol, exchange, producttype):
-    positions_data = get_positions()
+    from flask import session
+
+    auth_token = session.get('AUTH_TOKEN')
+    if auth_token is None:
+        credentials = credential_store.for_login(os.getenv('LOGIN_USERNAME'))
+        auth_token = credentials.auth_token if credentials else None
+
+    api_key = session.get('apikey')
+    if api_key is None:
+        api_key = os.getenv('BROKER_API_KEY')
+    return auth_token, api_key, session_tenant()
+
+def get_open_position(tradingsymbol, exchange, producttype, credentials=None):
+    # Order decisions always need live positions, never a cached snapshot
+    if credentials is not None:
+        positions_data = get_positions(use_cache=False, auth_token=credentials.auth_token,
+                                       api_key=credentials.api_key, tenant=credentials.connection_id)
+    else:
+        positions_data = get_positions(use_cache=False)
     net_qty = '0'
 
     if positions_data and positions_data.get('status') and positions_data.get('data'):
@@ -83,18 +135,9 @@ def get_open_position(tradingsymbol, exchange, producttype):
 
     return net_qty
 
-def place_order_api(data):
-    # Get auth token and API key from session if available
-    from flask import session
-    
-    AUTH_TOKEN = session.get('AUTH_TOKEN')  # Changed from 'auth_token' to 'AUTH_TOKEN'
-    if AUTH_TOKEN is None:
-        login_username = os.getenv('LOGIN_USERNAME')
-        AUTH_TOKEN = get_auth_token(login_username)
-    
-    BROKER_API_KEY = session.get('apikey')  # Changed from 'api_key' to 'apikey'
-    if BROKER_API_KEY is None:
-        BROKER_API_KEY = os.getenv('BROKER_API_KEY')
+def place_order_api(data, credentials=None):
+    # Get auth token and API key from the routed connection or the session
+    AUTH_TOKEN, BROKER_API_KEY, tenant = get_order_credentials(credentials)
         
     data['apikey'] = BROKER_API_KEY
     token = get_token(data['symbol'], data['exchange'])
@@ -127,17 +170,16 @@ def place_order_api(data):
     })
 
     print(payload)
-    conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
-    conn.request("POST", "/rest/secure/angelbroking/order/v1/placeOrder", payload, headers)
-    res = conn.getresponse()
-    response_data = json.loads(res.read().decode("utf-8"))
+    res, body = angel_scheduler.request("orders", "POST", "/rest/secure/angelbroking/order/v1/placeOrder", payload, headers, tenant=tenant)
+    response_data = json.loads(body.decode("utf-8"))
+    invalidate_book_cache(tenant)
     if response_data['status'] == True:
         orderid = response_data['data']['orderid']
     else:
         orderid = None
     return res, response_data, orderid
 
-def place_smartorder_api(data):
+def place_smartorder_api(data, credentials=None):
 
     #If no API call is made in this function then res will return None
     res = None
@@ -151,7 +193,7 @@ def place_smartorder_api(data):
     
 
     # Get current open position for the symbol
-    current_position = int(get_open_position(symbol, exchange, map_product_type(product)))
+    current_position = int(get_open_position(symbol, exchange, map_product_type(product), credentials))
 
 
     #print(f"position_size : {position_size}") 
@@ -168,15 +210,15 @@ def place_smartorder_api(data):
         quantity = data['quantity']
         #print(f"action : {action}")
         #print(f"Quantity : {quantity}")
-        res, response, orderid = place_order_api(data)
+        res, response, orderid = place_order_api(data, credentials)
         #print(res)
         #print(response)
         
-        return res , response
+        return res , response, orderid
         
     elif position_size == current_position:
         response = {"status": "success", "message": "No action needed. Position size matches current position."}
-        return res, response  # res remains None as no API call was mad
+        return res, response, None  # res remains None as no API call was mad
    
    
 
@@ -210,7 +252,7 @@ def place_smartorder_api(data):
 
         #print(order_data)
         # Place the order
-        res, response, orderid = place_order_api(order_data)
+        res, response, orderid = place_order_api(order_data, credentials)
         #print(res)
         #print(response)
         
@@ -219,9 +261,13 @@ def place_smartorder_api(data):
 
 
 
-def close_all_positions(current_api_key):
+def close_all_positions(current_api_key, credentials=None):
     # Fetch the current open positions
-    positions_response = get_positions()
+    if credentials is not None:
+        positions_response = get_positions(use_cache=False, auth_token=credentials.auth_token,
+                                           api_key=credentials.api_key, tenant=credentials.connection_id)
+    else:
+        positions_response = get_positions(use_cache=False)
 
     # Check if the positions data is null or empty
     if positions_response['data'] is None or not positions_response['data']:
@@ -253,7 +299,7 @@ def close_all_positions(current_api_key):
             print(place_order_payload)
 
             # Place the order to close the position
-            _, api_response, _ =   place_order_api(place_order_payload)
+            _, api_response, _ =   place_order_api(place_order_payload, credentials)
 
             print(api_response)
             
@@ -262,18 +308,9 @@ def close_all_positions(current_api_key):
     return {'status': 'success', "message": "All Open Positions SquaredOff"}, 200
 
 
-def cancel_order(orderid):
-    # Get auth token and API key from session if available
-    from flask import session
-    
-    AUTH_TOKEN = session.get('AUTH_TOKEN')  # Changed from 'auth_token' to 'AUTH_TOKEN'
-    if AUTH_TOKEN is None:
-        login_username = os.getenv('LOGIN_USERNAME')
-        AUTH_TOKEN = get_auth_token(login_username)
-    
-    api_key = session.get('apikey')  # Changed from 'api_key' to 'apikey'
-    if api_key is None:
-        api_key = os.getenv('BROKER_API_KEY')
+def cancel_order(orderid, credentials=None):
+    # Get auth token and API key from the routed connection or the session
+    AUTH_TOKEN, api_key, tenant = get_order_credentials(credentials)
     
     # Set up the request headers
     headers = {
@@ -294,11 +331,10 @@ def cancel_order(orderid):
         "orderid": orderid,
     })
     
-    # Establish the connection and send the request
-    conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")  # Adjust the URL as necessary
-    conn.request("POST", "/rest/secure/angelbroking/order/v1/cancelOrder", payload, headers)
-    res = conn.getresponse()
-    data = json.loads(res.read().decode("utf-8"))
+    # Send the request through the outbound scheduler (orders take priority over book queries)
+    res, body = angel_scheduler.request("orders", "POST", "/rest/secure/angelbroking/order/v1/cancelOrder", payload, headers, tenant=tenant)
+    data = json.loads(body.decode("utf-8"))
+    invalidate_book_cache(tenant)
     
     # Check if the request was successful
     if data.get("status"):
@@ -309,18 +345,9 @@ def cancel_order(orderid):
         return {"status": "error", "message": data.get("message", "Failed to cancel order")}, res.status
 
 
-def modify_order(data):
-    # Get auth token and API key from session if available
-    from flask import session
-    
-    AUTH_TOKEN = session.get('AUTH_TOKEN')  # Changed from 'auth_token' to 'AUTH_TOKEN'
-    if AUTH_TOKEN is None:
-        login_username = os.getenv('LOGIN_USERNAME')
-        AUTH_TOKEN = get_auth_token(login_username)
-    
-    api_key = session.get('apikey')  # Changed from 'api_key' to 'apikey'
-    if api_key is None:
-        api_key = os.getenv('BROKER_API_KEY')
+def modify_order(data, credentials=None):
+    # Get auth token and API key from the routed connection or the session
+    AUTH_TOKEN, api_key, tenant = get_order_credentials(credentials)
 
     token = get_token(data['symbol'], data['exchange'])
     transformed_data = transform_modify_order_data(data, token)  # You need to implement this function
@@ -338,10 +365,9 @@ def modify_order(data):
     }
     payload = json.dumps(transformed_data)
 
-    conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
-    conn.request("POST", "/rest/secure/angelbroking/order/v1/modifyOrder", payload, headers)
-    res = conn.getresponse()
-    data = json.loads(res.read().decode("utf-8"))
+    res, body = angel_scheduler.request("orders", "POST", "/rest/secure/angelbroking/order/v1/modifyOrder", payload, headers, tenant=tenant)
+    data = json.loads(body.decode("utf-8"))
+    invalidate_book_cache(tenant)
 
     if data.get("status") == "true" or data.get("message") == "SUCCESS":
         return {"status": "success", "orderid": data["data"]["orderid"]}, 200
@@ -350,9 +376,13 @@ def modify_order(data):
 
 
 
-def cancel_all_orders_api(data):
+def cancel_all_orders_api(data, credentials=None):
     # Get the order book
-    order_book_response = get_order_book()
+    if credentials is not None:
+        order_book_response = get_order_book(use_cache=False, auth_token=credentials.auth_token,
+                                             api_key=credentials.api_key, tenant=credentials.connection_id)
+    else:
+        order_book_response = get_order_book(use_cache=False)
     #print(order_book_response)
     if order_book_response['status'] != True:
         return [], []  # Return empty lists indicating failure to retrieve the order book
@@ -367,7 +397,7 @@ def cancel_all_orders_api(data):
     # Cancel the filtered orders
     for order in orders_to_cancel:
         orderid = order['orderid']
-        cancel_response, status_code = cancel_order(orderid)
+        cancel_response, status_code = cancel_order(orderid, credentials)
         if status_code == 200:
             canceled_orders.append(orderid)
         else:
@@ -1,175 +1,251 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from extensions import socketio  # Import SocketIO
-from limiter import limiter  # Import the Limiter instance
-from blueprints.auth import auth_bp 
-from blueprints.dashboard import dashboard_bp
-from blueprints.orders import orders_bp
-from blueprints.search import search_bp
-from blueprints.api_v1 import api_v1_bp
-from blueprints.apikey import api_key_bp
-from blueprints.log import log_bp
-from blueprints.tv_json import tv_json_bp
-from blueprints.core import core_bp  # Import the core blueprint
-from blueprints.admin import admin_bp  # Import the admin blueprint
-from blueprints.protected_example import protected_bp  # Import the protected example blueprint
-from blueprints.brokers import brokers_bp  # Import the brokers blueprint
-
-from database.db import db 
-
-from database.auth_db import init_db as ensure_auth_tables_exists
-from database.master_contract_db import init_db as ensure_master_contract_tables_exists
-from database.apilog_db import init_db as ensure_api_log_tables_exists
-from middleware.session_middleware import session_middleware
-
+from database.db import db
 
 from dotenv import load_dotenv
+import multiprocessing
 import os
+import re
+import time
 
 
 # Load environment variables first
 load_dotenv()
 
-# Initialize Flask application
-app = Flask(__name__)
-app.debug = True
-
-# Set secret key and config BEFORE initializing extensions
-app.secret_key = os.getenv('APP_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-
-# Session configuration for cross-origin requests
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # Allow cookies in cross-origin requests
-app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HTTPS
-app.config['SESSION_COOKIE_HTTPONLY'] = False  # Allow JavaScript access for debugging
-app.config['SESSION_COOKIE_NAME'] = 'session'  # Default session cookie name
-app.config['SESSION_COOKIE_DOMAIN'] = None  # Allow cookies for localhost
-app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour session lifetime
-app.config['SESSION_COOKIE_PATH'] = '/'  # Cookie available for all paths
-
-# Initialize CORS - Allow localhost origins with credentials
-from flask import request
-from flask_cors import CORS
-
-@app.after_request
-def after_request(response):
-    """Add CORS headers manually for better control"""
-    origin = request.headers.get('Origin')
-    
-    # Check if origin is localhost or 127.0.0.1 with any port
-    if origin:
-        import re
-        localhost_pattern = r'^https?://(localhost|127\.0\.0\.1)(:\d+)?/?$'
-        production_origins = [
-            "https://nextjs-frontend-5wsr2khpx-rahuls-projects-4055f2e8.vercel.app",
-            "https://nextjs-frontend-5q9rc7ytw-rahuls-projects-4055f2e8.vercel.app"
-        ]
-        
-        if re.match(localhost_pattern, origin) or origin in production_origins:
-            response.headers['Access-Control-Allow-Origin'] = origin
-            response.headers['Access-Control-Allow-Credentials'] = 'true'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
-            response.headers['Access-Control-Expose-Headers'] = 'Content-Type, Authorization'
-    
-    return response
-
-# Basic CORS setup (the after_request handler will override as needed)
-CORS(app, 
-     origins="*",
-     supports_credentials=False,
-     allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
-     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-     expose_headers=["Content-Type", "Authorization"])
-
-# Initialize SocketIO
-socketio.init_app(app, cors_allowed_origins="*")
-
-# Initialize Flask-Limiter with the app object - disabled for now
-# limiter.init_app(app)
-
-
-# Initialize SQLAlchemy
-db.init_app(app)
-
-# Initialize session middleware
-session_middleware.init_app(app)
-
-# Register the blueprints
-app.register_blueprint(auth_bp)
-app.register_blueprint(dashboard_bp)
-app.register_blueprint(orders_bp)
-app.register_blueprint(search_bp)
-app.register_blueprint(api_v1_bp)
-app.register_blueprint(api_key_bp)
-app.register_blueprint(log_bp)
-app.register_blueprint(tv_json_bp)
-app.register_blueprint(core_bp)  # Register the core blueprint
-app.register_blueprint(admin_bp)  # Admin blueprint enabled
-app.register_blueprint(protected_bp)  # Register the protected example blueprint
-app.register_blueprint(brokers_bp)  # Register the brokers blueprint
-
-
-@app.route('/api/test', methods=['GET', 'OPTIONS'])
-def test_cors():
-    """Simple test endpoint to verify CORS is working"""
-    from flask import jsonify
-    return jsonify({"status": "success", "message": "CORS is working!"})
-
-@app.route('/health')
-def health_check():
-    """Health check endpoint for Vercel"""
-    from flask import jsonify
-    return jsonify({
-        "status": "healthy",
-        "message": "Backend is running on Vercel!",
-        "environment": os.getenv('FLASK_ENV', 'development'),
-        "database": "connected"
-    })
-
-@app.route('/')
-def home():
-    """API documentation endpoint"""
-    from flask import jsonify
-    return jsonify({
-        "message": "TradingBridge Backend API",
-        "status": "running",
-        "version": "1.0.0",
-        "endpoints": {
-            "health": "/health",
-            "auth": "/auth/*",
-            "dashboard": "/dashboard",
-            "orders": "/orderbook, /tradebook, /positions, /holdings",
-            "tradingview": "/tradingview",
-            "search": "/search/*",
-            "api": "/api/v1/*"
-        }
-    })
-
-@app.errorhandler(404)
-def not_found_error(error):
-    return jsonify({'status': 'error', 'message': 'Endpoint not found'}), 404
-
-
-
-# Initialize database tables
-with app.app_context():
-    # Ensure all the tables exist
-    ensure_auth_tables_exists()
-    ensure_master_contract_tables_exists()
-    ensure_api_log_tables_exists()
+# Serverless platforms (Vercel) freeze the process between requests: no background
+# threads, and schema creation belongs in the one-off migration step (python -m database.migrate)
+# (.env sets VERCEL=0 for local development, so the flag is parsed rather than tested for presence)
+IS_SERVERLESS = os.getenv('VERCEL', '').lower() in ('1', 'true') or bool(os.getenv('VERCEL_ENV'))
+
+LOCALHOST_ORIGIN = re.compile(r'^https?://(localhost|127\.0\.0\.1)(:\d+)?/?$')
+PRODUCTION_ORIGINS = [
+    "https://nextjs-frontend-5wsr2khpx-rahuls-projects-4055f2e8.vercel.app",
+    "https://nextjs-frontend-5q9rc7ytw-rahuls-projects-4055f2e8.vercel.app"
+]
+
+
+def register_blueprints(app):
+    """Import and register the blueprints (their modules pull in the database layers)"""
+    from blueprints.auth import auth_bp
+    from blueprints.dashboard import dashboard_bp
+    from blueprints.orders import orders_bp
+    from blueprints.search import search_bp
+    from blueprints.api_v1 import api_v1_bp
+    from blueprints.apikey import api_key_bp
+    from blueprints.log import log_bp
+    from blueprints.tv_json import tv_json_bp
+    from blueprints.core import core_bp  # Import the core blueprint
+    from blueprints.admin import admin_bp  # Import the admin blueprint
+    from blueprints.protected_example import protected_bp  # Import the protected example blueprint
+    from blueprints.brokers import brokers_bp  # Import the brokers blueprint
+    import services.change_feed  # Registers the order/position change feed socket handlers
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(orders_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(api_v1_bp)
+    app.register_blueprint(api_key_bp)
+    app.register_blueprint(log_bp)
+    app.register_blueprint(tv_json_bp)
+    app.register_blueprint(core_bp)  # Register the core blueprint
+    app.register_blueprint(admin_bp)  # Admin blueprint enabled
+    app.register_blueprint(protected_bp)  # Register the protected example blueprint
+    app.register_blueprint(brokers_bp)  # Register the brokers blueprint
+
+
+def register_cors(app):
+    @app.after_request
+    def after_request(response):
+        """Add CORS headers manually for better control"""
+        origin = request.headers.get('Origin')
+
+        # Check if origin is localhost or 127.0.0.1 with any port
+        if origin:
+            if LOCALHOST_ORIGIN.match(origin) or origin in PRODUCTION_ORIGINS:
+                response.headers['Access-Control-Allow-Origin'] = origin
+                response.headers['Access-Control-Allow-Credentials'] = 'true'
+                response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+                response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
+                response.headers['Access-Control-Expose-Headers'] = 'Content-Type, Authorization'
+
+        return response
+
+    # Basic CORS setup (the after_request handler will override as needed)
+    CORS(app,
+         origins="*",
+         supports_credentials=False,
+         allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+         methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+         expose_headers=["Content-Type", "Authorization"])
+
+
+def register_session_teardown(app):
+    """Return each request's scoped-session connections to their pools. Without this every
+    request thread keeps a connection checked out, and concurrent webhook traffic from many
+    tenants exhausts the (default 5 + 10) master contract pool"""
+    from database import auth_db, master_contract_db
+
+    @app.teardown_appcontext
+    def remove_db_sessions(exception=None):
+        auth_db.db_session.remove()
+        master_contract_db.db_session.remove()
+
+
+def register_routes(app):
+    @app.route('/api/test', methods=['GET', 'OPTIONS'])
+    def test_cors():
+        """Simple test endpoint to verify CORS is working"""
+        return jsonify({"status": "success", "message": "CORS is working!"})
+
+    @app.route('/health')
+    def health_check():
+        """Health check endpoint for Vercel"""
+        return jsonify({
+            "status": "healthy",
+            "message": "Backend is running on Vercel!",
+            "environment": os.getenv('FLASK_ENV', 'development'),
+            "database": "connected",
+            "startup_ms": app.config.get('STARTUP_TIMINGS')
+        })
+
+    @app.route('/')
+    def home():
+        """API documentation endpoint"""
+        return jsonify({
+            "message": "TradingBridge Backend API",
+            "status": "running",
+            "version": "1.0.0",
+            "endpoints": {
+                "health": "/health",
+                "auth": "/auth/*",
+                "dashboard": "/dashboard",
+                "orders": "/orderbook, /tradebook, /positions, /holdings",
+                "tradingview": "/tradingview",
+                "search": "/search/*",
+                "api": "/api/v1/*"
+            }
+        })
+
+    @app.errorhandler(404)
+    def not_found_error(error):
+        return jsonify({'status': 'error', 'message': 'Endpoint not found'}), 404
+
+
+def create_app(create_tables=None, start_background_tasks=None):
+    """
+    Build the Flask application
+
+    Args:
+        create_tables (bool): Run the schema migration at startup. Defaults to the
+            AUTO_CREATE_TABLES env var, which is on locally and off on serverless
+            unless the database is an (ephemeral) SQLite file
+        start_background_tasks (bool): Start the session cleanup, token refresh and
+            contract maintenance threads. Defaults to off on serverless
+
+    Returns:
+        Flask: The configured application; per-phase startup times in ms are kept in
+            app.config['STARTUP_TIMINGS']
+    """
+    timings = {}
+    started = phase_start = time.perf_counter()
+
+    def mark(phase):
+        nonlocal phase_start
+        now = time.perf_counter()
+        timings[phase] = round((now - phase_start) * 1000, 1)
+        phase_start = now
+
+    if create_tables is None:
+        # An ephemeral SQLite file under /tmp starts empty on every instance, so it still needs create_all
+        ephemeral_db = (os.getenv('DATABASE_URL') or 'sqlite').startswith('sqlite')
+        default = 'true' if not IS_SERVERLESS or ephemeral_db else 'false'
+        create_tables = os.getenv('AUTO_CREATE_TABLES', default).lower() == 'true'
+    if start_background_tasks is None:
+        # Pool workers started with spawn (see utils.password_hasher) import the main module
+        # again, named before the import runs; they must not run the app's background threads
+        start_background_tasks = not IS_SERVERLESS and multiprocessing.current_process().name == 'MainProcess'
+
+    # Initialize Flask application
+    app = Flask(__name__)
+    app.debug = True
+
+    # Set secret key and config BEFORE initializing extensions
+    app.secret_key = os.getenv('APP_KEY')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+
+    # Session configuration for cross-origin requests
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # Allow cookies in cross-origin requests
+    app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HTTPS
+    app.config['SESSION_COOKIE_HTTPONLY'] = False  # Allow JavaScript access for debugging
+    app.config['SESSION_COOKIE_NAME'] = 'session'  # Default session cookie name
+    app.config['SESSION_COOKIE_DOMAIN'] = None  # Allow cookies for localhost
+    app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour session lifetime
+    app.config['SESSION_COOKIE_PATH'] = '/'  # Cookie available for all paths
+
+    register_cors(app)
+
+    # Initialize SocketIO
+    socketio.init_app(app, cors_allowed_origins="*")
+
+    # Initialize Flask-Limiter with the app object - disabled for now
+    # limiter.init_app(app)
+
+    # Initialize SQLAlchemy
+    db.init_app(app)
+    mark('extensions')
+
+    # Initialize session middleware
+    from middleware.session_middleware import session_middleware
+    session_middleware.init_app(app, start_cleanup=start_background_tasks)
+    if start_background_tasks:
+        from services.token_refresh import token_refresh_scheduler
+        from services.contract_maintenance import contract_maintenance
+        token_refresh_scheduler.start()
+        contract_maintenance.start()
+    mark('middleware')
+
+    # Map the last published scrip snapshot so symbol lookups are warm from the first request,
+    # and follow the snapshots other workers publish
+    from database.scrip_snapshot import scrip_snapshot
+    scrip_snapshot.load()
+
+    @app.before_request
+    def follow_scrip_snapshot():
+        scrip_snapshot.check()
+    mark('scrip_snapshot')
+
+    register_blueprints(app)
+    register_session_teardown(app)
+    register_routes(app)
+    mark('blueprints')
+
+    if create_tables:
+        from database.migrate import run_migrations
+        with app.app_context():
+            run_migrations()
+        mark('create_tables')
+
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+    app.config['STARTUP_TIMINGS'] = timings
+    print(f"App created in {timings['total']} ms: {timings}")
+    return app
+
+
+app = create_app()
 
 # For Vercel deployment
 app_instance = app
 
 if __name__ == '__main__':
-    
+
     # Setup ngrok for local development
     # Check if NGROK_ALLOW is set to 'TRUE' in the environment
     if os.getenv('NGROK_ALLOW') == 'TRUE':
         # Setup ngrok if allowed
-        from pyngrok import ngrok 
-        
+        from pyngrok import ngrok
+
         public_url = ngrok.connect(name='flask').public_url  # Assuming Flask runs on the default port 5000
         print(" * ngrok URL: " + public_url + " *")
     else:
@@ -0,0 +1,306 @@
+# benchmarks/angel_mock_server.py
+
+"""
+Local Angel One SmartAPI stand-in for load and latency benchmarks.
+
+Implements the endpoints the app calls (login, placeOrder, modifyOrder,
+cancelOrder, getOrderBook, getTradeBook, getPosition, getAllHolding, getRMS)
+with the same response envelope as the real API. Orders are kept in memory per
+bearer token; every order fills immediately at its limit price (or 100.0 for
+market orders) and updates the positions book.
+
+Latency, error injection and per-endpoint rate limits are configurable, so the
+scheduler and book cache can be exercised reproducibly.
+
+Usage:
+    python benchmarks/angel_mock_server.py [--port 8911] [--latency-ms 40] [--jitter-ms 10]
+                                           [--error-rate 0.0] [--no-rate-limits] [--seed-orders 0]
+
+Then start the app with:
+    ANGEL_API_HOST=127.0.0.1:8911 ANGEL_API_SCHEME=http python app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SECURE = "/rest/secure/angelbroking"
+
+# Per-endpoint requests/second, mirroring the SmartAPI rate limit table
+RATE_LIMITS = {
+    "/rest/auth/angelbroking/user/v1/loginByPassword": 1,
+    SECURE + "/order/v1/placeOrder": 20,
+    SECURE + "/order/v1/modifyOrder": 20,
+    SECURE + "/order/v1/cancelOrder": 20,
+    SECURE + "/order/v1/getOrderBook": 1,
+    SECURE + "/order/v1/getTradeBook": 1,
+    SECURE + "/order/v1/getPosition": 1,
+    SECURE + "/portfolio/v1/getAllHolding": 1,
+    SECURE + "/user/v1/getRMS": 2,
+}
+
+
+def envelope(data, status=True, message="SUCCESS", errorcode=""):
+    return {"status": status, "message": message, "errorcode": errorcode, "data": data}
+
+
+class MockAccount:
+    """In-memory order, trade and position books for one bearer token"""
+
+    def __init__(self, seed_orders=0):
+        self.orders = {}
+        self.positions = {}
+        self.next_id = 240000000
+        for i in range(seed_orders):
+            self.place({
+                "tradingsymbol": f"SYM{i % 500}-EQ", "symboltoken": str(10000 + i % 500),
+                "exchange": "NSE", "transactiontype": "BUY" if i % 2 else "SELL",
+                "ordertype": "LIMIT", "producttype": "INTRADAY", "price": "100", "quantity": "1"
+            })
+
+    def place(self, order):
+        self.next_id += 1
+        orderid = str(self.next_id)
+        price = float(order.get("price") or 0) or 100.0
+        quantity = int(order.get("quantity") or 0)
+        row = {
+            "orderid": orderid,
+            "variety": order.get("variety", "NORMAL"),
+            "tradingsymbol": order.get("tradingsymbol"),
+            "symboltoken": order.get("symboltoken"),
+            "exchange": order.get("exchange"),
+            "transactiontype": order.get("transactiontype"),
+            "ordertype": order.get("ordertype", "MARKET"),
+            "producttype": order.get("producttype", "INTRADAY"),
+            "duration": order.get("duration", "DAY"),
+            "price": price,
+            "triggerprice": float(order.get("triggerprice") or 0),
+            "quantity": str(quantity),
+            "status": "complete",
+            "orderstatus": "complete",
+            "updatetime": time.strftime("%d-%b-%Y %H:%M:%S"),
+            "filltime": time.strftime("%H:%M:%S"),
+            "fillprice": price,
+            "tradevalue": price * quantity,
+        }
+        self.orders[orderid] = row
+
+        key = (row["tradingsymbol"], row["exchange"], row["producttype"])
+        position = self.positions.setdefault(key, {
+            "tradingsymbol": row["tradingsymbol"], "symboltoken": row["symboltoken"],
+            "exchange": row["exchange"], "producttype": row["producttype"],
+            "netqty": "0", "quantity": 0, "avgnetprice": price
+        })
+        net = int(position["netqty"]) + (quantity if row["transactiontype"] == "BUY" else -quantity)
+        position["netqty"] = str(net)
+        position["quantity"] = net
+        return orderid
+
+    def modify(self, order):
+        row = self.orders.get(order.get("orderid"))
+        if row is None:
+            return None
+        for field in ("price", "quantity", "ordertype", "producttype", "triggerprice"):
+            if field in order:
+                row[field] = order[field]
+        row["updatetime"] = time.strftime("%d-%b-%Y %H:%M:%S")
+        return row["orderid"]
+
+    def cancel(self, orderid):
+        row = self.orders.get(orderid)
+        if row is None:
+            return None
+        row["status"] = row["orderstatus"] = "cancelled"
+        return orderid
+
+
+class MockBroker:
+    """Shared state and behaviour knobs for the request handler"""
+
+    def __init__(self, latency_ms=40, jitter_ms=10, error_rate=0.0, rate_limits=True, seed_orders=0):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.rate_limits = dict(RATE_LIMITS) if rate_limits else {}
+        self.seed_orders = seed_orders
+        self.accounts = {}
+        self.windows = {}  # (token, endpoint) -> (second, count)
+        self.stats = {"requests": 0, "throttled": 0, "injected_errors": 0}
+        self.lock = threading.Lock()
+
+    def account(self, token):
+        with self.lock:
+            account = self.accounts.get(token)
+            if account is None:
+                account = self.accounts[token] = MockAccount(self.seed_orders)
+            return account
+
+    def throttled(self, token, endpoint):
+        limit = self.rate_limits.get(endpoint)
+        if not limit:
+            return False
+        second = int(time.monotonic())
+        with self.lock:
+            window, count = self.windows.get((token, endpoint), (second, 0))
+            if window != second:
+                window, count = second, 0
+            self.windows[(token, endpoint)] = (window, count + 1)
+            return count >= limit
+
+    def handle(self, method, path, token, body):
+        """Return (http status, response dict) for one request"""
+        with self.lock:
+            self.stats["requests"] += 1
+
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        if self.throttled(token, path):
+            with self.lock:
+                self.stats["throttled"] += 1
+            return 403, envelope(None, False, "Access denied because of exceeding access rate", "AB1019")
+
+        if self.error_rate and random.random() < self.error_rate:
+            with self.lock:
+                self.stats["injected_errors"] += 1
+            return 200, envelope(None, False, "Something Went Wrong, Please Try After Sometime", "AB1004")
+
+        if path == "/rest/auth/angelbroking/user/v1/loginByPassword":
+            client = body.get("clientcode", "MOCK")
+            return 200, envelope({
+                "jwtToken": f"mock-jwt-{client}",
+                "refreshToken": f"mock-refresh-{client}",
+                "feedToken": f"mock-feed-{client}"
+            })
+
+        if path == "/rest/auth/angelbroking/jwt/v1/generateTokens":
+            refresh = body.get("refreshToken") or ""
+            if not refresh.startswith("mock-refresh-"):
+                return 200, envelope(None, False, "Invalid Refresh Token", "AB8051")
+            client = refresh[len("mock-refresh-"):]
+            with self.lock:
+                self.stats["token_refreshes"] = self.stats.get("token_refreshes", 0) + 1
+            return 200, envelope({
+                "jwtToken": f"mock-jwt-{client}",
+                "refreshToken": refresh,
+                "feedToken": f"mock-feed-{client}"
+            })
+
+        if not path.startswith(SECURE):
+            return 404, envelope(None, False, "Invalid endpoint", "AB1000")
+        if not token:
+            return 401, envelope(None, False, "Invalid Token", "AG8001")
+
+        account = self.account(token)
+        with self.lock:
+            if path == SECURE + "/order/v1/placeOrder":
+                orderid = account.place(body)
+                return 200, envelope({"script": body.get("tradingsymbol"), "orderid": orderid})
+            if path == SECURE + "/order/v1/modifyOrder":
+                orderid = account.modify(body)
+                if orderid is None:
+                    return 200, envelope(None, False, "Invalid Order Id", "AB2001")
+                return 200, envelope({"orderid": orderid})
+            if path == SECURE + "/order/v1/cancelOrder":
+                orderid = account.cancel(body.get("orderid"))
+                if orderid is None:
+                    return 200, envelope(None, False, "Invalid Order Id", "AB2001")
+                return 200, envelope({"orderid": orderid})
+            if path == SECURE + "/order/v1/getOrderBook":
+                return 200, envelope(list(account.orders.values()) or None)
+            if path == SECURE + "/order/v1/getTradeBook":
+                trades = [row for row in account.orders.values() if row["status"] == "complete"]
+                return 200, envelope(trades or None)
+            if path == SECURE + "/order/v1/getPosition":
+                return 200, envelope(list(account.positions.values()) or None)
+            if path == SECURE + "/portfolio/v1/getAllHolding":
+                return 200, envelope({"holdings": [], "totalholding": {
+                    "totalholdingvalue": 0, "totalinvvalue": 0, "totalprofitandloss": 0, "totalpnlpercentage": 0}})
+            if path == SECURE + "/user/v1/getRMS":
+                return 200, envelope({"net": "100000.00", "availablecash": "100000.00", "utiliseddebits": "0.00",
+                                      "m2munrealized": "0.00", "m2mrealized": "0.00"})
+        return 404, envelope(None, False, "Invalid endpoint", "AB1000")
+
+
+def make_handler(broker):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out as separate writes; with Nagle on, a keep-alive client
+        # would wait out its delayed ACK (~40 ms) on every reused connection
+        disable_nagle_algorithm = True
+
+        def _dispatch(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                body = {}
+            token = (self.headers.get("Authorization") or "").replace("Bearer ", "", 1)
+            status, response = broker.handle(method, self.path, token, body)
+            payload = json.dumps(response).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog (5) resets connections when many tenants connect at once
+    request_queue_size = 256
+
+
+def start_server(port=8911, host="127.0.0.1", **options):
+    """
+    Start the mock broker in a background thread
+
+    Returns:
+        tuple: (MockHTTPServer, MockBroker)
+    """
+    broker = MockBroker(**options)
+    server = MockHTTPServer((host, port), make_handler(broker))
+    threading.Thread(target=server.serve_forever, name="angel-mock", daemon=True).start()
+    return server, broker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Angel One SmartAPI stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-rate-limits", action="store_true")
+    parser.add_argument("--seed-orders", type=int, default=0)
+    args = parser.parse_args()
+
+    server, broker = start_server(args.port, args.host, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                  error_rate=args.error_rate, rate_limits=not args.no_rate_limits,
+                                  seed_orders=args.seed_orders)
+    print(f"Mock Angel One API listening on http://{args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"Mock broker stats: {broker.stats}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# benchmarks/bench_broker_path.py
+
+"""
+End-to-end benchmark of the broker path against the local Angel One stand-in.
+
+Starts benchmarks/angel_mock_server.py in-process, points the app at it
+(ANGEL_API_HOST / ANGEL_API_SCHEME), seeds a throwaway SQLite database with a
+webhook user, then drives the Flask app through its test client:
+
+    placeorder  POST /api/v1/placeorder          (webhook order path)
+    orderbook   GET  /orderbook                  (dashboard read path, book cache)
+    positions   GET  /positions
+
+Each scenario runs at every concurrency level and reports throughput, latency
+percentiles and how many calls actually reached the broker.
+
+Usage:
+    python benchmarks/bench_broker_path.py [--requests 200] [--concurrency 1,4,16]
+                                           [--latency-ms 40] [--error-rate 0] [--no-rate-limits]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.angel_mock_server import start_server
+
+BENCH_USER = "benchuser"
+BENCH_APIKEY = "bench-app-key"
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def configure_environment(port, database_url=None):
+    """Must run before the app is imported: host, credentials and the benchmark database"""
+    os.environ["ANGEL_API_HOST"] = f"127.0.0.1:{port}"
+    os.environ["ANGEL_API_SCHEME"] = "http"
+    os.environ["LOGIN_USERNAME"] = BENCH_USER
+    os.environ.setdefault("BROKER_API_KEY", "bench-broker-key")
+    # Never fall back to the configured (possibly production) database; use an explicit
+    # URL or a throwaway SQLite file
+    os.environ["DATABASE_URL"] = database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="tm-bench-"), "bench.db")
+
+
+def seed_database():
+    from database.auth_db import upsert_api_key, upsert_auth
+    upsert_api_key(BENCH_USER, BENCH_APIKEY)
+    upsert_auth(BENCH_USER, f"mock-jwt-{BENCH_USER}")
+
+
+def make_clients(app, count):
+    clients = []
+    for _ in range(count):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["logged_in"] = True
+            sess["user"] = BENCH_USER
+            sess["user_id"] = BENCH_USER
+            sess["AUTH_TOKEN"] = f"mock-jwt-{BENCH_USER}"
+            sess["apikey"] = os.environ["BROKER_API_KEY"]
+        clients.append(client)
+    return clients
+
+
+SCENARIOS = {
+    "placeorder": lambda client: client.post("/api/v1/placeorder", json={
+        "apikey": BENCH_APIKEY, "strategy": "bench", "exchange": "NSE", "symbol": "SBIN",
+        "action": "BUY", "product": "MIS", "pricetype": "MARKET", "quantity": "1"
+    }),
+    "orderbook": lambda client: client.get("/orderbook", headers={"Accept": "application/json"}),
+    "positions": lambda client: client.get("/positions", headers={"Accept": "application/json"}),
+}
+
+
+def run_scenario(clients, request, total):
+    """Spread `total` requests across the clients' threads; return (elapsed, latencies, failures)"""
+    latencies = []
+    failures = [0]
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker(client):
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            response = request(client)
+            elapsed = time.perf_counter() - start
+            body = response.get_json(silent=True)
+            with lock:
+                latencies.append(elapsed)
+                # Some endpoints (e.g. /search/suggestions) return a bare list
+                if response.status_code != 200 or (isinstance(body, dict) and body.get("status") == "error"):
+                    failures[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies, failures[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-rate-limits", action="store_true")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    args = parser.parse_args()
+
+    server, broker = start_server(args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                  error_rate=args.error_rate, rate_limits=not args.no_rate_limits)
+    configure_environment(args.port)
+
+    # The app logs every request; keep that out of the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+        seed_database()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    print(f"Mock broker latency {args.latency_ms} ms +/- {args.jitter_ms} ms, error rate {args.error_rate}, "
+          f"rate limits {'off' if args.no_rate_limits else 'on'}, {args.requests} requests per run")
+    print(f"{'scenario':<11} {'conc':>4} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'fail':>5} {'broker calls':>12} {'throttled':>9}")
+
+    for name in args.scenarios.split(","):
+        request = SCENARIOS[name]
+        for level in levels:
+            clients = make_clients(app, level)
+            before = dict(broker.stats)
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed, latencies, failures = run_scenario(clients, request, args.requests)
+            calls = broker.stats["requests"] - before["requests"]
+            throttled = broker.stats["throttled"] - before["throttled"]
+            print(f"{name:<11} {level:>4} {len(latencies) / elapsed:8.1f} "
+                  f"{percentile(latencies, 50) * 1000:8.1f} {percentile(latencies, 90) * 1000:8.1f} "
+                  f"{percentile(latencies, 99) * 1000:8.1f} {failures:>5} {calls:>12} {throttled:>9}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
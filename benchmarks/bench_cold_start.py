@@ -0,0 +1,86 @@
+# benchmarks/bench_cold_start.py
+
+"""
+Cold start report for the serverless entry point (api/index.py).
+
+Imports api.index in fresh interpreters with `python -X importtime`, then
+prints the wall time, the app factory's phase timings and an import-time
+breakdown grouped by top-level package.
+
+Usage:
+    python benchmarks/bench_cold_start.py [runs] [--database-url URL]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+FIRST_PARTY = {'app', 'api', 'blueprints', 'database', 'services', 'utils', 'middleware', 'mapping',
+               'brokers', 'extensions', 'limiter'}
+
+
+def cold_import(env):
+    """Import api.index once in a new interpreter; return (wall seconds, stdout, stderr)"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import api.index'],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return elapsed, result.stdout, result.stderr
+
+
+def breakdown(stderr):
+    """Sum self time (us) per top-level package"""
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            totals[match.group(4).split('.')[0]] += int(match.group(1))
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start report for api/index.py")
+    parser.add_argument('runs', nargs='?', type=int, default=5)
+    parser.add_argument('--database-url', default=None, help="Defaults to a throwaway SQLite file")
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='tm-cold-'), 'cold.db')
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+
+    # Warm the OS file cache and bytecode once, then measure
+    cold_import(env)
+    walls, totals, phases = [], defaultdict(int), None
+    for _ in range(args.runs):
+        wall, stdout, stderr = cold_import(env)
+        walls.append(wall)
+        for package, micros in breakdown(stderr).items():
+            totals[package] += micros
+        phases = next((line for line in stdout.splitlines() if line.startswith('App created in')), phases)
+
+    walls.sort()
+    print(f"api.index cold import over {args.runs} runs: median {walls[len(walls) // 2] * 1000:.0f} ms, "
+          f"best {walls[0] * 1000:.0f} ms (includes interpreter start)")
+    if phases:
+        print(phases)
+
+    print(f"\nImport self time by top-level package (mean per run):")
+    grand = sum(totals.values()) or 1
+    for package, micros in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        tag = ' (app)' if package in FIRST_PARTY else ''
+        print(f"  {package + tag:<28} {micros / args.runs / 1000:8.1f} ms  {micros / grand * 100:5.1f}%")
+    print(f"  {'total':<28} {grand / args.runs / 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
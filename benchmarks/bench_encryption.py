@@ -0,0 +1,44 @@
+# benchmarks/bench_encryption.py
+
+"""
+Benchmark: credential crypto setup per process.
+
+Key setup: PBKDF2 derivation per process vs a warm on-disk key cache
+(ENCRYPTION_KEY_CACHE_DIR), each measured in a fresh interpreter.
+
+Usage:
+    python benchmarks/bench_encryption.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KEY_SETUP = (
+    "import time; s = time.perf_counter(); "
+    "from utils.encryption import EncryptionService; EncryptionService().cipher; "
+    "print(time.perf_counter() - s)"
+)
+
+
+def key_setup_seconds(env):
+    output = subprocess.check_output([sys.executable, '-c', KEY_SETUP], cwd=ROOT, env=env, text=True)
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    env = dict(os.environ)
+    env.pop('ENCRYPTION_KEY', None)
+    env.pop('ENCRYPTION_KEY_CACHE_DIR', None)
+    cold = min(key_setup_seconds(env) for _ in range(3))
+    env['ENCRYPTION_KEY_CACHE_DIR'] = tempfile.mkdtemp(prefix='tm-keycache-')
+    key_setup_seconds(env)  # populate the cache
+    warm = min(key_setup_seconds(env) for _ in range(3))
+    print(f"Key setup per process (incl. import): PBKDF2 {cold * 1000:7.2f} ms   disk cache {warm * 1000:7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
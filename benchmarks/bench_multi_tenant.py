@@ -0,0 +1,106 @@
+# benchmarks/bench_multi_tenant.py
+
+"""
+Benchmark: many traders placing webhook orders through one deployment.
+
+Seeds N users, each with a platform API key and an active Angel One broker
+connection, then fires /api/v1/placeorder for all of them concurrently
+against the local Angel One stand-in with its per-account rate limits on.
+Reports throughput, latency, broker throttling, how orders spread across
+the accounts and keep-alive connection reuse.
+
+Usage:
+    python benchmarks/bench_multi_tenant.py [--tenants 50] [--orders-per-tenant 10] [--concurrency 16]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_broker_path import configure_environment, percentile, run_scenario
+from benchmarks.angel_mock_server import start_server
+
+
+def seed_tenants(count):
+    """Create `count` users with API keys, broker connections and tokens; return their API keys"""
+    from database.auth_db import create_broker_connection, store_broker_tokens, upsert_api_key
+    from utils.encryption import encryption_service
+
+    api_keys = []
+    for index in range(1, count + 1):
+        client_code = f"T{index:04d}"
+        result = create_broker_connection(
+            index, "angel", client_code,
+            encrypted_credentials=encryption_service.encrypt_credentials({"client_id": client_code, "api_key": f"key-{client_code}"})
+        )
+        store_broker_tokens(result["connection_id"], f"mock-jwt-{client_code}", f"mock-refresh-{client_code}",
+                            f"mock-feed-{client_code}", datetime.now() + timedelta(hours=8))
+        api_key = f"tenant-key-{index}"
+        upsert_api_key(str(index), api_key)
+        api_keys.append(api_key)
+    return api_keys
+
+
+def seed_symbol():
+    from database.master_contract_db import SymToken, db_session
+    db_session.add(SymToken(symbol="SBIN", brsymbol="SBIN-EQ", name="SBIN Ltd", exchange="NSE", brexchange="NSE",
+                            token="3045", expiry="", strike=0.0, lotsize=1, instrumenttype="", tick_size=0.05))
+    db_session.commit()
+    db_session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-tenant webhook order benchmark")
+    parser.add_argument("--tenants", type=int, default=50)
+    parser.add_argument("--orders-per-tenant", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8913)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    args = parser.parse_args()
+
+    configure_environment(args.port)
+    server, broker = start_server(args.port, latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 4)
+
+    from app import app
+    from brokers.angel_scheduler import angel_scheduler
+    from database.credential_store import credential_store
+    seed_symbol()
+    api_keys = seed_tenants(args.tenants)
+
+    clients = [app.test_client() for _ in range(args.concurrency)]
+    counter = [0]
+
+    def place(client):
+        counter[0] += 1
+        api_key = api_keys[counter[0] % len(api_keys)]
+        return client.post("/api/v1/placeorder", json={
+            "apikey": api_key, "strategy": "bench", "exchange": "NSE", "symbol": "SBIN",
+            "action": "BUY", "product": "MIS", "pricetype": "MARKET", "quantity": "1"
+        })
+
+    # First order per tenant: API key route, credential load and a new broker connection
+    elapsed, latencies, failures = run_scenario(clients, place, args.tenants)
+    print(f"{args.tenants} tenants x {args.orders_per_tenant} orders, concurrency {args.concurrency}, "
+          f"broker latency {args.latency_ms:.0f} ms")
+    print(f"  first order  {args.tenants / elapsed:8.1f} orders/s   p50 {percentile(latencies, 50) * 1000:6.1f} ms   "
+          f"p99 {percentile(latencies, 99) * 1000:6.1f} ms   failures {failures}")
+
+    total = args.tenants * (args.orders_per_tenant - 1)
+    elapsed, latencies, failures = run_scenario(clients, place, total)
+    print(f"  steady state {total / elapsed:8.1f} orders/s   p50 {percentile(latencies, 50) * 1000:6.1f} ms   "
+          f"p99 {percentile(latencies, 99) * 1000:6.1f} ms   failures {failures}")
+
+    orders = {token: len(account.orders) for token, account in broker.accounts.items()}
+    print(f"  broker: {broker.stats['requests']} requests, {broker.stats['throttled']} throttled, "
+          f"{len(orders)} accounts, orders per account {min(orders.values(), default=0)}-{max(orders.values(), default=0)}")
+    print(f"  client pools: {angel_scheduler.get_pool_metrics()}")
+    print(f"  credential store: {credential_store.get_metrics()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# benchmarks/bench_option_chain.py
+
+"""
+Benchmark: resolving option legs from the scrip master.
+
+Seeds a synthetic scrip master shaped like Angel One's (weekly index
+options, monthly stock options, equities) into a throwaway SQLite database,
+then compares resolving strategy legs with one symtoken query per leg against
+the in-memory option chain index, and times the index build. Finding an
+underlying's nearest futures expiry is timed three ways: parsing expiry
+strings in Python, a seek on idx_name_type_expiry, and the expiry calendar.
+
+Usage:
+    python benchmarks/bench_option_chain.py [--stocks 180] [--strikes 200] [--lookups 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def upcoming_weekdays(weekday, count, start=None):
+    """The next `count` dates falling on `weekday` (Mon=0), starting today"""
+    day = start or date.today()
+    day += timedelta(days=(weekday - day.weekday()) % 7)
+    return [day + timedelta(weeks=i) for i in range(count)]
+
+
+def option_rows(name, exchange, instrumenttype, expiries, atm, step, strikes, lotsize):
+    for expiry in expiries:
+        code = expiry.strftime('%d%b%y').upper()
+        for i in range(-(strikes // 2), strikes - strikes // 2):
+            strike = float(atm + i * step)
+            for option_type in ("CE", "PE"):
+                symbol = f"{name}{code}{strike:g}{option_type}"
+                yield dict(symbol=symbol, brsymbol=symbol, name=name, exchange=exchange, brexchange=exchange,
+                           token=None, expiry=expiry.strftime('%d-%b-%y').upper(), expiry_date=expiry,
+                           expiry_ordinal=expiry.toordinal(), strike=strike, lotsize=lotsize,
+                           instrumenttype=instrumenttype, tick_size=0.05)
+
+
+def future_rows(name, exchange, instrumenttype, expiries, lotsize):
+    for expiry in expiries:
+        symbol = f"{name}{expiry.strftime('%d%b%y').upper()}FUT"
+        yield dict(symbol=symbol, brsymbol=symbol, name=name, exchange=exchange, brexchange=exchange,
+                   token=None, expiry=expiry.strftime('%d-%b-%y').upper(), expiry_date=expiry,
+                   expiry_ordinal=expiry.toordinal(), strike=-1.0, lotsize=lotsize,
+                   instrumenttype=instrumenttype, tick_size=0.05)
+
+
+def build_scrip_master(stocks=180, strikes=200, past_expiries=0):
+    """Synthetic scrip master rows; past_expiries adds that many already-expired weekly series"""
+    thursdays = upcoming_weekdays(3, 8, date.today() - timedelta(weeks=past_expiries))
+    month_ends = [thursdays[min(i, len(thursdays) - 1)] for i in (3, 7)] + [thursdays[-1] + timedelta(weeks=4)]
+    rows = []
+    rows += option_rows("NIFTY", "NFO", "OPTIDX", thursdays, 22000, 50, strikes, 25)
+    rows += option_rows("BANKNIFTY", "NFO", "OPTIDX", thursdays, 48000, 100, strikes, 15)
+    rows += option_rows("SENSEX", "BFO", "OPTIDX", thursdays, 72000, 100, strikes, 10)
+    rows += future_rows("NIFTY", "NFO", "FUTIDX", month_ends, 25)
+    rows += future_rows("BANKNIFTY", "NFO", "FUTIDX", month_ends, 15)
+    for i in range(stocks):
+        name = f"STOCK{i:03d}"
+        rows.append(dict(symbol=name, brsymbol=f"{name}-EQ", name=name, exchange="NSE", brexchange="NSE",
+                         token=None, expiry="", expiry_date=None, expiry_ordinal=None, strike=-1.0,
+                         lotsize=1, instrumenttype="", tick_size=0.05))
+        rows += future_rows(name, "NFO", "FUTSTK", month_ends, 500)
+        rows += option_rows(name, "NFO", "OPTSTK", month_ends, 1000 + 10 * i, 10, 40, 500)
+    for token, row in enumerate(rows, start=100000):
+        row["token"] = str(token)
+    return rows
+
+
+def seed_scrip_master(rows):
+    from database.master_contract_db import SymToken, db_session
+    db_session.bulk_insert_mappings(SymToken, rows)
+    db_session.commit()
+    db_session.remove()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Option leg resolution benchmark")
+    parser.add_argument("--stocks", type=int, default=180)
+    parser.add_argument("--strikes", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="tm-bench-"), "bench.db")
+    from database.master_contract_db import init_db, SymToken, db_session
+    from database.option_chain import option_chain_index, parse_expiry
+    from database.expiry_calendar import expiry_calendar
+    from sqlalchemy import func
+    init_db()
+
+    rows = build_scrip_master(args.stocks, args.strikes)
+    started = time.perf_counter()
+    seed_scrip_master(rows)
+    print(f"Seeded {len(rows)} contracts in {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    option_chain_index.build()
+    print(f"Index build {time.perf_counter() - started:.3f} s: {option_chain_index.get_metrics()}")
+
+    options = [row for row in rows if row["instrumenttype"].startswith("OPT")]
+    random.seed(1)
+    legs = [random.choice(options) for _ in range(args.lookups)]
+
+    # One query per leg: what callers had to do before the index existed
+    latencies = []
+    for row in legs:
+        started = time.perf_counter()
+        SymToken.query.filter_by(name=row["name"], expiry=row["expiry"], strike=row["strike"],
+                                 exchange=row["exchange"]).filter(SymToken.symbol.like(f"%{row['symbol'][-2:]}")).all()
+        latencies.append(time.perf_counter() - started)
+    db_session.remove()
+    print(f"  query per leg   p50 {percentile(latencies, 50) * 1e6:9.1f} us   p99 {percentile(latencies, 99) * 1e6:9.1f} us")
+
+    latencies = []
+    for row in legs:
+        started = time.perf_counter()
+        _, series = option_chain_index.get_series(row["name"], row["expiry"], row["exchange"])
+        series.legs[row["strike"]][row["symbol"][-2:]]
+        latencies.append(time.perf_counter() - started)
+    print(f"  index lookup    p50 {percentile(latencies, 50) * 1e6:9.1f} us   p99 {percentile(latencies, 99) * 1e6:9.1f} us")
+
+    started = time.perf_counter()
+    chain = option_chain_index.get_chain("NIFTY")
+    print(f"  full NIFTY chain ({len(chain['strikes'])} strikes, expiry {chain['expiry']}) "
+          f"in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    started = time.perf_counter()
+    expiry_calendar.build()
+    print(f"Expiry calendar build {time.perf_counter() - started:.3f} s: {expiry_calendar.get_metrics()}")
+
+    names = [random.choice(legs)["name"] for _ in range(min(args.lookups, 200))]
+    today = date.today()
+    nearest = {}
+    for label, lookup in (
+        ("parse strings", lambda name: min((expiry for expiry in (
+            parse_expiry(value) for (value,) in db_session.query(SymToken.expiry).filter(
+                SymToken.name == name, SymToken.instrumenttype.like("FUT%")).all()
+        ) if expiry and expiry >= today), default=None)),
+        ("index seek", lambda name: db_session.query(func.min(SymToken.expiry_date)).filter(
+            SymToken.name == name, SymToken.instrumenttype == ("FUTIDX" if name in ("NIFTY", "BANKNIFTY") else "FUTSTK"),
+            SymToken.expiry_date >= today).scalar()),
+        ("calendar", lambda name: expiry_calendar.nearest(name, "FUTIDX" if name in ("NIFTY", "BANKNIFTY") else "FUTSTK")),
+    ):
+        latencies = []
+        for name in names:
+            started = time.perf_counter()
+            nearest.setdefault(name, set()).add(lookup(name))
+            latencies.append(time.perf_counter() - started)
+        db_session.remove()
+        print(f"  nearest future ({label:13s}) p50 {percentile(latencies, 50) * 1e6:9.1f} us   "
+              f"p99 {percentile(latencies, 99) * 1e6:9.1f} us")
+    assert all(len(found) == 1 for found in nearest.values()), "expiry lookups disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_request_record.py
+
+"""
+Microbenchmark: per-order cost of preparing the api_v1 request payload for logging.
+
+Compares the old path (copy.deepcopy + pop + json.dumps in the log writer)
+with RequestRecord (read-only redacted view, serialised once).
+
+Usage:
+    python benchmarks/bench_request_record.py [iterations]
+"""
+
+import copy
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.request_record import RequestRecord
+
+SAMPLE_ORDER = {
+    "apikey": "a" * 64,
+    "strategy": "Test Strategy",
+    "exchange": "NSE",
+    "symbol": "RELIANCE",
+    "action": "BUY",
+    "product": "MIS",
+    "pricetype": "LIMIT",
+    "quantity": "10",
+    "price": "2450.50",
+    "trigger_price": "0",
+    "disclosed_quantity": "0",
+    "position_size": "10",
+}
+
+
+def deepcopy_prepare(data):
+    order_request_data = copy.deepcopy(data)
+    order_request_data.pop('apikey', None)
+    return order_request_data
+
+
+def record_prepare(data):
+    return RequestRecord(data)
+
+
+def deepcopy_path(data):
+    return json.dumps(deepcopy_prepare(data))
+
+
+def record_path(data):
+    return record_prepare(data).to_json()
+
+
+def measure_retained(prepare, data, orders=1000):
+    """Return bytes kept alive per order between the handler and the log writer"""
+    tracemalloc.start()
+    pending = [prepare(data) for _ in range(orders)]
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del pending
+    return retained / orders
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    assert json.loads(deepcopy_path(SAMPLE_ORDER)) == json.loads(record_path(SAMPLE_ORDER))
+
+    print(f"Iterations: {iterations}")
+    cases = (
+        ("deepcopy + pop + dumps", deepcopy_prepare, deepcopy_path),
+        ("RequestRecord.to_json", record_prepare, record_path),
+    )
+    for name, prepare, full_path in cases:
+        seconds = timeit.timeit(lambda: full_path(SAMPLE_ORDER), number=iterations)
+        retained = measure_retained(prepare, SAMPLE_ORDER)
+        print(f"{name:<26} {seconds / iterations * 1e6:8.2f} us/order   {retained:8.1f} B/order queued for logging")
+
+
+if __name__ == '__main__':
+    main()
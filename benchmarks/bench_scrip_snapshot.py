@@ -0,0 +1,92 @@
+# benchmarks/bench_scrip_snapshot.py
+
+"""
+Benchmark: symbol lookups from the mapped scrip snapshot.
+
+Writes the synthetic scrip master from bench_option_chain to a snapshot,
+checks every contract reads back, then times mapping it in a fresh process
+(what a restarting worker pays) and compares token lookups against the
+symtoken query token_db falls back to.
+
+Usage:
+    python benchmarks/bench_scrip_snapshot.py [--stocks 180] [--strikes 200] [--lookups 5000]
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_option_chain import build_scrip_master, seed_scrip_master, percentile  # noqa: E402
+
+COLD_START = """
+import sys, time
+started = time.perf_counter()
+from database.scrip_snapshot import ScripSnapshot
+snapshot = ScripSnapshot(sys.argv[1])
+token = snapshot.lookup('symbol', sys.argv[2], sys.argv[3], 'token')
+print(f"{(time.perf_counter() - started) * 1000:.2f} {token}")
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrip snapshot benchmark")
+    parser.add_argument("--stocks", type=int, default=180)
+    parser.add_argument("--strikes", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="tm-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(folder, "bench.db")
+    from database.master_contract_db import init_db, SymToken, db_session
+    from database.scrip_snapshot import ScripSnapshot, write_snapshot
+    init_db()
+
+    rows = build_scrip_master(args.stocks, args.strikes)
+    seed_scrip_master(rows)
+    path = os.path.join(folder, "scrip_master.snap")
+
+    started = time.perf_counter()
+    write_snapshot(rows, path)
+    print(f"Wrote {len(rows)} contracts in {time.perf_counter() - started:.2f} s, "
+          f"{os.path.getsize(path) / 1e6:.1f} MB")
+
+    snapshot = ScripSnapshot(path)
+    for row in rows:
+        assert snapshot.lookup('symbol', row["symbol"], row["exchange"], 'token') == row["token"], row
+        assert snapshot.lookup('token', row["token"], row["exchange"], 'symbol') == row["symbol"], row
+    print("All contracts read back")
+
+    symbol = rows[len(rows) // 2]
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", COLD_START, path, symbol["symbol"], symbol["exchange"]],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            check=True).stdout.split()
+    print(f"Fresh process: import + map + first lookup {output[0]} ms (process total "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms), token {output[1]}")
+
+    random.seed(1)
+    sample = [random.choice(rows) for _ in range(args.lookups)]
+    latencies = []
+    for row in sample:
+        started = time.perf_counter()
+        SymToken.query.filter_by(symbol=row["symbol"], exchange=row["exchange"]).first()
+        latencies.append(time.perf_counter() - started)
+    db_session.remove()
+    print(f"  symtoken query   p50 {percentile(latencies, 50) * 1e6:9.1f} us   p99 {percentile(latencies, 99) * 1e6:9.1f} us")
+
+    latencies = []
+    for row in sample:
+        started = time.perf_counter()
+        snapshot.lookup('symbol', row["symbol"], row["exchange"], 'token')
+        latencies.append(time.perf_counter() - started)
+    print(f"  snapshot lookup  p50 {percentile(latencies, 50) * 1e6:9.1f} us   p99 {percentile(latencies, 99) * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/bench_shared_snapshot.py
+
+"""
+Benchmark: one scrip snapshot shared by several worker processes.
+
+Publishes the synthetic scrip master from bench_option_chain, starts worker
+processes that map it the way app workers do, then publishes a second
+generation in which one contract's token changed and measures how long each
+worker takes to swap to it. Per-worker memory of the mapping (from
+/proc/self/smaps, Linux only) is compared with building a per-process dict
+of the same lookups.
+
+Usage:
+    python benchmarks/bench_shared_snapshot.py [--workers 4] [--stocks 180] [--strikes 200]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_option_chain import build_scrip_master  # noqa: E402
+
+
+def mapping_memory_kb(path):
+    """(Rss, Pss) in kB of this process's mapping of a file, or None off Linux"""
+    try:
+        with open('/proc/self/smaps') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    rss = pss = 0
+    inside = False
+    for line in lines:
+        fields = line.split()
+        if fields and '-' in fields[0] and len(fields) >= 5:
+            inside = fields[-1] == os.path.realpath(path)
+        elif inside and fields[0] == 'Rss:':
+            rss += int(fields[1])
+        elif inside and fields[0] == 'Pss:':
+            pss += int(fields[1])
+    return rss, pss
+
+
+def worker(path, rows, probe, ready, results):
+    from database.scrip_snapshot import SnapshotLoader
+    loader = SnapshotLoader(path)
+    loader.load()
+    # Look up a spread of contracts, as a busy worker would
+    for row in rows[::7]:
+        loader.get_token(row["symbol"], row["exchange"])
+    ready.put((os.getpid(), mapping_memory_kb(path)))
+    original = loader.get_token(probe["symbol"], probe["exchange"])
+    while True:
+        token = loader.get_token(probe["symbol"], probe["exchange"])
+        if token != original:
+            results.put((os.getpid(), time.time(), loader.current.generation, token))
+            return
+        time.sleep(0.001)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared scrip snapshot benchmark")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--stocks", type=int, default=180)
+    parser.add_argument("--strikes", type=int, default=200)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="tm-bench-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(folder, "bench.db")
+    path = os.path.join(folder, "scrip_master.snap")
+    from database.scrip_snapshot import SnapshotLoader
+
+    rows = build_scrip_master(args.stocks, args.strikes)
+    publisher = SnapshotLoader(path)
+    publisher.publish(rows)
+
+    tracemalloc.start()
+    lookups = {(row["symbol"], row["exchange"]): row["token"] for row in rows}
+    dict_kb = tracemalloc.get_traced_memory()[0] // 1024
+    tracemalloc.stop()
+    print(f"Per-process dict of {len(lookups)} symbol lookups: {dict_kb} kB in every worker")
+
+    context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+    ready, results = context.Queue(), context.Queue()
+    probe = rows[len(rows) // 3]
+    processes = [context.Process(target=worker, args=(path, rows, probe, ready, results), daemon=True)
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        pid, memory = ready.get(timeout=60)
+        if memory:
+            print(f"  worker {pid}: snapshot mapping rss {memory[0]} kB, pss {memory[1]} kB")
+
+    changed = [dict(row, token="999999") if row is probe else row for row in rows]
+    started = time.time()
+    publisher.publish(changed)
+    published_at = os.path.getmtime(publisher.control_path)
+    print(f"Generation {publisher.current.generation} published {(published_at - started) * 1000:.0f} ms after the write started")
+    for _ in processes:
+        pid, seen_at, generation, token = results.get(timeout=60)
+        print(f"  worker {pid}: swapped to generation {generation} (token {token}) "
+              f"{(seen_at - published_at) * 1000:.1f} ms after the bump")
+    for process in processes:
+        process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# benchmarks/bench_webhook_suite.py
+
+"""
+Webhook throughput suite: the app under load against the local broker stand-in.
+
+Drives /api/v1/placeorder, /api/v1/placesmartorder, /search/suggestions and
+/orderbook at increasing concurrency through the Flask test client, with the
+broker replaced by benchmarks/angel_mock_server.py and the database either a
+throwaway SQLite file or an explicit --database-url (e.g. a local Postgres).
+
+Per scenario and concurrency level it records requests/sec, p50/p90/p99
+latency, SQL statements per request (counted on every SQLAlchemy engine),
+broker calls per request and process RSS. Results are written as JSON tagged
+with the current git commit; pass --compare with an earlier results file to
+print the change per metric.
+
+Usage:
+    python benchmarks/bench_webhook_suite.py [--requests 200] [--concurrency 1,4,16,32]
+                                             [--database-url URL] [--output DIR] [--compare FILE]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.angel_mock_server import start_server
+from benchmarks.bench_broker_path import (
+    BENCH_APIKEY, configure_environment, seed_database, make_clients, run_scenario, percentile
+)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SEED_SYMBOLS = ["SBIN", "SBICARD", "SBILIFE", "RELIANCE", "TCS", "INFY", "HDFCBANK", "ICICIBANK", "AXISBANK"]
+
+SCENARIOS = {
+    "placeorder": lambda client: client.post("/api/v1/placeorder", json={
+        "apikey": BENCH_APIKEY, "strategy": "bench", "exchange": "NSE", "symbol": "SBIN",
+        "action": "BUY", "product": "MIS", "pricetype": "MARKET", "quantity": "1"
+    }),
+    "placesmartorder": lambda client: client.post("/api/v1/placesmartorder", json={
+        "apikey": BENCH_APIKEY, "strategy": "bench", "exchange": "NSE", "symbol": "SBIN",
+        "action": "BUY", "product": "MIS", "pricetype": "MARKET", "quantity": "1", "position_size": "0"
+    }),
+    "suggestions": lambda client: client.get("/search/suggestions?term=SB&exchange=NSE"),
+    "orderbook": lambda client: client.get("/orderbook", headers={"Accept": "application/json"}),
+}
+
+
+class QueryCounter:
+    """Counts SQL statements issued through any SQLAlchemy engine in this process"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def install(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.listen(Engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux), falling back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return None
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def seed_symbols():
+    from database.master_contract_db import SymToken, db_session
+    rows = [SymToken(symbol=symbol, brsymbol=f"{symbol}-EQ", name=f"{symbol} Ltd", exchange="NSE",
+                     brexchange="NSE", token=str(1000 + i), expiry="", strike=0.0, lotsize=1,
+                     instrumenttype="", tick_size=0.05) for i, symbol in enumerate(SEED_SYMBOLS)]
+    # Padding so LIKE searches scan a realistically sized table
+    rows += [SymToken(symbol=f"SYM{i}", brsymbol=f"SYM{i}-EQ", name=f"Synthetic {i}", exchange="NSE",
+                      brexchange="NSE", token=str(100000 + i), expiry="", strike=0.0, lotsize=1,
+                      instrumenttype="", tick_size=0.05) for i in range(20000)]
+    db_session.bulk_save_objects(rows)
+    db_session.commit()
+
+
+def run_suite(app, broker, queries, scenarios, levels, total):
+    results = []
+    for name in scenarios:
+        request = SCENARIOS[name]
+        for level in levels:
+            clients = make_clients(app, level)
+            broker_before = broker.stats["requests"]
+            queries_before = queries.count
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed, latencies, failures = run_scenario(clients, request, total)
+            completed = len(latencies) or 1
+            results.append({
+                "scenario": name,
+                "concurrency": level,
+                "requests": len(latencies),
+                "failures": failures,
+                "req_per_sec": round(len(latencies) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                "queries_per_request": round((queries.count - queries_before) / completed, 2),
+                "broker_calls_per_request": round((broker.stats["requests"] - broker_before) / completed, 3),
+                "rss_mb": round(rss_mb() or 0, 1),
+            })
+    return results
+
+
+def print_results(results, baseline=None):
+    index = {(row["scenario"], row["concurrency"]): row for row in (baseline or {}).get("results", [])}
+    print(f"{'scenario':<16} {'conc':>4} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'fail':>5} {'sql/req':>8} {'brk/req':>8} {'rss MB':>7}")
+    for row in results:
+        print(f"{row['scenario']:<16} {row['concurrency']:>4} {row['req_per_sec']:8.1f} {row['p50_ms']:8.1f} "
+              f"{row['p90_ms']:8.1f} {row['p99_ms']:8.1f} {row['failures']:>5} {row['queries_per_request']:8.2f} "
+              f"{row['broker_calls_per_request']:8.3f} {row['rss_mb']:7.1f}")
+        before = index.get((row["scenario"], row["concurrency"]))
+        if before:
+            deltas = []
+            for metric in ("req_per_sec", "p50_ms", "p99_ms", "queries_per_request"):
+                if before[metric]:
+                    deltas.append(f"{metric} {(row[metric] - before[metric]) / before[metric] * 100:+.1f}%")
+            print(f"{'':<16} vs {baseline['commit']}: " + ", ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Webhook throughput suite against the local broker stand-in")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,4,16,32")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--rate-limits", action="store_true", help="Enforce Angel's per-endpoint limits in the mock")
+    parser.add_argument("--database-url", default=None, help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--output", default=RESULTS_DIR)
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    server, broker = start_server(args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                  rate_limits=args.rate_limits)
+    configure_environment(args.port, args.database_url)
+    if not args.rate_limits:
+        # Measure the app rather than Angel's pacing unless limits were asked for
+        for variable in ("ANGEL_ORDER_RATE", "ANGEL_RMS_RATE", "ANGEL_BOOK_RATE"):
+            os.environ.setdefault(variable, "1000")
+
+    queries = QueryCounter()
+    queries.install()
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+        seed_database()
+        seed_symbols()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = run_suite(app, broker, queries, args.scenarios.split(","), levels, args.requests)
+    server.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "database": "sqlite" if not args.database_url else args.database_url.split(":", 1)[0],
+        "broker_latency_ms": args.latency_ms,
+        "requests_per_run": args.requests,
+        "results": results,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"webhook-{report['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,14 @@ from datetime import datetime, timedelta
 import traceback
 import random
 import time
-from database.auth_db import get_all_users, get_user_by_username, approve_user, update_user
+from database.auth_db import list_users, count_users, get_user_by_username, approve_user, update_user
 
 # Create admin blueprint
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+ADMIN_PAGE_SIZE = 100
+ADMIN_MAX_PAGE_SIZE = 500
+
 
 # Admin login check decorator
 def admin_login_required(f):
@@ -51,31 +54,38 @@ def admin_login():
 @admin_bp.route('/panel')
 @admin_login_required
 def admin_panel():
-    """Admin panel to manage users"""
+    """
+    Admin panel user listing, one page at a time
+
+    Query parameters: after (next_cursor of the previous page), limit (default 100,
+    max 500), status (approved | expired | pending) and q (username prefix)
+    """
     try:
-        # Get all users
-        users = get_all_users()
-        print(f"[DEBUG] Total users fetched from DB: {len(users)}")
-        for u in users:
-            print(f"[DEBUG] User: username={u.username}, user_id={u.user_id}, is_admin={getattr(u, 'is_admin', None)}, is_approved={getattr(u, 'is_approved', None)}")
-        # Format expiry dates for display
-        for user in users:
-            if user.approved_expiry_date:
-                user.expiry_formatted = user.approved_expiry_date.strftime('%Y-%m-%d %H:%M')
-                # Check if expired
-                user.is_expired = datetime.now() > user.approved_expiry_date
-            else:
-                user.expiry_formatted = 'Not set'
-                user.is_expired = False
+        status = request.args.get('status') or None
+        if status not in (None, 'approved', 'expired', 'pending'):
+            return jsonify({'status': 'error', 'message': 'status must be approved, expired or pending'}), 400
+        try:
+            after_id = int(request.args.get('after', 0))
+            limit = min(max(int(request.args.get('limit', ADMIN_PAGE_SIZE)), 1), ADMIN_MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'after and limit must be integers'}), 400
+
+        users, next_cursor = list_users(after_id, limit, status, request.args.get('q') or None)
         users_data = [{
             'id': user.id,
             'username': user.username,
             'user_id': user.user_id,
             'is_approved': user.is_approved,
-            'expiry_formatted': user.expiry_formatted if hasattr(user, 'expiry_formatted') else None,
-            'is_expired': user.is_expired if hasattr(user, 'is_expired') else False
+            'expiry_formatted': user.approved_expiry_date.strftime('%Y-%m-%d %H:%M') if user.approved_expiry_date else 'Not set',
+            'is_expired': bool(user.is_expired)
         } for user in users]
-        return jsonify({'status': 'success', 'users': users_data})
+        return jsonify({
+            'status': 'success',
+            'users': users_data,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'total': count_users()
+        })
     except Exception as e:
         print(f"ERROR in admin_panel: {str(e)}")
         traceback.print_exc()
@@ -89,12 +99,10 @@ def admin_panel():
 def refresh_users():
     """API endpoint to refresh user list"""
     try:
-        users = get_all_users()
-        print(f"[DEBUG] refresh_users: Found {len(users)} users")
         return jsonify({
             "status": "success",
             "message": "User list refreshed",
-            "user_count": len(users)
+            "user_count": count_users()
         })
     except Exception as e:
         print(f"ERROR in refresh_users: {str(e)}")
@@ -109,11 +117,9 @@ def refresh_users():
 def check_new_users():
     """API endpoint to check for new users"""
     try:
-        users = get_all_users()
-        print(f"[DEBUG] check_new_users: Found {len(users)} users")
         return jsonify({
             "status": "success",
-            "user_count": len(users)
+            "user_count": count_users()
         })
     except Exception as e:
         print(f"ERROR in check_new_users: {str(e)}")
@@ -1,11 +1,12 @@
 from flask import Blueprint, request, jsonify, Response
-from database.auth_db import get_api_key
+from database.credential_store import credential_store
 from database.apilog_db import async_log_order, executor
 from api.order_api import place_order_api, place_smartorder_api , close_all_positions , cancel_order , modify_order , cancel_all_orders_api
 from extensions import socketio  # Import SocketIO
+from utils.request_record import RequestRecord
+from database.option_chain import resolve_order_symbol
 # Limiter disabled
 # from limiter import limiter  # Import the limiter instance
-import copy
 import os 
 from dotenv import load_dotenv
 
@@ -21,18 +22,38 @@ api_v1_bp = Blueprint('api_v1', __name__, url_prefix='/api/v1')
 def ratelimit_handler(e):
     return jsonify(error="Rate limit exceeded"), 429
 
+def missing_order_fields(data, mandatory_fields):
+    """
+    Mandatory fields absent from an order request. An options order may name its
+    contract relatively (underlying, expiry, strike_offset, option_type, underlying_ltp),
+    and a futures order as underlying, expiry and option_type FUT, instead of by symbol,
+    in which case symbol and exchange are not required
+    """
+    if data.get('underlying') and not data.get('symbol'):
+        mandatory_fields = [field for field in mandatory_fields if field not in ('symbol', 'exchange')]
+    return [field for field in mandatory_fields if field not in data or not data[field]]
+
+def resolve_relative_symbol(data):
+    """Resolve a relative options or futures spec in place; returns an error response or None"""
+    if not data.get('underlying') or data.get('symbol'):
+        return None
+    try:
+        resolve_order_symbol(data)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return None
+
 @api_v1_bp.route('/placeorder', methods=['POST'])
 def place_order():
     try:
         # Extracting JSON data from the POST request
         data = request.json
-        order_request_data = copy.deepcopy(request.json)
-        # Remove 'apikey' from the copy
-        order_request_data.pop('apikey', None)
+        # Read-only view for logging with 'apikey' hidden (no copy of the payload)
+        order_request_data = RequestRecord(data)
 
         # Mandatory fields list
         mandatory_fields = ['apikey', 'strategy', 'exchange', 'symbol', 'action', 'quantity']
-        missing_fields = [field for field in mandatory_fields if field not in data or not data[field]]
+        missing_fields = missing_order_fields(data, mandatory_fields)
 
         # Check if there are any missing mandatory fields
         if missing_fields:
@@ -41,17 +62,19 @@ def place_order():
                 'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'
             }), 400
 
-        login_username = os.getenv('LOGIN_USERNAME')
-        current_api_key = get_api_key(login_username)
-               
-        
-
-        # Check if the provided Placeorder Request API key matches the Current App API Key
-        if current_api_key != data['apikey']:
+        # Route the API key to its owner's active broker connection (or the LOGIN_USERNAME account)
+        credentials = credential_store.for_api_key(data['apikey'])
+        if credentials is None:
             return jsonify({'status': 'error', 'message': 'Invalid TM-Algo apikey'}), 403
 
+        # Options strategies may send underlying + ATM offset instead of an exact symbol
+        # (resolved only for authenticated keys)
+        error_response = resolve_relative_symbol(data)
+        if error_response:
+            return error_response
+
         
-        res, response_data, order_id = place_order_api(data)
+        res, response_data, order_id = place_order_api(data, credentials)
         print(f'placeorder response : {response_data} and orderid is {order_id}')
 
         # Check if the 'data' field is not null and the order was successfully placed
@@ -65,6 +88,8 @@ def place_order():
                        'status': 'success',
                         'orderid': order_id
                         }
+                if data.get('underlying'):
+                    order_response_data['symbol'] = data['symbol']
                 # Call the asynchronous log function
                 executor.submit(async_log_order,'placeorder',order_request_data, order_response_data)
                 return jsonify(order_response_data)
@@ -100,13 +125,12 @@ def place_smart_order():
         # Extracting JSON data from the POST request
         data = request.json
         
-        order_request_data = copy.deepcopy(request.json)
-        # Remove 'apikey' from the copy
-        order_request_data.pop('apikey', None)
+        # Read-only view for logging with 'apikey' hidden (no copy of the payload)
+        order_request_data = RequestRecord(data)
 
         # Mandatory fields list
         mandatory_fields = ['apikey', 'strategy', 'exchange', 'symbol', 'action', 'quantity','position_size']
-        missing_fields = [field for field in mandatory_fields if field not in data or not data[field]]
+        missing_fields = missing_order_fields(data, mandatory_fields)
 
         # Check if there are any missing mandatory fields
         if missing_fields:
@@ -115,17 +139,20 @@ def place_smart_order():
                 'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'
             }), 400
 
-        login_username = os.getenv('LOGIN_USERNAME')
-        current_api_key = get_api_key(login_username)
-               
-
-        # Check if the provided Placeorder Request API key matches the Current App API Key
-        if current_api_key != data['apikey']:
+        # Route the API key to its owner's active broker connection (or the LOGIN_USERNAME account)
+        credentials = credential_store.for_api_key(data['apikey'])
+        if credentials is None:
             return jsonify({'status': 'error', 'message': 'Invalid TM-Algo apikey'}), 403
 
+        # Options strategies may send underlying + ATM offset instead of an exact symbol
+        # (resolved only for authenticated keys)
+        error_response = resolve_relative_symbol(data)
+        if error_response:
+            return error_response
+
         
         #print(f'placesmartorder_resp : {place_smartorder_api(data)}')
-        res, response_data, order_id = place_smartorder_api(data)
+        res, response_data, order_id = place_smartorder_api(data, credentials)
         
         if res == None and response_data.get('message'):
             order_response_data = {
@@ -146,6 +173,8 @@ def place_smart_order():
                        'status': 'success',
                         'orderid': order_id
                         }
+                if data.get('underlying'):
+                    order_response_data['symbol'] = data['symbol']
                 # Call the asynchronous log function
                 executor.submit(async_log_order,'placeorder',order_request_data, order_response_data)
                 return jsonify(order_response_data)
@@ -177,8 +206,7 @@ def place_smart_order():
 def close_position():
     try:
         data = request.json  # Corrected to use data directly for consistency
-        sqoff_request_data = copy.deepcopy(data)
-        sqoff_request_data.pop('apikey', None)  # Remove 'apikey' from the copy for logging
+        sqoff_request_data = RequestRecord(data)  # Read-only logging view without 'apikey'
         
         # Corrected mandatory fields check
         mandatory_fields = ['apikey', 'strategy']
@@ -187,15 +215,13 @@ def close_position():
         if missing_fields:
             return jsonify({'status': 'error', 'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'}), 400
 
-        login_username = os.getenv('LOGIN_USERNAME')
-        current_api_key = get_api_key(login_username)
-        
-        # Check if the provided API key matches the current API key
-        if data['apikey'] != current_api_key:
+        # Route the API key to its owner's active broker connection (or the LOGIN_USERNAME account)
+        credentials = credential_store.for_api_key(data['apikey'])
+        if credentials is None:
             return jsonify({"message": "Invalid API key"}), 403
 
         # Call the function to close all positions
-        response_code, status_code = close_all_positions(current_api_key)
+        response_code, status_code = close_all_positions(data['apikey'], credentials)
 
         # Emitting a socket event for closing position
         socketio.emit('close_position', {'status': 'success', 'message': 'All Open Positions SquaredOff'})
@@ -219,8 +245,7 @@ def cancel_order_route():
     try:
         # Extracting JSON data from the POST request
         data = request.json
-        order_request_data = copy.deepcopy(data)  # For logging
-        order_request_data.pop('apikey', None)  # Remove API key from data to be logged
+        order_request_data = RequestRecord(data)  # For logging, 'apikey' is hidden by the view
 
         # Mandatory fields list
         mandatory_fields = ['apikey', 'strategy', 'orderid']
@@ -235,15 +260,13 @@ def cancel_order_route():
                 'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'
             }), 400
 
-        login_username = os.getenv('LOGIN_USERNAME')
-        current_api_key = get_api_key(login_username)
-
-        # Check if the provided API key matches the current API key
-        if current_api_key != data['apikey']:
+        # Route the API key to its owner's active broker connection (or the LOGIN_USERNAME account)
+        credentials = credential_store.for_api_key(data['apikey'])
+        if credentials is None:
             return jsonify({'status': 'error', 'message': 'Invalid API key'}), 403
 
         # Call the cancel_order function
-        response_message, status_code = cancel_order(data['orderid'])
+        response_message, status_code = cancel_order(data['orderid'], credentials)
 
         # Emit the cancellation event to the client via Socket.IO
         socketio.emit('cancel_order_event', {'status': response_message['status'], 'orderid': data['orderid']})
@@ -269,8 +292,7 @@ def cancel_all_orders():
     try:
         data = request.json
 
-        order_request_data = copy.deepcopy(data)  # For logging
-        order_request_data.pop('apikey', None)  # Remove API key from data to be logged
+        order_request_data = RequestRecord(data)  # For logging, 'apikey' is hidden by the view
         # Validate mandatory fields
         mandatory_fields = ['apikey', 'strategy']
         missing_fields = [field for field in mandatory_fields if field not in data]
@@ -281,15 +303,13 @@ def cancel_all_orders():
                 'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'
             }), 400
 
-        login_username = os.getenv('LOGIN_USERNAME')
-        current_api_key = get_api_key(login_username)
-
-        # Check if the provided API key matches the current API key
-        if current_api_key != data['apikey']:
+        # Route the API key to its owner's active broker connection (or the LOGIN_USERNAME account)
+        credentials = credential_store.for_api_key(data['apikey'])
+        if credentials is None:
             return jsonify({'status': 'error', 'message': 'Invalid API key'}), 403
 
         # Call the new function to process order cancellations
-        canceled_orders, failed_cancellations = cancel_all_orders_api(data)
+        canceled_orders, failed_cancellations = cancel_all_orders_api(data, credentials)
 
         # Emit events for each canceled order
         for orderid in canceled_orders:
@@ -323,8 +343,7 @@ def cancel_all_orders():
 def modify_order_route():
     try:
         data = request.json
-        order_request_data = copy.deepcopy(data)  # For logging
-        order_request_data.pop('apikey', None)  # Remove API key from data to be logged
+        order_request_data = RequestRecord(data)  # For logging, 'apikey' is hidden by the view
         
         # Mandatory fields including all necessary for order modification
         mandatory_fields = ['apikey', 'strategy', 'exchange', 'symbol', 'orderid', 'action', 'product', 'pricetype', 'price', 'quantity', 'disclosed_quantity', 'trigger_price']
@@ -333,14 +352,13 @@ def modify_order_route():
         if missing_fields:
             return jsonify({'status': 'error', 'message': f'Missing mandatory field(s): {", ".join(missing_fields)}'}), 400
 
-        login_username = os.getenv('LOGIN_USERNAME')
-        current_api_key = get_api_key(login_username)
-
-        if data['apikey'] != current_api_key:
+        # Route the API key to its owner's active broker connection (or the LOGIN_USERNAME account)
+        credentials = credential_store.for_api_key(data['apikey'])
+        if credentials is None:
             return jsonify({'status': 'error', 'message': 'Invalid API key'}), 403
 
         # Assuming modify_order requires specific parameters from `data` and returns a response_message and a status_code
-        response_message, status_code = modify_order(data)
+        response_message, status_code = modify_order(data, credentials)
         
         # Emitting the modification event to the client via Socket.IO
         socketio.emit('modify_order_event', {'status': response_message['status'], 'orderid': response_message.get('orderid')})
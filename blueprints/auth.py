@@ -7,7 +7,6 @@ from flask_cors import cross_origin
 # from limiter import limiter  # Import the limiter instance
 from datetime import datetime, timedelta
 import pytz
-import http.client
 import json
 import os
 import traceback
@@ -15,12 +14,9 @@ import sqlite3
 from threading import Thread
 from database.auth_db import get_auth_token, store_auth_tokens, get_user_by_username, get_user_by_id, create_user
 from database.master_contract_db import master_contract_download
+from brokers.angel_scheduler import angel_connection
 from services.auth_service import auth_service
 from utils.rate_limiter import login_rate_limit, general_rate_limit
-from flask_bcrypt import Bcrypt
-
-# Initialize Bcrypt
-bcrypt = Bcrypt()
 
 # Load environment variables
 from dotenv import load_dotenv
@@ -30,28 +26,6 @@ load_dotenv()
 LOGIN_RATE_LIMIT_MIN = os.getenv("LOGIN_RATE_LIMIT_MIN", "20 per minute")
 LOGIN_RATE_LIMIT_HOUR = os.getenv("LOGIN_RATE_LIMIT_HOUR", "100 per hour")
 
-# Function to verify password
-def verify_password(password, password_hash):
-    try:
-        # Check if password_hash is not None and is a valid string
-        if not password_hash:
-            print("ERROR: password_hash is None or empty")
-            return False
-            
-        # Convert string to bytes if needed
-        if isinstance(password, str):
-            password = password.encode('utf-8')
-            
-        if isinstance(password_hash, str):
-            password_hash = password_hash.encode('utf-8')
-            
-        # Verify the password
-        return bcrypt.check_password_hash(password_hash, password)
-    except Exception as e:
-        print(f"ERROR in verify_password: {str(e)}")
-        traceback.print_exc()
-        return False
-
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
 def async_master_contract_download(user):
@@ -186,7 +160,7 @@ def login():
             # We'll rely on the Angel One API to verify credentials
             
             print(f"Connecting to AngelOne API for authentication...")
-            conn = http.client.HTTPSConnection("apiconnect.angelbroking.com")
+            conn = angel_connection()
             
             # Prepare login payload
             payload = json.dumps({
@@ -483,7 +457,10 @@ def new_register():
             error_code = 'REGISTRATION_FAILED'
             status_code = 400
             
-            if 'already exists' in result["message"].lower():
+            if result.get("busy"):
+                error_code = 'SERVER_BUSY'
+                status_code = 503
+            elif 'already exists' in result["message"].lower():
                 if 'username' in result["message"].lower():
                     error_code = 'USERNAME_EXISTS'
                 elif 'email' in result["message"].lower():
@@ -755,7 +732,10 @@ def new_login():
             error_code = 'LOGIN_FAILED'
             status_code = 401
             
-            if 'credentials' in result["message"].lower():
+            if result.get("busy"):
+                error_code = 'SERVER_BUSY'
+                status_code = 503
+            elif 'credentials' in result["message"].lower():
                 error_code = 'INVALID_CREDENTIALS'
             elif 'deactivated' in result["message"].lower():
                 error_code = 'ACCOUNT_DEACTIVATED'
@@ -862,8 +842,17 @@ def validate_login():
             })
         
         # Validate password
-        from database.auth_db import verify_password
-        password_valid = verify_password(password, user.password_hash)
+        from database.auth_db import verify_password, PasswordHasherBusy
+        try:
+            password_valid = verify_password(password, user.password_hash)
+        except PasswordHasherBusy:
+            return jsonify({
+                'status': 'error',
+                'valid': False,
+                'user_exists': True,
+                'message': 'Too many sign-ins in progress. Please try again in a moment.',
+                'error_code': 'SERVER_BUSY'
+            }), 503
         
         return jsonify({
             'status': 'success',
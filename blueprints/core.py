@@ -1,8 +1,18 @@
-from flask import Blueprint, current_app, send_from_directory, jsonify
+from flask import Blueprint, current_app, send_from_directory, jsonify, session
+from functools import wraps
 import os
 
 core_bp = Blueprint('core_bp', __name__)
 
+# The metrics expose per-account counters and internal state, so only admins may read them
+def admin_session_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not session.get('logged_in') or not session.get('is_admin'):
+            return jsonify({'status': 'error', 'message': 'Admin session required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
 @core_bp.route('/')
 def home():
     return jsonify({
@@ -29,3 +39,50 @@ def docs():
 def docs_file(filename):
     docs_dir = os.path.join(current_app.root_path, 'docs')
     return send_from_directory(docs_dir, filename)
+
+@core_bp.route('/metrics/broker')
+@admin_session_required
+def broker_metrics():
+    """Outbound Angel One scheduler queue depth/wait times, book cache, change feed, token refresh and credential store counters"""
+    from brokers.angel_scheduler import angel_scheduler
+    from api.book_cache import book_cache
+    from services.change_feed import change_feed
+    from services.token_refresh import token_refresh_scheduler
+    from database.credential_store import credential_store
+    return jsonify({
+        'status': 'success',
+        'scheduler': angel_scheduler.get_metrics(),
+        'client_pools': angel_scheduler.get_pool_metrics(),
+        'book_cache': book_cache.get_metrics(),
+        'change_feed': change_feed.get_metrics(),
+        'token_refresh': token_refresh_scheduler.get_metrics(),
+        'credential_store': credential_store.get_metrics()
+    })
+
+@core_bp.route('/metrics/sessions')
+@admin_session_required
+def session_metrics():
+    """Session store LRU hit/miss counters, write-behind last-seen flushes and password hashing latency"""
+    from database.session_store import session_store
+    from utils.password_hasher import password_hasher
+    return jsonify({
+        'status': 'success',
+        'session_store': session_store.get_metrics(),
+        'password_hasher': password_hasher.get_metrics()
+    })
+
+@core_bp.route('/metrics/contracts')
+@admin_session_required
+def contract_metrics():
+    """Option chain index and expiry calendar builds, the scrip snapshot and the daily expired-contract pruning"""
+    from database.option_chain import option_chain_index
+    from database.expiry_calendar import expiry_calendar
+    from database.scrip_snapshot import scrip_snapshot
+    from services.contract_maintenance import contract_maintenance
+    return jsonify({
+        'status': 'success',
+        'option_chain': option_chain_index.get_metrics(),
+        'expiry_calendar': expiry_calendar.get_metrics(),
+        'scrip_snapshot': scrip_snapshot.get_metrics(),
+        'maintenance': contract_maintenance.get_metrics()
+    })
@@ -46,7 +46,7 @@ def dashboard():
     
     try:
         # Get margin data
-        response = get_margin_data(AUTH_TOKEN, apikey)
+        response = get_margin_data(AUTH_TOKEN, apikey, tenant=session.get('user'))
         
         # Extract the data field from the response for use in template
         if isinstance(response, dict) and 'data' in response and isinstance(response['data'], dict):
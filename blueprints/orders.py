@@ -1,8 +1,7 @@
 from flask import Blueprint, jsonify, request, render_template, session, redirect, url_for
 from flask_cors import cross_origin
 from api.order_api import get_order_book, get_trade_book, get_positions, get_holdings
-from mapping.order_data import calculate_order_statistics, map_order_data,map_trade_data, map_position_data, map_portfolio_data, calculate_portfolio_statistics
-from mapping.order_data import transform_order_data, transform_tradebook_data, transform_positions_data, transform_holdings_data
+from mapping.order_data import build_order_book, build_trade_book, build_positions, build_holdings
 # Define the blueprint
 orders_bp = Blueprint('orders_bp', __name__, url_prefix='/')
 
@@ -54,18 +53,9 @@ def orderbook():
                 return jsonify({'status': 'error', 'message': error_message, 'data': []})
 
         try:
-            # Process the data if no errors
-            print("DEBUG - Calling map_order_data()")
-            order_data = map_order_data(order_data=order_data)       
-            print("DEBUG - After mapping:", order_data)
-
-            print("DEBUG - Calling calculate_order_statistics()")
-            order_stats = calculate_order_statistics(order_data)
-            print("DEBUG - Order stats:", order_stats)
-            
-            print("DEBUG - Calling transform_order_data()")
-            order_data = transform_order_data(order_data)
-            print("DEBUG - After transform:", order_data)
+            # Map symbols, normalise products, build rows and count statistics in one pass
+            order_data, order_stats = build_order_book(order_data)
+            print(f"DEBUG - Built {len(order_data)} order rows, stats: {order_stats}")
             
             # Pass the data to the orderbook.html template
             print("DEBUG - Rendering template with data")
@@ -130,10 +120,9 @@ def tradebook():
                 }), 500
             return redirect(url_for('auth.logout'))
 
-        # Process the data
-        tradebook_data = map_trade_data(trade_data=tradebook_data) 
-        tradebook_data = transform_tradebook_data(tradebook_data)
-        print(tradebook_data)
+        # Process the data in a single pass
+        tradebook_data = build_trade_book(tradebook_data)
+        print(f"Built {len(tradebook_data)} trade rows")
         
         # Check if request wants JSON (from React frontend)
         if request.headers.get('Accept') == 'application/json' or request.is_json:
@@ -201,10 +190,9 @@ def positions():
                     }), 500
                 return redirect(url_for('auth.logout'))
 
-            # Process the data
-            positions_data = map_position_data(positions_data)
-            positions_data = transform_positions_data(positions_data)
-            print(positions_data)
+            # Process the data in a single pass
+            positions_data = build_positions(positions_data)
+            print(f"Built {len(positions_data)} position rows")
         
         # Check if request wants JSON (from React frontend)
         if request.headers.get('Accept') == 'application/json' or request.is_json:
@@ -279,18 +267,9 @@ def holdings():
                 return jsonify({'status': 'error', 'message': error_message, 'data': []})
         
         try:
-            # Process the data if no errors
-            print("DEBUG - Calling map_portfolio_data()")
-            mapped_data = map_portfolio_data(holdings_data)
-            print("DEBUG - After mapping:", mapped_data)
-            
-            print("DEBUG - Calling calculate_portfolio_statistics()")
-            portfolio_stats = calculate_portfolio_statistics(mapped_data)
-            print("DEBUG - Portfolio stats:", portfolio_stats)
-            
-            print("DEBUG - Calling transform_holdings_data()")
-            transformed_data = transform_holdings_data(mapped_data)
-            print("DEBUG - After transform:", transformed_data)
+            # Map, transform and compute portfolio statistics in a single pass
+            transformed_data, portfolio_stats = build_holdings(holdings_data)
+            print(f"DEBUG - Built {len(transformed_data)} holding rows, stats: {portfolio_stats}")
             
             # Check if request wants JSON (from React frontend)
             if request.headers.get('Accept') == 'application/json' or request.is_json:
@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, session, redirect, url_for, request, jsonify
 from flask_cors import cross_origin
 from database.master_contract_db import search_symbols
+from database.option_chain import option_chain_index
+from database.expiry_calendar import expiry_calendar
 
 search_bp = Blueprint('search_bp', __name__, url_prefix='/search')
 
@@ -91,6 +93,50 @@ def search():
         } for result in results]
         return jsonify({'status': 'success', 'results': results_dicts})
 
+@search_bp.route('/optionchain')
+@cross_origin(origins=['http://localhost:3000', 'http://127.0.0.1:3000', 'http://localhost:5173', 'http://127.0.0.1:5173'], supports_credentials=True)
+def option_chain():
+    """
+    Strike ladder of one expiry with CE/PE tokens, lot size and tick size
+
+    Query parameters: underlying (e.g. NIFTY), expiry (DD-MON-YY, nearest live
+    expiry when omitted) and exchange (NFO, BFO, MCX or CDS, optional)
+    """
+    if not (session.get('logged_in') or session.get('new_auth_logged_in')):
+        return jsonify({'status': 'error', 'message': 'Authentication required'}), 401
+
+    underlying = request.args.get('underlying')
+    if not underlying:
+        return jsonify({'status': 'error', 'message': 'underlying is required'}), 400
+
+    chain = option_chain_index.get_chain(underlying, request.args.get('expiry') or None,
+                                         request.args.get('exchange') or None)
+    if chain is None:
+        return jsonify({'status': 'error', 'message': 'No options found for this underlying and expiry'}), 404
+    return jsonify(dict(chain, status='success'))
+
+@search_bp.route('/expiries')
+@cross_origin(origins=['http://localhost:3000', 'http://127.0.0.1:3000', 'http://localhost:5173', 'http://127.0.0.1:5173'], supports_credentials=True)
+def expiries():
+    """
+    Live expiries of an underlying with the nearest one and its rollover target
+
+    Query parameters: underlying (e.g. NIFTY), instrumenttype (e.g. FUTIDX or OPTIDX,
+    every type when omitted) and exchange (optional)
+    """
+    if not (session.get('logged_in') or session.get('new_auth_logged_in')):
+        return jsonify({'status': 'error', 'message': 'Authentication required'}), 401
+
+    underlying = request.args.get('underlying')
+    if not underlying:
+        return jsonify({'status': 'error', 'message': 'underlying is required'}), 400
+
+    summary = expiry_calendar.summary(underlying, request.args.get('instrumenttype') or None,
+                                      request.args.get('exchange') or None)
+    if summary is None:
+        return jsonify({'status': 'error', 'message': 'No expiries found for this underlying'}), 404
+    return jsonify(dict(summary, status='success'))
+
 # New endpoint for autocomplete suggestions
 @search_bp.route('/suggestions')
 @cross_origin(origins=['http://localhost:3000', 'http://127.0.0.1:3000', 'http://localhost:5173', 'http://127.0.0.1:5173'], supports_credentials=True)
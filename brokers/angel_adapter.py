@@ -1,16 +1,16 @@
 # brokers/angel_adapter.py
 
-import http.client
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import traceback
+from brokers.angel_scheduler import ANGEL_API_HOST, angel_connection
 
 class AngelAdapter:
     """Angel One broker adapter for authentication and API operations"""
     
     def __init__(self):
-        self.base_url = "apiconnect.angelbroking.com"
+        self.base_url = ANGEL_API_HOST
         self.api_version = "v1"
     
     def authenticate(self, client_id, pin, totp, api_key):
@@ -29,7 +29,7 @@ class AngelAdapter:
         try:
             print(f"Authenticating with Angel One for client: {client_id}")
             
-            conn = http.client.HTTPSConnection(self.base_url)
+            conn = angel_connection()
             
             # Prepare login payload
             payload = json.dumps({
@@ -74,7 +74,7 @@ class AngelAdapter:
                     }
                 
                 # Calculate token expiration (Angel tokens typically expire in 24 hours)
-                expires_at = datetime.now() + timedelta(hours=24)
+                expires_at = datetime.now(timezone.utc) + timedelta(hours=24)
                 
                 return {
                     "status": "success",
@@ -131,7 +131,7 @@ class AngelAdapter:
             
             print("Refreshing Angel One token")
             
-            conn = http.client.HTTPSConnection(self.base_url)
+            conn = angel_connection()
             
             # Prepare refresh payload
             payload = json.dumps({
@@ -171,7 +171,7 @@ class AngelAdapter:
                     }
                 
                 # Calculate token expiration
-                expires_at = datetime.now() + timedelta(hours=24)
+                expires_at = datetime.now(timezone.utc) + timedelta(hours=24)
                 
                 return {
                     "status": "success",
@@ -224,7 +224,7 @@ class AngelAdapter:
             
             print("Validating Angel One connection")
             
-            conn = http.client.HTTPSConnection(self.base_url)
+            conn = angel_connection()
             
             # Prepare headers for profile API call
             headers = {
@@ -325,7 +325,7 @@ class AngelAdapter:
             
             print("Logging out from Angel One")
             
-            conn = http.client.HTTPSConnection(self.base_url)
+            conn = angel_connection()
             
             # Prepare headers
             headers = {
@@ -0,0 +1,346 @@
+# brokers/angel_scheduler.py
+
+"""
+Outbound request scheduler for the Angel One SmartAPI.
+
+Angel One throttles each endpoint per second. Every outbound broker call is
+queued here by endpoint class (orders, RMS, book queries), paced by a token
+bucket per endpoint at the class rate, and dispatched with order-modifying
+requests ahead of read queries. Callers block until their request has been
+sent, so bursts queue instead of being rejected, but never longer than
+ANGEL_CALL_TIMEOUT, and every connection carries a socket timeout.
+
+Angel One applies its limits per trading account, so requests carry a tenant
+(the broker connection they are sent for): each tenant gets its own buckets
+(dropped once idle), a busy account cannot starve the others, and each tenant reuses keep-alive
+connections from its own client pool instead of a new TLS handshake per call.
+"""
+
+import http.client
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from cachetools import TTLCache
+
+# Point these at a local stand-in (benchmarks/angel_mock_server.py) for load and latency tests
+ANGEL_API_HOST = os.getenv("ANGEL_API_HOST", "apiconnect.angelbroking.com")
+ANGEL_API_SCHEME = os.getenv("ANGEL_API_SCHEME", "https")
+# Socket timeout for every connection, so a stalled broker cannot hang a login or a worker thread
+ANGEL_API_TIMEOUT = float(os.getenv("ANGEL_API_TIMEOUT", "10"))
+# Longest a caller waits for a scheduled call, queueing included
+ANGEL_CALL_TIMEOUT = float(os.getenv("ANGEL_CALL_TIMEOUT", "30"))
+
+def angel_connection(timeout=ANGEL_API_TIMEOUT):
+    """
+    Open a connection to the configured Angel One API host
+
+    Args:
+        timeout (float): Socket timeout in seconds for connecting and each read
+
+    Returns:
+        http.client.HTTPConnection: HTTPS unless ANGEL_API_SCHEME is 'http'
+    """
+    if ANGEL_API_SCHEME == "http":
+        return http.client.HTTPConnection(ANGEL_API_HOST, timeout=timeout)
+    return http.client.HTTPSConnection(ANGEL_API_HOST, timeout=timeout)
+
+# Idle keep-alive connections per tenant, and how long one may sit idle before it is
+# discarded (reusing a connection the server has already closed could lose an order)
+ANGEL_POOL_SIZE = int(os.getenv("ANGEL_POOL_SIZE", "4"))
+ANGEL_POOL_IDLE_SECONDS = float(os.getenv("ANGEL_POOL_IDLE_SECONDS", "15"))
+# Buckets of tenants/endpoints idle this long are dropped; an idle bucket is full anyway
+ANGEL_BUCKET_IDLE_SECONDS = float(os.getenv("ANGEL_BUCKET_IDLE_SECONDS", "300"))
+ANGEL_MAX_BUCKETS = int(os.getenv("ANGEL_MAX_BUCKETS", "65536"))
+
+# Endpoint classes in dispatch priority order (first = highest priority),
+# with the per-endpoint, per-second limits from the SmartAPI rate limit table
+ENDPOINT_CLASSES = {
+    "orders": float(os.getenv("ANGEL_ORDER_RATE", "20")),   # placeOrder / modifyOrder / cancelOrder
+    "rms": float(os.getenv("ANGEL_RMS_RATE", "2")),         # getRMS
+    "books": float(os.getenv("ANGEL_BOOK_RATE", "1")),      # order book, trade book, positions, holdings
+}
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now):
+        """Take one token if available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now):
+        """Seconds until the next token becomes available"""
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+class ClientPool:
+    """Idle keep-alive connections to the Angel One API for one tenant"""
+
+    def __init__(self, size=ANGEL_POOL_SIZE, idle_seconds=ANGEL_POOL_IDLE_SECONDS):
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.idle = deque()  # (connection, released_at)
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def acquire(self):
+        """Return (connection, reused)"""
+        now = time.monotonic()
+        with self.lock:
+            while self.idle:
+                conn, released_at = self.idle.pop()
+                if now - released_at <= self.idle_seconds:
+                    self.reused += 1
+                    return conn, True
+                conn.close()
+            self.opened += 1
+        return angel_connection(), False
+
+    def release(self, conn):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+class _ScheduledRequest:
+    __slots__ = ('func', 'endpoint', 'tenant', 'future', 'enqueued_at')
+
+    def __init__(self, func, endpoint, tenant=None):
+        self.func = func
+        self.endpoint = endpoint
+        self.tenant = tenant
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+class AngelRequestScheduler:
+    """Paces and prioritises outbound Angel One API calls"""
+
+    def __init__(self, rates=None, max_workers=None, call_timeout=ANGEL_CALL_TIMEOUT):
+        max_workers = max_workers or int(os.getenv("ANGEL_MAX_WORKERS", "32"))
+        self.rates = dict(rates or ENDPOINT_CLASSES)
+        self.priority = list(self.rates)
+        self.call_timeout = call_timeout
+        # (tenant, endpoint class, endpoint) -> TokenBucket, evicted once idle
+        self.buckets = TTLCache(maxsize=ANGEL_MAX_BUCKETS, ttl=ANGEL_BUCKET_IDLE_SECONDS)
+        self.pools = {}
+        self.queues = {name: deque() for name in self.rates}
+        self.metrics = {name: self._empty_metrics() for name in self.rates}
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="angel-api")
+        self._cond = threading.Condition()
+        self._dispatcher = None
+
+    @staticmethod
+    def _empty_metrics():
+        return {"dispatched": 0, "total_wait": 0.0, "max_wait": 0.0, "last_wait": 0.0}
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="angel-scheduler", daemon=True)
+            self._dispatcher.start()
+
+    def submit(self, endpoint_class, func, endpoint=None, tenant=None):
+        """
+        Queue a broker call
+
+        Args:
+            endpoint_class (str): One of ENDPOINT_CLASSES ('orders', 'rms', 'books')
+            func (callable): Zero-argument function performing the HTTP call
+            endpoint (str): Endpoint path; each endpoint gets its own bucket at the class rate
+            tenant: Broker account the call is made for (connection ID or client code);
+                each tenant is paced separately
+
+        Returns:
+            Future: Resolves to the return value of `func`
+        """
+        if endpoint_class not in self.queues:
+            raise ValueError(f"Unknown endpoint class: {endpoint_class}")
+        item = _ScheduledRequest(func, endpoint, tenant)
+        with self._cond:
+            self._ensure_dispatcher()
+            self.queues[endpoint_class].append(item)
+            self._cond.notify()
+        return item.future
+
+    def call(self, endpoint_class, func, endpoint=None, tenant=None):
+        """
+        Queue a broker call and wait for its result
+
+        Raises:
+            TimeoutError: When the call has not completed within call_timeout; a call
+                still queued is cancelled, one already sent may still reach the broker
+        """
+        future = self.submit(endpoint_class, func, endpoint, tenant)
+        try:
+            return future.result(timeout=self.call_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Angel One {endpoint or endpoint_class} call did not complete in {self.call_timeout}s")
+
+    def _bucket(self, endpoint_class, endpoint, tenant):
+        # Angel One counts requests per account, so buckets are never shared between tenants
+        key = (tenant, endpoint_class, endpoint)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            # No burst allowance: the broker counts requests per calendar second, so a full
+            # bucket plus refill would let up to twice the rate through in one window
+            bucket = TokenBucket(self.rates[endpoint_class], capacity=1)
+        # Storing it again restarts its idle timer
+        self.buckets[key] = bucket
+        return bucket
+
+    def _next_ready(self, now):
+        """Pop the highest-priority request whose bucket has a token, else return the shortest wait"""
+        shortest_wait = None
+        for name in self.priority:
+            queue = self.queues[name]
+            if any(item.future.cancelled() for item in queue):
+                # Callers that timed out while queued
+                queue = self.queues[name] = deque(item for item in queue if not item.future.cancelled())
+            # Oldest first within a class, skipping tenants/endpoints that are still throttled
+            for item in queue:
+                bucket = self._bucket(name, item.endpoint, item.tenant)
+                if bucket.try_take(now):
+                    queue.remove(item)
+                    return name, item, None
+                wait = bucket.wait_time(now)
+                shortest_wait = wait if shortest_wait is None else min(shortest_wait, wait)
+        return None, None, shortest_wait
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                name, item, wait = self._next_ready(now)
+                if item is None:
+                    self._cond.wait(timeout=wait)
+                    continue
+                waited = now - item.enqueued_at
+                stats = self.metrics[name]
+                stats["dispatched"] += 1
+                stats["total_wait"] += waited
+                stats["last_wait"] = waited
+                stats["max_wait"] = max(stats["max_wait"], waited)
+            self.executor.submit(self._run, item)
+
+    @staticmethod
+    def _run(item):
+        if not item.future.set_running_or_notify_cancel():
+            return
+        try:
+            item.future.set_result(item.func())
+        except BaseException as e:
+            item.future.set_exception(e)
+
+    def get_metrics(self):
+        """
+        Queue depth and queue wait time per endpoint class
+
+        Returns:
+            dict: {endpoint_class: {queued, dispatched, avg_wait_ms, max_wait_ms, last_wait_ms, rate_per_sec}}
+        """
+        with self._cond:
+            result = {}
+            for name, stats in self.metrics.items():
+                dispatched = stats["dispatched"]
+                result[name] = {
+                    "queued": len(self.queues[name]),
+                    "dispatched": dispatched,
+                    "avg_wait_ms": round(stats["total_wait"] / dispatched * 1000, 3) if dispatched else 0.0,
+                    "max_wait_ms": round(stats["max_wait"] * 1000, 3),
+                    "last_wait_ms": round(stats["last_wait"] * 1000, 3),
+                    "rate_per_sec": self.rates[name]
+                }
+            return result
+
+    def _pool(self, tenant):
+        pool = self.pools.get(tenant)
+        if pool is None:
+            with self._cond:
+                pool = self.pools.setdefault(tenant, ClientPool())
+        return pool
+
+    def get_pool_metrics(self):
+        """
+        Client pool usage across tenants
+
+        Returns:
+            dict: {tenants, idle, opened, reused}
+        """
+        pools = list(self.pools.values())
+        return {
+            "tenants": len(pools),
+            "idle": sum(len(pool.idle) for pool in pools),
+            "opened": sum(pool.opened for pool in pools),
+            "reused": sum(pool.reused for pool in pools)
+        }
+
+    def request(self, endpoint_class, method, endpoint, payload='', headers=None, tenant=None):
+        """
+        Send an HTTP request to the Angel One API through the scheduler
+
+        Args:
+            endpoint_class (str): Endpoint class used for pacing and priority
+            method (str): HTTP method
+            endpoint (str): Request path
+            payload (str): Request body
+            headers (dict): Request headers
+            tenant: Broker account the request is made for (rate limits and client pool)
+
+        Returns:
+            tuple: (http.client.HTTPResponse, body bytes)
+        """
+        pool = self._pool(tenant)
+
+        def send():
+            conn, reused = pool.acquire()
+            try:
+                conn.request(method, endpoint, payload, headers or {})
+                res = conn.getresponse()
+                body = res.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                # A pooled connection the server closed while idle: safe to resend reads only,
+                # an order may already have reached the broker
+                if reused and method == "GET":
+                    return send_fresh()
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if res.will_close:
+                conn.close()
+            else:
+                pool.release(conn)
+            return res, body
+
+        def send_fresh():
+            conn = angel_connection()
+            try:
+                conn.request(method, endpoint, payload, headers or {})
+                res = conn.getresponse()
+                return res, res.read()
+            finally:
+                conn.close()
+
+        return self.call(endpoint_class, send, endpoint, tenant)
+
+# Global scheduler shared by all outbound Angel One calls in this process
+angel_scheduler = AngelRequestScheduler()
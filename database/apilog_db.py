@@ -10,6 +10,7 @@ from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime
 import pytz
+from utils.request_record import RequestRecord
 
 
 load_dotenv()
@@ -44,11 +45,19 @@ def init_db():
 # Executor for asynchronous tasks
 executor = ThreadPoolExecutor(2)
 
+def _encode_log_payload(payload):
+    """Return the JSON text for a log payload, reusing pre-encoded forms"""
+    if isinstance(payload, RequestRecord):
+        return payload.to_json()
+    if isinstance(payload, (bytes, bytearray)):
+        return payload.decode('utf-8')
+    return json.dumps(payload)
+
 def async_log_order(api_type,request_data, response_data):
     try:
-        # Serialize JSON data for storage
-        request_json = json.dumps(request_data)
-        response_json = json.dumps(response_data)
+        # Serialize JSON data for storage (RequestRecord payloads are already encoded)
+        request_json = _encode_log_payload(request_data)
+        response_json = _encode_log_payload(response_data)
 
         # Get current time in IST
         ist = pytz.timezone('Asia/Kolkata')
@@ -11,18 +11,36 @@ from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean
 from sqlalchemy.sql import func
 from dotenv import load_dotenv
 from database.db import db 
+from database.credential_store import credential_store, credential_generations, CREDENTIAL_STORE_TTL
 from cachetools import TTLCache
 import traceback
-from datetime import datetime, timedelta
-from flask_bcrypt import Bcrypt
-
-# Initialize Bcrypt for password hashing
-bcrypt = Bcrypt()
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from utils.password_hasher import password_hasher, PasswordHasherBusy
 
 # Define a cache for the auth tokens and api_key with a max size and a 30-second TTL
 auth_cache = TTLCache(maxsize=1024, ttl=30)
 api_key_cache = TTLCache(maxsize=1024, ttl=30)
 
+# Broker tokens per connection as (generation, BrokerTokenSnapshot); written through by
+# store_broker_tokens. Only the worker running the refresh scheduler writes, so entries
+# carry the connection's credential_generations counter and other workers reload once
+# it moves, as the credential store does
+broker_token_cache = TTLCache(maxsize=1024, ttl=CREDENTIAL_STORE_TTL)
+
+# Each user's broker connections joined with their token state (the brokers page read
+# model) as (generation, views). Connect, disconnect and token store/refresh bump the
+# user's brokers-<user_id> counter in credential_generations, so every worker reloads
+user_brokers_cache = TTLCache(maxsize=1024, ttl=CREDENTIAL_STORE_TTL)
+
+# Legacy Users directory: approval windows per username, so the dashboard doesn't query
+# users on every request. Invalidated by create_user, update_user, approve_user and delete_user
+user_directory_cache = TTLCache(maxsize=4096, ttl=600)
+
+# The user count only absorbs bursts of admin polling: other workers' writes cannot
+# invalidate it, so it is kept for a few seconds rather than the directory's 10 minutes
+user_count_cache = TTLCache(maxsize=1, ttl=5)
+
 load_dotenv()
 
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -79,7 +97,7 @@ class ApiKeys(Base):
     __tablename__ = 'api_keys'
     id = Column(Integer, primary_key=True)
     user_id = Column(String, nullable=False, unique=True)
-    api_key = Column(Text, nullable=False)
+    api_key = Column(Text, nullable=False, index=True)  # Indexed for routing /api/v1 requests by key
     created_at = Column(DateTime(timezone=True), default=func.now())
 
 # New User Authentication System Models
@@ -99,16 +117,17 @@ class NewUsers(Base):
 class UserSessions(Base):
     __tablename__ = 'user_sessions'
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False, index=True)  # Per-user session replacement and revocation
     session_token = Column(String(255), unique=True, nullable=False)
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)  # Expired session sweeps
     created_at = Column(DateTime(timezone=True), default=func.now())
+    last_seen_at = Column(DateTime(timezone=True))  # Batched write-behind from database.session_store
 
 # Broker Connections table for managing broker accounts
 class BrokerConnections(Base):
     __tablename__ = 'broker_connections'
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False, index=True)  # Per-user connection listings and routing
     broker_type = Column(String(50), nullable=False)
     broker_user_id = Column(String(100), nullable=False)
     display_name = Column(String(100))
@@ -124,11 +143,12 @@ class BrokerConnections(Base):
 class BrokerTokens(Base):
     __tablename__ = 'broker_tokens'
     id = Column(Integer, primary_key=True)
-    connection_id = Column(Integer, nullable=False)
+    connection_id = Column(Integer, nullable=False, index=True)  # Token lookups and the connection/token join
     access_token = Column(Text, nullable=False)
     refresh_token = Column(Text)
     feed_token = Column(Text)
-    expires_at = Column(DateTime(timezone=True))
+    expires_at = Column(DateTime(timezone=True), index=True)  # Indexed for the refresh scheduler's expiry scan
+    expiry_in_utc = Column(Boolean)  # NULL on rows whose expires_at was written as naive local time
     created_at = Column(DateTime(timezone=True), default=func.now())
     updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
 
@@ -142,7 +162,7 @@ class Users(Base):
     is_admin = Column(Boolean, default=False)
     is_approved = Column(Boolean, default=False)
     approved_start_date = Column(DateTime(timezone=True), nullable=True)
-    approved_expiry_date = Column(DateTime(timezone=True), nullable=True)
+    approved_expiry_date = Column(DateTime(timezone=True), nullable=True, index=True)  # Admin expiry filters
     created_at = Column(DateTime(timezone=True), default=func.now())
 
 def init_db():
@@ -189,6 +209,7 @@ def upsert_auth(name, auth_token, revoke=False):
         cache_key = f"auth-{name}"
         if cache_key in auth_cache:
             del auth_cache[cache_key]
+        credential_store.invalidate_login(name)
             
         return auth_obj.id
         
@@ -267,6 +288,7 @@ def upsert_api_key(user_id, api_key):
         cache_key = f"api-key-{user_id}"
         if cache_key in api_key_cache:
             del api_key_cache[cache_key]
+        credential_store.invalidate_user(user_id)
             
         return api_key_obj.id
         
@@ -342,6 +364,7 @@ def create_user(username, user_id, apikey, is_admin=False):
         db_session.add(api_key)
         
         db_session.commit()
+        invalidate_user_directory(username)
         print(f"Successfully created user: {username}")
         return {"status": "success", "message": "User created successfully"}
     except Exception as e:
@@ -388,6 +411,94 @@ def get_user_by_id(user_id):
         traceback.print_exc()
         return None
 
+UserApproval = namedtuple('UserApproval', ['username', 'is_admin', 'is_approved', 'approved_start_date', 'approved_expiry_date'])
+
+def get_user_approval(username):
+    """
+    Approval window of a legacy user, served from the user directory cache
+
+    Args:
+        username (str): Username
+
+    Returns:
+        UserApproval: Or None if the user does not exist (misses are not cached)
+    """
+    cache_key = f"user-approval-{username}"
+    if cache_key in user_directory_cache:
+        return user_directory_cache[cache_key]
+
+    row = db_session.query(
+        Users.username, Users.is_admin, Users.is_approved, Users.approved_start_date, Users.approved_expiry_date
+    ).filter(Users.username == username).first()
+    if not row:
+        return None
+    approval = UserApproval(*row)
+    user_directory_cache[cache_key] = approval
+    return approval
+
+def count_users():
+    """Number of legacy users, from a briefly cached COUNT(*) instead of loading every row"""
+    if "user-count" in user_count_cache:
+        return user_count_cache["user-count"]
+    try:
+        count = db_session.query(func.count(Users.id)).scalar()
+        user_count_cache["user-count"] = count
+        return count
+    except Exception as e:
+        print(f"ERROR counting users: {str(e)}")
+        traceback.print_exc()
+        return 0
+
+def invalidate_user_directory(username=None):
+    """Drop a user's cached approval window and the cached user count"""
+    if username:
+        user_directory_cache.pop(f"user-approval-{username}", None)
+    user_count_cache.pop("user-count", None)
+
+UserListRow = namedtuple('UserListRow', ['id', 'username', 'user_id', 'is_admin', 'is_approved', 'approved_expiry_date', 'is_expired'])
+
+def list_users(after_id=None, limit=100, status=None, search=None, now=None):
+    """
+    One page of legacy users for the admin panel
+
+    Uses keyset pagination on the primary key (no OFFSET scan), selects only the
+    listed columns and computes the expiry flag in SQL.
+
+    Args:
+        after_id (int): Return users with an id greater than this (the previous page's next_cursor)
+        limit (int): Page size
+        status (str): 'approved' (approved and not expired), 'expired', 'pending' (not approved) or None for all
+        search (str): Case-insensitive username prefix
+        now (datetime): Expiry reference time, defaults to the current time
+
+    Returns:
+        tuple: (list of UserListRow, next_cursor or None when this is the last page)
+    """
+    from sqlalchemy import and_, case, or_
+    now = now or datetime.now()
+    is_expired = case((Users.approved_expiry_date < now, True), else_=False).label('is_expired')
+    query = db_session.query(
+        Users.id, Users.username, Users.user_id, Users.is_admin, Users.is_approved,
+        Users.approved_expiry_date, is_expired
+    )
+    if after_id:
+        query = query.filter(Users.id > after_id)
+    if status == 'approved':
+        query = query.filter(Users.is_approved == True, or_(
+            Users.approved_expiry_date.is_(None), Users.approved_expiry_date >= now))
+    elif status == 'expired':
+        query = query.filter(and_(Users.approved_expiry_date.isnot(None), Users.approved_expiry_date < now))
+    elif status == 'pending':
+        query = query.filter(or_(Users.is_approved == False, Users.is_approved.is_(None)))
+    if search:
+        query = query.filter(Users.username.ilike(f"{search}%"))
+
+    # Fetch one extra row to learn whether another page follows
+    rows = query.order_by(Users.id).limit(limit + 1).all()
+    page = [UserListRow(*row) for row in rows[:limit]]
+    next_cursor = page[-1].id if len(rows) > limit else None
+    return page, next_cursor
+
 def get_all_users():
     """Get all users from the database"""
     try:
@@ -449,6 +560,7 @@ def update_user(username, new_data):
             user.is_admin = new_data['is_admin']
             
         db_session.commit()
+        invalidate_user_directory(username)
         print(f"Successfully updated user: {username}")
         return {"status": "success", "message": "User updated successfully"}
     except Exception as e:
@@ -482,6 +594,7 @@ def approve_user(username, duration_days):
         user.approved_expiry_date = expiry_date
         
         db_session.commit()
+        invalidate_user_directory(username)
         
         print(f"Successfully approved user {username} for {duration_days} days (until {expiry_date})")
         return {
@@ -502,13 +615,12 @@ def check_user_approval(username):
         return {"is_valid": False, "message": "Username is required"}
     
     try:
-        user = Users.query.filter_by(username=username).first()
+        user = get_user_approval(username)
         if not user:
             print(f"ERROR in check_user_approval: User {username} not found")
             return {"is_valid": False, "message": "User not found"}
         
         # ADMIN APPROVAL FEATURE DISABLED - All registered users are automatically approved
-        print(f"User {username} automatically approved (admin approval disabled)")
         return {
             "is_valid": True, 
             "message": "User automatically approved (admin approval disabled)"
@@ -545,6 +657,7 @@ def delete_user(username):
         # Delete the user
         db_session.delete(user)
         db_session.commit()
+        invalidate_user_directory(username)
         
         print(f"Successfully deleted user: {username}")
         return {"status": "success", "message": "User deleted successfully"}
@@ -713,10 +826,8 @@ def create_user_session(user_id, session_token, expires_at):
         return {"status": "error", "message": "All fields are required"}
     
     try:
-        # Remove any existing sessions for this user
-        existing_sessions = UserSessions.query.filter_by(user_id=user_id).all()
-        for session in existing_sessions:
-            db_session.delete(session)
+        # Remove any existing sessions for this user (one indexed DELETE, no rows loaded)
+        UserSessions.query.filter_by(user_id=user_id).delete(synchronize_session=False)
         
         # Create new session
         session = UserSessions(user_id=user_id, session_token=session_token, expires_at=expires_at)
@@ -779,6 +890,34 @@ def delete_user_session(session_token):
         traceback.print_exc()
         return {"status": "error", "message": f"Database error: {str(e)}"}
 
+def delete_expired_sessions(batch_size=1000, now=None):
+    """
+    Delete one batch of expired sessions, oldest first
+
+    The batch's ids come from an index range scan on expires_at and are deleted
+    with a single set-based statement, so each transaction touches at most
+    batch_size rows and holds its locks briefly.
+
+    Args:
+        batch_size (int): Maximum rows deleted in this batch
+        now (datetime): Expiry cutoff, defaults to the current time
+
+    Returns:
+        int: Number of sessions deleted (less than batch_size once caught up)
+    """
+    try:
+        ids = [row.id for row in db_session.query(UserSessions.id).filter(
+            UserSessions.expires_at < (now or datetime.now())
+        ).order_by(UserSessions.expires_at).limit(batch_size)]
+        if not ids:
+            return 0
+        count = UserSessions.query.filter(UserSessions.id.in_(ids)).delete(synchronize_session=False)
+        db_session.commit()
+        return count
+    except Exception:
+        db_session.rollback()
+        raise
+
 def create_broker_connection(user_id, broker_type, broker_user_id, display_name=None, encrypted_credentials=None):
     """Create a new broker connection with encrypted credentials"""
     if not user_id or not broker_type or not broker_user_id:
@@ -810,6 +949,8 @@ def create_broker_connection(user_id, broker_type, broker_user_id, display_name=
         db_session.add(connection)
         db_session.commit()
         
+        credential_store.invalidate_user(user_id)
+        invalidate_user_brokers(user_id)
         print(f"Successfully created broker connection with encrypted credentials for user {user_id}")
         return {"status": "success", "message": "Broker connection created successfully", "connection_id": connection.id}
     except Exception as e:
@@ -833,15 +974,91 @@ def get_user_broker_connections(user_id):
         traceback.print_exc()
         return []
 
+BrokerConnectionView = namedtuple('BrokerConnectionView', [
+    'id', 'user_id', 'broker_type', 'broker_user_id', 'display_name', 'is_active',
+    'connected_at', 'last_sync_at', 'has_token', 'token_expires_at'
+])
+
+def get_user_broker_views(user_id):
+    """
+    Active broker connections of a user with their token state, from one
+    connection/token outer join, cached per user
+
+    Args:
+        user_id (int): User ID
+
+    Returns:
+        list: BrokerConnectionView tuples (empty on error)
+    """
+    if not user_id:
+        print("ERROR in get_user_broker_views: user_id is empty")
+        return []
+
+    cache_key = f"user-brokers-{user_id}"
+    generation = credential_generations.current(f"brokers-{user_id}")
+    cached = user_brokers_cache.get(cache_key)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    try:
+        rows = db_session.query(
+            BrokerConnections.id, BrokerConnections.user_id, BrokerConnections.broker_type,
+            BrokerConnections.broker_user_id, BrokerConnections.display_name, BrokerConnections.is_active,
+            BrokerConnections.connected_at, BrokerConnections.last_sync_at,
+            BrokerTokens.access_token, BrokerTokens.expires_at
+        ).outerjoin(
+            BrokerTokens, BrokerTokens.connection_id == BrokerConnections.id
+        ).filter(
+            BrokerConnections.user_id == user_id, BrokerConnections.is_active == True
+        ).order_by(BrokerConnections.id, BrokerTokens.id).all()
+
+        # Keyed by connection so that, should a connection have several token rows, the newest
+        # (highest ID) wins, the row get_broker_tokens returns
+        views = {}
+        for row in rows:
+            views[row.id] = BrokerConnectionView(
+                row.id, row.user_id, row.broker_type, row.broker_user_id, row.display_name, row.is_active,
+                row.connected_at, row.last_sync_at, bool(row.access_token), row.expires_at
+            )
+        views = list(views.values())
+        user_brokers_cache[cache_key] = (generation, views)
+        return views
+    except Exception as e:
+        print(f"ERROR getting user broker views: {str(e)}")
+        traceback.print_exc()
+        return []
+
+def invalidate_user_brokers(user_id=None, connection_id=None):
+    """Drop the cached broker listing of a user, or of whichever user owns a connection,
+    in every worker on the host"""
+    if user_id is None:
+        user_id = db_session.query(BrokerConnections.user_id).filter_by(id=connection_id).scalar()
+        if user_id is None:
+            return
+    credential_generations.bump(f"brokers-{user_id}")
+    user_brokers_cache.pop(f"user-brokers-{user_id}", None)
+
+BrokerTokenSnapshot = namedtuple('BrokerTokenSnapshot', ['connection_id', 'access_token', 'refresh_token', 'feed_token', 'expires_at'])
+
+def newest_broker_tokens(connection_id):
+    """Token row of a connection; should it have several, the newest one"""
+    return BrokerTokens.query.filter_by(connection_id=connection_id).order_by(BrokerTokens.id.desc()).first()
+
+def invalidate_broker_tokens(connection_id):
+    """Drop a connection's cached tokens, credentials and listing (e.g. on disconnect)"""
+    broker_token_cache.pop(f"broker-tokens-{connection_id}", None)
+    credential_store.invalidate_connection(connection_id)
+    invalidate_user_brokers(connection_id=connection_id)
+
 def store_broker_tokens(connection_id, access_token, refresh_token=None, feed_token=None, expires_at=None):
-    """Store or update broker tokens for a connection"""
+    """Store or update broker tokens for a connection (expires_at in UTC)"""
     if not connection_id or not access_token:
         print("ERROR in store_broker_tokens: Missing required fields")
         return {"status": "error", "message": "Connection ID and access token are required"}
     
     try:
-        # Check if tokens already exist for this connection
-        existing_tokens = BrokerTokens.query.filter_by(connection_id=connection_id).first()
+        # Check if tokens already exist for this connection (the newest row, as everywhere else)
+        existing_tokens = newest_broker_tokens(connection_id)
         
         if existing_tokens:
             # Update existing tokens
@@ -849,6 +1066,7 @@ def store_broker_tokens(connection_id, access_token, refresh_token=None, feed_to
             existing_tokens.refresh_token = refresh_token
             existing_tokens.feed_token = feed_token
             existing_tokens.expires_at = expires_at
+            existing_tokens.expiry_in_utc = True
             existing_tokens.updated_at = datetime.now()
             print(f"Updated broker tokens for connection {connection_id}")
         else:
@@ -858,12 +1076,20 @@ def store_broker_tokens(connection_id, access_token, refresh_token=None, feed_to
                 access_token=access_token,
                 refresh_token=refresh_token,
                 feed_token=feed_token,
-                expires_at=expires_at
+                expires_at=expires_at,
+                expiry_in_utc=True
             )
             db_session.add(tokens)
             print(f"Created new broker tokens for connection {connection_id}")
         
         db_session.commit()
+        # Invalidate other workers first, then write through under the new generation
+        credential_store.invalidate_connection(connection_id)
+        invalidate_user_brokers(connection_id=connection_id)
+        broker_token_cache[f"broker-tokens-{connection_id}"] = (
+            credential_generations.current(f"connection-{connection_id}"),
+            BrokerTokenSnapshot(connection_id, access_token, refresh_token, feed_token, expires_at)
+        )
         return {"status": "success", "message": "Broker tokens stored successfully"}
     except Exception as e:
         db_session.rollback()
@@ -872,16 +1098,26 @@ def store_broker_tokens(connection_id, access_token, refresh_token=None, feed_to
         return {"status": "error", "message": f"Database error: {str(e)}"}
 
 def get_broker_tokens(connection_id):
-    """Get broker tokens for a connection"""
+    """Get broker tokens for a connection, using cache when available"""
     if not connection_id:
         print("ERROR in get_broker_tokens: connection_id is empty")
         return None
         
+    cache_key = f"broker-tokens-{connection_id}"
+    generation = credential_generations.current(f"connection-{connection_id}")
+    cached = broker_token_cache.get(cache_key)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
     try:
-        tokens = BrokerTokens.query.filter_by(connection_id=connection_id).first()
+        tokens = newest_broker_tokens(connection_id)
         if tokens:
             print(f"Successfully fetched broker tokens for connection {connection_id}")
-            return tokens
+            snapshot = BrokerTokenSnapshot(
+                tokens.connection_id, tokens.access_token, tokens.refresh_token, tokens.feed_token, tokens.expires_at
+            )
+            broker_token_cache[cache_key] = (generation, snapshot)
+            return snapshot
         else:
             print(f"No broker tokens found for connection {connection_id}")
             return None
@@ -890,38 +1126,95 @@ def get_broker_tokens(connection_id):
         traceback.print_exc()
         return None
 
+def convert_legacy_token_expiries():
+    """
+    Rewrite broker token expiries stored before they were written in UTC. Older code
+    stored the server's naive local time (e.g. IST), which token_expired would now read
+    as UTC; those rows carry no expiry_in_utc flag and are converted once.
+
+    Returns:
+        int: Number of rows converted
+    """
+    try:
+        rows = BrokerTokens.query.filter(BrokerTokens.expiry_in_utc.is_(None)).all()
+        for row in rows:
+            if row.expires_at is not None:
+                # The wall-clock value as written (PostgreSQL returns it in the session zone), read as local time
+                row.expires_at = row.expires_at.replace(tzinfo=None).astimezone(timezone.utc)
+            row.expiry_in_utc = True
+        db_session.commit()
+        if rows:
+            print(f"Converted {len(rows)} broker token expiries from local time to UTC")
+        return len(rows)
+    except Exception as e:
+        db_session.rollback()
+        print(f"ERROR converting broker token expiries: {str(e)}")
+        traceback.print_exc()
+        return 0
+    finally:
+        db_session.remove()
+
 # Password and Session Utility Functions
 
 def hash_password(password):
-    """Hash a password using bcrypt"""
+    """Hash a password using bcrypt (on the password hasher's worker pool)"""
     try:
-        if isinstance(password, str):
-            password = password.encode('utf-8')
-        password_hash = bcrypt.generate_password_hash(password, rounds=12)
-        return password_hash.decode('utf-8')
+        return password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         print(f"ERROR hashing password: {str(e)}")
         traceback.print_exc()
         return None
 
 def verify_password(password, password_hash):
-    """Verify a password against its hash"""
+    """Verify a password against its hash (on the password hasher's worker pool)"""
     try:
         if not password_hash:
             print("ERROR: password_hash is None or empty")
             return False
-            
-        if isinstance(password, str):
-            password = password.encode('utf-8')
-            
-        if isinstance(password_hash, str):
-            password_hash = password_hash.encode('utf-8')
-            
-        return bcrypt.check_password_hash(password_hash, password)
+        return password_hasher.verify(password, password_hash)
+    except PasswordHasherBusy:
+        raise
+    except Exception as e:
+        print(f"ERROR verifying password: {str(e)}")
+        traceback.print_exc()
+        return False
+
+def verify_user_password(user, password):
+    """
+    Verify a NewUsers password and, if its hash was made with a different bcrypt
+    cost than PASSWORD_HASH_ROUNDS, store a rehash at the current cost
+
+    Args:
+        user (NewUsers): User loaded in the current session
+        password (str): Plain text password
+
+    Returns:
+        bool: True if the password matches
+
+    Raises:
+        PasswordHasherBusy: The hashing pool is saturated
+    """
+    if not user or not user.password_hash:
+        return False
+    try:
+        valid, new_hash = password_hasher.verify_and_update(password, user.password_hash)
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         print(f"ERROR verifying password: {str(e)}")
         traceback.print_exc()
         return False
+    if valid and new_hash:
+        try:
+            user.password_hash = new_hash
+            db_session.commit()
+            print(f"Rehashed password for user ID {user.id} at cost {password_hasher.rounds}")
+        except Exception as e:
+            db_session.rollback()
+            print(f"ERROR storing rehashed password: {str(e)}")
+    return valid
 
 def generate_session_token():
     """Generate a secure random session token"""
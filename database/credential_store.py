@@ -0,0 +1,263 @@
+# database/credential_store.py
+
+"""
+Process-wide store of decrypted broker credentials for order placement.
+
+Webhook orders carry no Flask session, so every order used to resolve its
+broker token through the 30-second auth_cache and, on each expiry, a DB
+query. The store keeps the access token and API key per broker connection
+(or per legacy login name) until something changes them. upsert_auth,
+store_broker_tokens, key regeneration and broker connects and disconnects
+bump the affected key in credential_generations (see
+utils.shared_generation), so every worker on the host drops its copy on the
+next lookup. An entry whose token has passed expires_at is reloaded, and
+CREDENTIAL_STORE_TTL only bounds how long workers on other hosts keep a
+changed entry. Lookups are a cache read and a shared-memory counter read,
+with no DB access.
+
+It also routes the platform API key sent with /api/v1 requests to its
+user's active broker connection, so one deployment serves many traders
+(see for_api_key). Unknown keys are remembered too, so a client retrying
+with a bad key does not query the database on every request.
+"""
+
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from cachetools import TTLCache
+
+from utils.shared_generation import SharedGenerations
+
+CREDENTIAL_STORE_TTL = int(os.getenv('CREDENTIAL_STORE_TTL', '3600'))
+CREDENTIAL_STORE_CAPACITY = int(os.getenv('CREDENTIAL_STORE_CAPACITY', '10000'))
+
+Credentials = namedtuple('Credentials', ['auth_token', 'api_key', 'connection_id', 'expires_at'])
+Route = namedtuple('Route', ['user_id', 'connection_id', 'login'])
+
+# Bumped by every credential change; also checked by the broker token and listing caches in database.auth_db
+credential_generations = SharedGenerations('credentials')
+
+# Counter of API keys that resolved to no route: any key or connection change may make them valid
+UNROUTED_KEYS = 'unrouted-keys'
+
+
+def token_expired(expires_at, now=None):
+    """
+    Whether a broker token expiry has passed. Expiries are written in UTC; the
+    column comes back timezone-aware from PostgreSQL and naive from SQLite, so
+    naive values are read as UTC.
+    """
+    if expires_at is None:
+        return False
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at <= (now or datetime.now(timezone.utc))
+
+
+class CredentialStore:
+    """Decrypted access token and API key per broker connection, loaded on first use"""
+
+    def __init__(self, ttl=CREDENTIAL_STORE_TTL, capacity=CREDENTIAL_STORE_CAPACITY, generations=None):
+        self.generations = generations or credential_generations
+        # Values are (generation, Credentials); an entry is stale once its key's generation moves
+        self._entries = TTLCache(maxsize=capacity, ttl=ttl)
+        self._routes = TTLCache(maxsize=capacity, ttl=ttl)  # platform api key -> (generation, Route)
+        self._unrouted = TTLCache(maxsize=capacity, ttl=ttl)  # unknown platform api key -> generation
+        self._loading = {}  # entry key -> lock held while loading it
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "invalidations": 0, "rejected": 0}
+
+    def _cached(self, cache, key, generation):
+        with self._lock:
+            entry = cache.get(key)
+        if entry is None or entry[0] != generation:
+            return None
+        return entry[1]
+
+    def _get(self, key, loader):
+        name = _generation_key(*key)
+        credentials = self._cached(self._entries, key, self.generations.current(name))
+        if credentials and not token_expired(credentials.expires_at):
+            self.metrics["hits"] += 1
+            return credentials
+
+        # Serialise loads per key so a burst of webhook orders for one account triggers a
+        # single query, while other accounts load in parallel
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            # Read before loading, so a change made during the load marks the entry stale
+            generation = self.generations.current(name)
+            credentials = self._cached(self._entries, key, generation)
+            if credentials and not token_expired(credentials.expires_at):
+                self.metrics["hits"] += 1
+                return credentials
+            self.metrics["misses"] += 1
+            credentials = loader()
+            with self._lock:
+                if credentials and credentials.auth_token:
+                    self._entries[key] = (generation, credentials)
+                else:
+                    self._entries.pop(key, None)
+            return credentials
+
+    def for_connection(self, connection_id):
+        """
+        Credentials of an active broker connection
+
+        Args:
+            connection_id (int): Broker connection ID
+
+        Returns:
+            Credentials: Or None if the connection is inactive or has no token
+        """
+        return self._get(('connection', connection_id), lambda: _load_connection(connection_id))
+
+    def for_login(self, name):
+        """
+        Credentials of a legacy single-account login (Auth table token plus the
+        BROKER_API_KEY environment variable)
+
+        Args:
+            name (str): Login name, usually LOGIN_USERNAME
+
+        Returns:
+            Credentials: Or None if there is no valid token
+        """
+        if not name:
+            return None
+        return self._get(('login', name), lambda: _load_login(name))
+
+    def for_api_key(self, api_key):
+        """
+        Resolve a platform API key to the credentials orders should be placed with:
+        the owner's most recently connected active broker connection, or the legacy
+        LOGIN_USERNAME account for that account's key
+
+        Args:
+            api_key (str): API key from the request body
+
+        Returns:
+            Credentials: Or None if the key is unknown or its user has no usable broker session
+        """
+        if not api_key:
+            return None
+        unrouted = self.generations.current(UNROUTED_KEYS)
+        with self._lock:
+            entry = self._routes.get(api_key)
+            rejected = self._unrouted.get(api_key) == unrouted
+        if rejected:
+            self.metrics["rejected"] += 1
+            return None
+        route = None
+        if entry is not None and entry[0] == self.generations.current(_generation_key('user', entry[1].user_id)):
+            route = entry[1]
+        if route is None:
+            route = _resolve_route(api_key)
+            with self._lock:
+                if route is None:
+                    self._routes.pop(api_key, None)
+                    self._unrouted[api_key] = unrouted
+                    return None
+                self._unrouted.pop(api_key, None)
+            generation = self.generations.current(_generation_key('user', route.user_id))
+            with self._lock:
+                self._routes[api_key] = (generation, route)
+
+        if route.connection_id is not None:
+            credentials = self.for_connection(route.connection_id)
+        else:
+            credentials = self.for_login(route.login)
+        if credentials is None:
+            # Disconnected or revoked: resolve again next time in case the user has reconnected
+            with self._lock:
+                self._routes.pop(api_key, None)
+        return credentials
+
+    def invalidate_user(self, user_id):
+        """
+        Drop the API key routes of a user (key regenerated, broker connected or
+        disconnected) in every worker on the host, and forget rejected keys, which
+        the change may have made valid
+        """
+        self.generations.bump(_generation_key('user', user_id), UNROUTED_KEYS)
+        user_id = str(user_id)
+        with self._lock:
+            for api_key in [key for key, (_, route) in self._routes.items() if route.user_id == user_id]:
+                self._routes.pop(api_key, None)
+                self.metrics["invalidations"] += 1
+
+    def invalidate_connection(self, connection_id):
+        self._invalidate(('connection', connection_id))
+
+    def invalidate_login(self, name):
+        self._invalidate(('login', name))
+
+    def _invalidate(self, key):
+        self.generations.bump(_generation_key(*key))
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.metrics["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._routes.clear()
+            self._unrouted.clear()
+
+    def get_metrics(self):
+        with self._lock:
+            return dict(self.metrics, entries=len(self._entries), routes=len(self._routes),
+                        unrouted=len(self._unrouted), ttl_seconds=self._entries.ttl)
+
+
+def _generation_key(kind, value):
+    """Counter name of a connection, login or user in credential_generations"""
+    return f"{kind}-{value}"
+
+
+def _load_connection(connection_id):
+    from database.auth_db import BrokerConnections, get_broker_tokens
+    from utils.encryption import encryption_service
+
+    connection = BrokerConnections.query.filter_by(id=connection_id, is_active=True).first()
+    if not connection:
+        return None
+    tokens = get_broker_tokens(connection_id)
+    if not tokens or not tokens.access_token:
+        return None
+    api_key = encryption_service.decrypt_credentials({'api_key': connection.encrypted_api_key})['api_key']
+    return Credentials(tokens.access_token, api_key, connection_id, tokens.expires_at)
+
+
+def _load_login(name):
+    from database.auth_db import get_auth_token_dbquery
+
+    auth_obj = get_auth_token_dbquery(name)
+    if not auth_obj:
+        return None
+    return Credentials(auth_obj.auth, os.getenv('BROKER_API_KEY'), None, None)
+
+
+def _resolve_route(api_key):
+    from database.auth_db import ApiKeys, BrokerConnections
+
+    key_obj = ApiKeys.query.filter_by(api_key=api_key).first()
+    if not key_obj:
+        return None
+    user_id = str(key_obj.user_id)
+    if user_id.isdigit():
+        connection = BrokerConnections.query.filter_by(user_id=int(user_id), is_active=True).order_by(
+            BrokerConnections.connected_at.desc(), BrokerConnections.id.desc()
+        ).first()
+        if connection:
+            return Route(user_id, connection.id, None)
+    if user_id == os.getenv('LOGIN_USERNAME'):
+        return Route(user_id, None, user_id)
+    return None
+
+
+# Global store, invalidated from database.auth_db
+credential_store = CredentialStore()
@@ -0,0 +1,237 @@
+# database/expiry_calendar.py
+
+"""
+Per-underlying expiry calendar precomputed from the scrip master.
+
+Every futures and options contract of an underlying shares a handful of
+expiry dates, so the calendar keeps only the distinct dates, plus the one
+futures contract listed at each futures expiry:
+
+    (exchange, underlying) -> {instrumenttype: sorted expiry dates}
+    (exchange, underlying) -> {futures expiry: FutureContract}
+
+It is built from the mapped scrip snapshot columns when one is published,
+otherwise with one DISTINCT query over idx_name_type_expiry and one query
+for the futures rows, after each master contract load (see
+master_contract_download) and lazily on first use. Nearest-expiry and
+rollover questions are then a bisect instead of a scan of symtoken. The
+option chain index picks expiries with the same selectors (see
+option_chain.pick_expiry), and relative futures orders (option_type FUT in
+resolve_order_symbol) and /search/expiries are answered from here.
+"""
+
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import date, datetime
+
+from database.option_chain import OPTION_EXCHANGES, parse_expiry, pick_expiry, format_expiry
+from database.scrip_snapshot import scrip_snapshot
+
+FutureContract = namedtuple('FutureContract', ['symbol', 'brsymbol', 'token', 'lotsize', 'tick_size'])
+
+FUTURE_INSTRUMENT_TYPES = ('FUTIDX', 'FUTSTK', 'FUTCOM', 'FUTCUR', 'FUTIRC', 'FUTBLN', 'FUTENR')
+# Exchanges tried, in order, when a request names only the underlying
+CALENDAR_EXCHANGES = OPTION_EXCHANGES + ('NSE', 'BSE')
+CALENDAR_COLUMNS = ('exchange', 'name', 'instrumenttype', 'expiry_date')
+FUTURE_COLUMNS = ('exchange', 'name', 'expiry_date', 'symbol', 'brsymbol', 'token', 'lotsize', 'tick_size')
+
+
+class ExpiryCalendar:
+    """Distinct expiry dates per underlying and instrument type, with the futures listed at each"""
+
+    def __init__(self):
+        self._calendar = None  # {(exchange, underlying): {instrumenttype: [date, ...]}}
+        self._futures = None  # {(exchange, underlying): {date: FutureContract}}
+        self._lock = threading.Lock()
+        self.metrics = {"builds": 0, "underlyings": 0, "expiries": 0, "futures": 0, "source": None, "build_ms": None,
+                        "built_at": None}
+
+    def build(self):
+        """
+        Load the distinct expiries of every contract, from the mapped scrip snapshot
+        (symtoken when none is mapped), and replace the calendar
+
+        Returns:
+            int: Number of (underlying, instrument type, expiry) entries
+        """
+        started = time.perf_counter()
+        scrip_snapshot.check()
+        snapshot = scrip_snapshot.current
+        if snapshot is not None:
+            # The mapped snapshot columns replace the per-worker queries
+            source = 'snapshot'
+            rows = [row for row in set(snapshot.select('instrumenttype', None, CALENDAR_COLUMNS))
+                    if row[3] is not None]
+            future_rows = [row for row in snapshot.select('instrumenttype', FUTURE_INSTRUMENT_TYPES, FUTURE_COLUMNS)
+                           if row[2] is not None]
+        else:
+            from database.master_contract_db import SymToken, db_session
+
+            source = 'database'
+            try:
+                rows = db_session.query(
+                    *(getattr(SymToken, column) for column in CALENDAR_COLUMNS)
+                ).filter(SymToken.expiry_date.isnot(None)).distinct().all()
+                future_rows = db_session.query(
+                    *(getattr(SymToken, column) for column in FUTURE_COLUMNS)
+                ).filter(SymToken.instrumenttype.in_(FUTURE_INSTRUMENT_TYPES), SymToken.expiry_date.isnot(None)).all()
+            finally:
+                db_session.remove()
+
+        calendar = {}
+        for exchange, name, instrumenttype, expiry_date in rows:
+            if not name:
+                continue
+            calendar.setdefault((exchange, name.upper()), {}).setdefault(instrumenttype, []).append(expiry_date)
+        for by_type in calendar.values():
+            for expiries in by_type.values():
+                expiries.sort()
+
+        futures = {}
+        for exchange, name, expiry_date, symbol, brsymbol, token, lotsize, tick_size in future_rows:
+            if name:
+                # First contract wins, like .first() on the table
+                futures.setdefault((exchange, name.upper()), {}).setdefault(
+                    expiry_date, FutureContract(symbol, brsymbol, token, lotsize, tick_size))
+
+        with self._lock:
+            self._calendar = calendar
+            self._futures = futures
+            self.metrics.update(
+                builds=self.metrics["builds"] + 1, underlyings=len(calendar), expiries=len(rows),
+                futures=len(future_rows), source=source, build_ms=round((time.perf_counter() - started) * 1000, 1),
+                built_at=datetime.now().isoformat()
+            )
+        print(f"Expiry calendar built: {len(calendar)} underlyings, {len(rows)} expiries in {self.metrics['build_ms']} ms")
+        return len(rows)
+
+    def _get_calendar(self):
+        calendar = self._calendar
+        if calendar is None:
+            self.build()
+            calendar = self._calendar or {}
+        return calendar
+
+    def _find(self, underlying, exchange=None):
+        """(exchange, {instrumenttype: expiries}) of the first exchange listing the underlying"""
+        calendar = self._get_calendar()
+        underlying = (underlying or '').upper()
+        for candidate in ((exchange,) if exchange else CALENDAR_EXCHANGES):
+            by_type = calendar.get((candidate, underlying))
+            if by_type:
+                return candidate, by_type
+        return None, None
+
+    def expiries(self, underlying, instrumenttype=None, exchange=None, include_expired=False, today=None):
+        """
+        Expiry dates of an underlying, nearest first
+
+        Args:
+            underlying (str): Underlying name as in symtoken.name (e.g. NIFTY)
+            instrumenttype (str|tuple): e.g. FUTIDX or OPTIDX, or several; every type when omitted
+            exchange (str): The first exchange listing the underlying when omitted
+            include_expired (bool): Keep expiries before today
+
+        Returns:
+            list: dates
+        """
+        _, by_type = self._find(underlying, exchange)
+        if not by_type:
+            return []
+        if isinstance(instrumenttype, str):
+            expiries = by_type.get(instrumenttype, [])
+        else:
+            types = instrumenttype or by_type.keys()
+            expiries = sorted(set().union(*(by_type.get(name, ()) for name in types)))
+        if include_expired:
+            return list(expiries)
+        return expiries[bisect_left(expiries, today or date.today()):]
+
+    def nearest(self, underlying, instrumenttype=None, exchange=None, today=None):
+        """Nearest live expiry (today counts as live), or None"""
+        live = self.expiries(underlying, instrumenttype, exchange, today=today)
+        return live[0] if live else None
+
+    def next_after(self, underlying, expiry, instrumenttype=None, exchange=None):
+        """
+        Rollover target: the first expiry strictly after the given one
+
+        Args:
+            expiry (str|date): '28-MAR-24' or a date
+
+        Returns:
+            date: Or None if the underlying has no later expiry
+        """
+        current = parse_expiry(expiry)
+        if current is None:
+            return None
+        expiries = self.expiries(underlying, instrumenttype, exchange, include_expired=True)
+        position = bisect_right(expiries, current)
+        return expiries[position] if position < len(expiries) else None
+
+    def resolve_future(self, underlying, expiry=None, exchange=None, today=None):
+        """
+        Futures contract of an underlying for an expiry selector
+
+        Args:
+            underlying (str): e.g. NIFTY or CRUDEOIL
+            expiry (str): Selector as in option_chain.pick_expiry; the nearest live
+                futures expiry when omitted, next_week / next_month for the rollover contract
+            exchange (str): Optional, the first exchange listing futures when omitted
+
+        Returns:
+            tuple: (exchange, expiry date, FutureContract)
+
+        Raises:
+            ValueError: When no such futures contract is listed
+        """
+        self._get_calendar()
+        futures = self._futures or {}
+        underlying_key = (underlying or '').upper()
+        for candidate in ((exchange,) if exchange else CALENDAR_EXCHANGES):
+            by_expiry = futures.get((candidate, underlying_key))
+            if by_expiry:
+                break
+        else:
+            raise ValueError(f"No futures listed for {underlying}")
+
+        live = self.expiries(underlying, FUTURE_INSTRUMENT_TYPES, candidate, today=today)
+        expiry_date = pick_expiry(live, expiry)
+        if expiry_date is None or expiry_date not in by_expiry:
+            raise ValueError(f"No {expiry or 'current_week'} futures expiry listed for {underlying}")
+        return candidate, expiry_date, by_expiry[expiry_date]
+
+    def summary(self, underlying, instrumenttype=None, exchange=None, today=None):
+        """
+        Live expiries of an underlying with the nearest one and its rollover target
+
+        Returns:
+            dict: {"underlying", "exchange", "expiries", "nearest", "rollover"} or None if not listed
+        """
+        exchange, by_type = self._find(underlying, exchange)
+        if not by_type:
+            return None
+        live = self.expiries(underlying, instrumenttype, exchange, today=today)
+        rollover = self.next_after(underlying, live[0], instrumenttype, exchange) if live else None
+        return {
+            "underlying": underlying.upper(),
+            "exchange": exchange,
+            "expiries": [format_expiry(expiry) for expiry in live],
+            "nearest": format_expiry(live[0]) if live else None,
+            "rollover": format_expiry(rollover) if rollover else None
+        }
+
+    def invalidate(self):
+        """Drop the calendar; the next lookup rebuilds it"""
+        with self._lock:
+            self._calendar = None
+            self._futures = None
+
+    def get_metrics(self):
+        return dict(self.metrics, loaded=self._calendar is not None)
+
+
+# Global calendar, rebuilt after each master contract load
+expiry_calendar = ExpiryCalendar()
@@ -1,13 +1,11 @@
 #database/master_contract_db.py
 
 import os
-import pandas as pd
-import requests
 import gzip
 import shutil
-from datetime import datetime
+from datetime import date, datetime
 
-from sqlalchemy import create_engine, Column, Integer, String, Float , Sequence, Index
+from sqlalchemy import create_engine, Column, Integer, String, Float , Sequence, Index, Date, bindparam
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from dotenv import load_dotenv
@@ -33,13 +31,19 @@ class SymToken(Base):
     brexchange = Column(String, index=True)  
     token = Column(String, index=True)  # Indexed for performance
     expiry = Column(String)
+    expiry_date = Column(Date)  # Parsed expiry, None for contracts without one
+    expiry_ordinal = Column(Integer)  # expiry_date.toordinal(), for cheap integer comparisons
     strike = Column(Float)
     lotsize = Column(Integer)
     instrumenttype = Column(String)
     tick_size = Column(Float)
 
-    # Define a composite index on symbol and exchange columns
-    __table_args__ = (Index('idx_symbol_exchange', 'symbol', 'exchange'),)
+    # Define a composite index on symbol and exchange columns; near-expiry and rollover
+    # queries range-scan the (name, instrumenttype, expiry_date) index
+    __table_args__ = (
+        Index('idx_symbol_exchange', 'symbol', 'exchange'),
+        Index('idx_name_type_expiry', 'name', 'instrumenttype', 'expiry_date'),
+    )
 
 def init_db():
     print("Initializing Master Contract DB")
@@ -51,6 +55,12 @@ def delete_symtoken_table():
     db_session.commit()
 
 def copy_from_dataframe(df):
+    """
+    Bulk insert the processed contracts
+
+    Returns:
+        list: The inserted records, or None if the insert failed
+    """
     print("Performing Bulk Insert")
     # Convert DataFrame to a list of dictionaries
     data_dict = df.to_dict(orient='records')
@@ -69,14 +79,107 @@ def copy_from_dataframe(df):
             print(f"Bulk insert completed successfully with {len(filtered_data_dict)} new records.")
         else:
             print("No new records to insert.")
+        return filtered_data_dict
     except Exception as e:
         print(f"Error during bulk insert: {e}")
         db_session.rollback()
+        return None
+
+def backfill_expiry_columns():
+    """
+    Fill expiry_date and expiry_ordinal on rows loaded before those columns existed
+
+    Returns:
+        int: Number of distinct expiry strings backfilled
+    """
+    from database.option_chain import parse_expiry
+
+    try:
+        pending = [expiry for (expiry,) in db_session.query(SymToken.expiry).filter(
+            SymToken.expiry_date.is_(None), SymToken.expiry.isnot(None), SymToken.expiry != ''
+        ).distinct()]
+        params = []
+        for expiry in pending:
+            expiry_date = parse_expiry(expiry)
+            if expiry_date:
+                params.append({"b_expiry": expiry, "b_expiry_date": expiry_date,
+                               "b_expiry_ordinal": expiry_date.toordinal()})
+        if params:
+            db_session.execute(
+                SymToken.__table__.update()
+                .where(SymToken.__table__.c.expiry == bindparam('b_expiry'), SymToken.__table__.c.expiry_date.is_(None))
+                .values(expiry_date=bindparam('b_expiry_date'), expiry_ordinal=bindparam('b_expiry_ordinal')),
+                params
+            )
+            db_session.commit()
+            print(f"Backfilled expiry dates for {len(params)} expiries")
+        return len(params)
+    except Exception as e:
+        print(f"Error backfilling expiry dates: {e}")
+        db_session.rollback()
+        return 0
+    finally:
+        db_session.remove()
+
+def prune_expired_contracts(before=None):
+    """
+    Delete every contract that expired before a date in one statement
+
+    Args:
+        before (date): Defaults to today, so contracts expiring today are kept
+
+    Returns:
+        int: Number of rows deleted
+    """
+    before = before or date.today()
+    try:
+        deleted = SymToken.query.filter(SymToken.expiry_date < before).delete(synchronize_session=False)
+        db_session.commit()
+        print(f"Pruned {deleted} contracts expired before {before.isoformat()}")
+        return deleted
+    except Exception as e:
+        print(f"Error pruning expired contracts: {e}")
+        db_session.rollback()
+        return 0
+    finally:
+        db_session.remove()
+
+def compact_symtoken(reindex=False):
+    """
+    Reclaim the space of deleted rows and refresh planner statistics: VACUUM and ANALYZE
+    on SQLite (VACUUM rebuilds the whole file, indexes included), VACUUM ANALYZE on
+    PostgreSQL plus, when reindex is set, REINDEX TABLE CONCURRENTLY to shrink the indexes
+    without blocking readers. Other databases only get ANALYZE where supported.
+
+    Returns:
+        list: Statements that ran
+    """
+    from sqlalchemy import text
+
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        statements = ['VACUUM', 'ANALYZE symtoken']
+    elif dialect == 'postgresql':
+        statements = ['VACUUM (ANALYZE) symtoken'] + (['REINDEX TABLE CONCURRENTLY symtoken'] if reindex else [])
+    else:
+        statements = ['ANALYZE TABLE symtoken'] if dialect == 'mysql' else []
+
+    completed = []
+    # VACUUM cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for statement in statements:
+            try:
+                connection.execute(text(statement))
+                completed.append(statement)
+            except Exception as e:
+                print(f"Error running {statement}: {e}")
+    return completed
 
 def download_json_angel_data(url, output_path):
     """
     Downloads a JSON file from the specified URL and saves it to the specified path.
     """
+    import requests  # Deferred: only needed for the daily master contract download
     print("Downloading JSON data")
     response = requests.get(url, timeout=10)  # timeout after 10 seconds
     if response.status_code == 200:  # Successful download
@@ -124,6 +227,8 @@ def process_angel_json(path):
     Returns:
     DataFrame: The processed DataFrame ready to be inserted into the database.
     """
+    import pandas as pd  # Deferred: keeps pandas out of the app's cold start
+
     # Read JSON data into a DataFrame
     df = pd.read_json(path)
     
@@ -161,7 +266,12 @@ def process_angel_json(path):
     df['expiry'] = df['expiry'].apply(lambda x: convert_date(x) if pd.notnull(x) else x)
     df['expiry'] = df['expiry'].str.upper()
 
-    
+    # Native expiry date and day ordinal, so expiry queries never parse strings
+    from database.option_chain import parse_expiry
+    expiry_dates = [parse_expiry(expiry) for expiry in df['expiry']]
+    df['expiry_date'] = pd.Series(expiry_dates, index=df.index, dtype=object)
+    df['expiry_ordinal'] = pd.Series([expiry.toordinal() if expiry else None for expiry in expiry_dates],
+                                     index=df.index, dtype=object)
 
 
     # Convert 'strike' to float, 'lotsize' to int, and 'tick_size' to float as per the database schema
@@ -201,7 +311,21 @@ def delete_angel_temp_data(output_path):
         print(f"An error occurred while deleting the file: {e}")
 
 
-def master_contract_download():
+def master_contract_download(force=False):
+    """
+    Download, process and load the scrip master, then rebuild the lookup structures
+    and publish a new scrip snapshot
+
+    Args:
+        force (bool): Download even when today's snapshot is already published
+    """
+    from database.scrip_snapshot import scrip_snapshot
+
+    if not force and scrip_snapshot.is_current() and SymToken.query.first() is not None:
+        db_session.remove()
+        print("Master contract already loaded today, skipping download")
+        return socketio.emit('master_contract_download', {'status': 'success', 'message': 'Master contract is current'})
+
     print("Downloading Master Contract")
     url = 'https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json'
     output_path = 'tmp/angel.json'
@@ -214,7 +338,16 @@ def master_contract_download():
         #token_df = token_df.drop_duplicates(subset='symbol', keep='first')
 
         delete_symtoken_table()  # Consider the implications of this action
-        copy_from_dataframe(token_df)
+        inserted = copy_from_dataframe(token_df)
+        if inserted:
+            # Only a load that reached the database is trusted by the next restart
+            scrip_snapshot.publish(inserted)
+
+        # Rebuild the in-memory option chains and expiry calendar from the new contracts
+        from database.option_chain import option_chain_index
+        from database.expiry_calendar import expiry_calendar
+        option_chain_index.build()
+        expiry_calendar.build()
                 
         return socketio.emit('master_contract_download', {'status': 'success', 'message': 'Successfully Downloaded'})
 
@@ -0,0 +1,86 @@
+# database/migrate.py
+
+"""
+One-off schema migration step.
+
+Creates the auth, master contract and API log tables, plus columns and
+indexes added to existing tables, and converts data stored in older
+formats. The app runs this at startup only when AUTO_CREATE_TABLES is on
+(the default outside serverless); on Vercel run it once per deploy instead
+of on every cold start:
+
+    python -m database.migrate
+"""
+
+from database.auth_db import (
+    init_db as ensure_auth_tables_exists, Base as AuthBase, engine as auth_engine, convert_legacy_token_expiries
+)
+from database.master_contract_db import (
+    init_db as ensure_master_contract_tables_exists, Base as MasterContractBase, engine as master_contract_engine,
+    backfill_expiry_columns
+)
+from database.apilog_db import init_db as ensure_api_log_tables_exists
+
+
+def ensure_indexes(base, engine):
+    """
+    Create indexes added to models after their tables already existed
+    (create_all only creates indexes together with new tables)
+    """
+    for table in base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                print(f"ERROR creating index {index.name}: {str(e)}")
+
+
+def ensure_columns(base, engine):
+    """
+    Add nullable columns added to models after their tables already existed
+    (create_all never alters existing tables)
+
+    Returns:
+        set: 'table.column' names added by this run
+    """
+    from sqlalchemy import inspect, text
+    inspector = inspect(engine)
+    added = set()
+    for table in base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}'
+                    ))
+                print(f"Added column {table.name}.{column.name}")
+                added.add(f"{table.name}.{column.name}")
+            except Exception as e:
+                print(f"ERROR adding column {table.name}.{column.name}: {str(e)}")
+    return added
+
+
+def run_migrations():
+    """Create any missing tables, columns and indexes in the three schemas"""
+    ensure_auth_tables_exists()
+    ensure_columns(AuthBase, auth_engine)
+    ensure_indexes(AuthBase, auth_engine)
+    # Broker token expiries written as naive local time before they were stored in UTC
+    convert_legacy_token_expiries()
+    ensure_master_contract_tables_exists()
+    added = ensure_columns(MasterContractBase, master_contract_engine)
+    ensure_indexes(MasterContractBase, master_contract_engine)
+    if 'symtoken.expiry_date' in added:
+        # Rows loaded before the column existed; later loads write it themselves
+        backfill_expiry_columns()
+    ensure_api_log_tables_exists()
+
+
+if __name__ == '__main__':
+    run_migrations()
+    print("Migrations complete")
@@ -0,0 +1,352 @@
+# database/option_chain.py
+
+"""
+In-memory option chains built from the scrip master.
+
+The symtoken table can only be searched with LIKE, so resolving the legs
+of an options strategy meant one query per leg. OptionChainIndex loads
+every option contract once and keeps, per (exchange, underlying):
+
+    sorted expiry dates -> sorted strike list + {strike: {"CE": leg, "PE": leg}}
+
+The contracts are read from the mapped scrip snapshot when one is
+published, so each worker builds its chains from the pages shared by every
+worker instead of scanning symtoken; without a snapshot it queries the
+table. Lookups are dict reads and a bisect. The index is rebuilt in the
+background thread after each master contract load (see
+master_contract_download) and lazily on first use; a rebuild swaps the
+whole structure in one assignment, so readers never see a half-built chain.
+"""
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import date, datetime
+
+from database.scrip_snapshot import scrip_snapshot
+
+OptionLeg = namedtuple('OptionLeg', ['symbol', 'brsymbol', 'token', 'lotsize', 'tick_size'])
+ExpirySeries = namedtuple('ExpirySeries', ['expiry', 'strikes', 'legs'])  # legs: {strike: {"CE"/"PE": OptionLeg}}
+Underlying = namedtuple('Underlying', ['expiries', 'series'])  # sorted expiry dates, ExpirySeries in the same order
+
+OPTION_INSTRUMENT_TYPES = ('OPTIDX', 'OPTSTK', 'OPTFUT', 'OPTCUR', 'OPTIRC', 'OPTCOM', 'OPTBLN', 'OPTENR')
+# Exchanges tried, in order, when a request names only the underlying
+OPTION_EXCHANGES = ('NFO', 'BFO', 'MCX', 'CDS')
+OPTION_COLUMNS = ('exchange', 'name', 'expiry', 'expiry_date', 'strike', 'symbol', 'brsymbol', 'token', 'lotsize',
+                  'tick_size')
+
+
+def parse_expiry(expiry):
+    """'28-MAR-24' (the symtoken format) -> date, or None"""
+    if isinstance(expiry, date):
+        return expiry
+    return _parse_expiry_string(expiry)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_expiry_string(expiry):
+    try:
+        return datetime.strptime(expiry, '%d-%b-%y').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def format_expiry(expiry):
+    """date -> '28-MAR-24'"""
+    return expiry.strftime('%d-%b-%y').upper()
+
+
+class OptionChainIndex:
+    """Per-underlying expiry and strike ladders of every option in symtoken"""
+
+    def __init__(self):
+        self._chains = None  # {(exchange, underlying): Underlying}
+        self._lock = threading.Lock()
+        self.metrics = {"builds": 0, "contracts": 0, "underlyings": 0, "source": None, "build_ms": None,
+                        "built_at": None}
+
+    def build(self):
+        """
+        Load every option contract from the mapped scrip snapshot (symtoken when none is
+        mapped) and replace the index
+
+        Returns:
+            int: Number of contracts indexed
+        """
+        started = time.perf_counter()
+        scrip_snapshot.check()
+        snapshot = scrip_snapshot.current
+        if snapshot is not None:
+            # Read the columns every worker already maps instead of scanning symtoken per worker
+            source = 'snapshot'
+            rows = snapshot.select('instrumenttype', OPTION_INSTRUMENT_TYPES, OPTION_COLUMNS)
+        else:
+            from database.master_contract_db import SymToken, db_session
+
+            source = 'database'
+            try:
+                rows = db_session.query(
+                    *(getattr(SymToken, column) for column in OPTION_COLUMNS)
+                ).filter(SymToken.instrumenttype.in_(OPTION_INSTRUMENT_TYPES)).all()
+            finally:
+                db_session.remove()
+
+        series = {}
+        for exchange, name, expiry, expiry_date, strike, symbol, brsymbol, token, lotsize, tick_size in rows:
+            option_type = (brsymbol or symbol or '')[-2:]
+            expiry_date = expiry_date or parse_expiry(expiry)
+            if option_type not in ('CE', 'PE') or expiry_date is None or strike is None or not name:
+                continue
+            strikes = series.setdefault((exchange, name.upper()), {}).setdefault(expiry_date, {})
+            strikes.setdefault(strike, {})[option_type] = OptionLeg(symbol, brsymbol, token, lotsize, tick_size)
+
+        chains = {}
+        for key, by_expiry in series.items():
+            expiries = sorted(by_expiry)
+            chains[key] = Underlying(expiries, [ExpirySeries(expiry, sorted(by_expiry[expiry]), by_expiry[expiry])
+                                                for expiry in expiries])
+        with self._lock:
+            self._chains = chains
+            self.metrics.update(
+                builds=self.metrics["builds"] + 1, contracts=len(rows), underlyings=len(chains), source=source,
+                build_ms=round((time.perf_counter() - started) * 1000, 1), built_at=datetime.now().isoformat()
+            )
+        print(f"Option chain index built: {len(rows)} contracts, {len(chains)} underlyings in {self.metrics['build_ms']} ms")
+        return len(rows)
+
+    def _get_chains(self):
+        chains = self._chains
+        if chains is None:
+            self.build()
+            chains = self._chains or {}
+        return chains
+
+    def series(self, underlying, exchange=None):
+        """
+        Every expiry of an underlying, nearest first
+
+        Args:
+            underlying (str): Underlying name as in symtoken.name (e.g. NIFTY)
+            exchange (str): NFO, BFO, MCX or CDS; the first exchange listing it when omitted
+
+        Returns:
+            tuple: (exchange, Underlying), or (None, None) if unknown
+        """
+        chains = self._get_chains()
+        underlying = (underlying or '').upper()
+        for candidate in ((exchange,) if exchange else OPTION_EXCHANGES):
+            found = chains.get((candidate, underlying))
+            if found:
+                return candidate, found
+        return None, None
+
+    def expiries(self, underlying, exchange=None, include_expired=False, today=None):
+        """Expiry dates of an underlying, nearest first (past expiries skipped unless include_expired)"""
+        _, found = self.series(underlying, exchange)
+        if found is None:
+            return []
+        if include_expired:
+            return list(found.expiries)
+        return found.expiries[bisect_left(found.expiries, today or date.today()):]
+
+    def get_series(self, underlying, expiry=None, exchange=None, today=None):
+        """
+        One expiry of an underlying
+
+        Args:
+            expiry (str|date): '28-MAR-24' or a date; the nearest live expiry when omitted
+
+        Returns:
+            tuple: (exchange, ExpirySeries) or (exchange, None)
+        """
+        exchange, found = self.series(underlying, exchange)
+        if found is None:
+            return exchange, None
+        expiries = found.expiries
+        if expiry is None:
+            position = bisect_left(expiries, today or date.today())
+        else:
+            wanted = parse_expiry(expiry)
+            position = bisect_left(expiries, wanted) if wanted else len(expiries)
+            if position < len(expiries) and expiries[position] != wanted:
+                position = len(expiries)
+        return exchange, (found.series[position] if position < len(expiries) else None)
+
+    def select_expiry(self, underlying, selector=None, exchange=None, today=None):
+        """
+        Pick an option expiry of an underlying by name
+
+        Args:
+            selector (str): See pick_expiry
+
+        Returns:
+            date: Or None if there is no such expiry
+        """
+        return pick_expiry(self.expiries(underlying, exchange, today=today), selector)
+
+    def resolve(self, underlying, option_type, reference_price, expiry=None, offset=0, exchange=None, today=None):
+        """
+        Resolve a relative option spec to a contract: the strike nearest the reference
+        price (ATM) found by binary search over the sorted strike ladder, moved by offset
+
+        Args:
+            underlying (str): e.g. NIFTY
+            option_type (str): CE or PE
+            reference_price (float): Underlying price the ATM strike is taken from
+            expiry (str): Expiry selector, see select_expiry
+            offset (int|str): Strike steps from ATM, either signed (+1 = next higher strike)
+                or ATM / ITM<n> / OTM<n> relative to the option type
+            exchange (str): Optional, as in series()
+
+        Returns:
+            tuple: (exchange, expiry date, strike, OptionLeg)
+
+        Raises:
+            ValueError: When the spec cannot be resolved
+        """
+        option_type = (option_type or '').upper()
+        if option_type not in ('CE', 'PE'):
+            raise ValueError("option_type must be CE or PE")
+        steps = strike_steps(offset, option_type)
+        expiry_date = self.select_expiry(underlying, expiry, exchange, today)
+        if expiry_date is None:
+            raise ValueError(f"No {expiry or 'current_week'} expiry listed for {underlying}")
+        exchange, series = self.get_series(underlying, expiry_date, exchange)
+
+        strikes = series.strikes
+        position = bisect_left(strikes, reference_price)
+        if position == len(strikes) or (position > 0 and reference_price - strikes[position - 1] <= strikes[position] - reference_price):
+            position -= 1
+        position += steps
+        if not 0 <= position < len(strikes):
+            raise ValueError(f"Strike offset {offset} is outside the listed strikes for {underlying} {format_expiry(expiry_date)}")
+
+        strike = strikes[position]
+        leg = series.legs[strike].get(option_type)
+        if leg is None:
+            raise ValueError(f"No {option_type} listed at strike {strike:g}")
+        return exchange, expiry_date, strike, leg
+
+    def get_chain(self, underlying, expiry=None, exchange=None):
+        """
+        Full strike ladder of one expiry with CE/PE contracts
+
+        Returns:
+            dict: {"underlying", "exchange", "expiry", "expiries", "strikes": [{"strike", "CE", "PE"}]}
+                or None if the underlying or expiry is not listed
+        """
+        exchange, series = self.get_series(underlying, expiry, exchange)
+        if series is None:
+            return None
+
+        def leg(strike, option_type):
+            contract = series.legs[strike].get(option_type)
+            return contract._asdict() if contract else None
+
+        return {
+            "underlying": underlying.upper(),
+            "exchange": exchange,
+            "expiry": format_expiry(series.expiry),
+            "expiries": [format_expiry(expiry) for expiry in self.expiries(underlying, exchange)],
+            "strikes": [{"strike": strike, "CE": leg(strike, "CE"), "PE": leg(strike, "PE")} for strike in series.strikes]
+        }
+
+    def invalidate(self):
+        """Drop the index; the next lookup rebuilds it"""
+        with self._lock:
+            self._chains = None
+
+    def get_metrics(self):
+        return dict(self.metrics, loaded=self._chains is not None)
+
+
+def pick_expiry(live, selector=None):
+    """
+    Pick an expiry from live expiry dates (nearest first) by name: current_week (nearest,
+    the default), next_week, current_month (last expiry in the nearest expiry's month),
+    next_month, or an explicit DD-MON-YY. Also used for futures (see expiry_calendar).
+
+    Returns:
+        date: Or None if there is no such expiry
+    """
+    if not live:
+        return None
+    selector = (selector or 'current_week').lower()
+    if selector == 'current_week':
+        return live[0]
+    if selector == 'next_week':
+        return live[1] if len(live) > 1 else None
+    if selector in ('current_month', 'next_month'):
+        year, month = live[0].year, live[0].month
+        if selector == 'next_month':
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        in_month = [expiry for expiry in live if (expiry.year, expiry.month) == (year, month)]
+        return in_month[-1] if in_month else None
+    wanted = parse_expiry(selector.upper())
+    return wanted if wanted in live else None
+
+
+def strike_steps(offset, option_type):
+    """Signed strike steps for an offset given as an int or ATM / ITM<n> / OTM<n>"""
+    if isinstance(offset, int):
+        return offset
+    text = str(offset or 0).strip().upper()
+    if text in ('', 'ATM'):
+        return 0
+    try:
+        if text[:3] in ('ITM', 'OTM'):
+            count = int(text[3:] or 1)
+            # Calls go out of the money upwards, puts downwards
+            higher = (text[:3] == 'OTM') == (option_type == 'CE')
+            return count if higher else -count
+        return int(text)
+    except ValueError:
+        raise ValueError("strike_offset must be an integer, ATM, ITM<n> or OTM<n>")
+
+
+def resolve_order_symbol(data):
+    """
+    Fill in symbol and exchange of an /api/v1 order given as a relative option spec
+    (underlying, expiry, strike_offset, option_type, underlying_ltp), or as a relative
+    futures spec (underlying, expiry, option_type FUT; see expiry_calendar). The token
+    and broker symbol caches are primed with the resolved contract, so the order path
+    does no further symtoken lookups.
+
+    Args:
+        data (dict): Request body, updated in place
+
+    Returns:
+        OptionLeg|FutureContract: The resolved contract
+
+    Raises:
+        ValueError: Missing fields or no matching contract
+    """
+    from database.token_db import token_cache
+
+    if not data.get('option_type'):
+        raise ValueError("option_type (CE, PE or FUT) is required with underlying")
+    if str(data['option_type']).upper() == 'FUT':
+        from database.expiry_calendar import expiry_calendar
+        exchange, _, leg = expiry_calendar.resolve_future(data['underlying'], data.get('expiry'),
+                                                          data.get('exchange') or None)
+    else:
+        try:
+            reference_price = float(data['underlying_ltp'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("underlying_ltp (the underlying's current price) is required with underlying")
+
+        exchange, _, _, leg = option_chain_index.resolve(
+            data['underlying'], data['option_type'], reference_price, data.get('expiry'),
+            data.get('strike_offset', 0), data.get('exchange') or None
+        )
+    data['symbol'] = leg.symbol
+    data['exchange'] = exchange
+    token_cache[f"{leg.symbol}-{exchange}"] = leg.token
+    token_cache[f"br{leg.symbol}-{exchange}"] = leg.brsymbol
+    return leg
+
+
+# Global index, rebuilt after each master contract load
+option_chain_index = OptionChainIndex()
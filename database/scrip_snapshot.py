@@ -0,0 +1,505 @@
+# database/scrip_snapshot.py
+
+"""
+Memory-mapped binary snapshot of the processed scrip master.
+
+After a restart the token caches start cold and every symbol lookup goes to
+the database. Each master contract load therefore also writes the processed
+contracts to one file that any process can mmap read-only: opening it costs
+a header read, lookups touch a few pages, and the OS page cache shares
+those pages between every worker on the host.
+
+Layout (little-endian, sections 8-byte aligned):
+
+    header     magic, format version, master date (day ordinal), row count,
+               created-at timestamp, hash table slots, string count,
+               generation
+    directory  (offset, length) of each section below
+    strings    u32 offsets + UTF-8 blob of every distinct string
+    columns    one array per SymToken column: u32 string ids for text,
+               f64 for strike / tick_size, i32 for lotsize / expiry_ordinal
+    tables     three open-addressing hash tables of u32 row numbers (+1,
+               0 = empty) keyed by (symbol, exchange), (token, exchange)
+               and (brsymbol, exchange), probed linearly from crc32(key)
+
+The file is written to a temporary name and renamed over the old one, so a
+reader never maps a half-written snapshot.
+
+Every worker process maps the same file, so the symbol table exists once
+per host however many workers run. Next to it, an 8-byte control file
+(<snapshot>.gen), also mapped by every worker, holds the generation of the
+last published snapshot. The process that runs the master contract load
+writes the new snapshot, renames it into place and only then bumps the
+generation. Other workers compare that counter with the generation in the
+header of their mapping (one shared-memory read per request) and remap the
+new file when it moves, dropping their per-process caches, without a
+restart. Only publishing creates files; a worker that starts before the
+first publish looks for the counter every CONTROL_RETRY_SECONDS.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import namedtuple
+from datetime import date, datetime
+
+try:
+    import fcntl  # Serialises publishers; not available on Windows
+except ImportError:
+    fcntl = None
+
+SCRIP_SNAPSHOT_PATH = os.getenv('SCRIP_SNAPSHOT_PATH', 'db/scrip_master.snap')
+
+MAGIC = b'TMSCRIP\x00'
+FORMAT_VERSION = 2
+# magic, version, header size, master date, rows, created at, slots, strings, generation
+HEADER = struct.Struct('<8sHHIIdIIQ')
+GENERATION = struct.Struct('<Q')
+CONTROL_RETRY_SECONDS = 5
+
+TEXT_COLUMNS = ('symbol', 'brsymbol', 'name', 'exchange', 'brexchange', 'token', 'expiry', 'instrumenttype')
+NUMBER_COLUMNS = (('strike', 'd'), ('lotsize', 'i'), ('tick_size', 'd'), ('expiry_ordinal', 'i'))
+# Hash tables: name -> column looked up together with exchange
+TABLES = (('symbol', 'symbol'), ('token', 'token'), ('brsymbol', 'brsymbol'))
+SECTIONS = (('string_offsets', 'I'), ('string_blob', 'B')) + tuple((column, 'I') for column in TEXT_COLUMNS) \
+    + NUMBER_COLUMNS + tuple((f'by_{table}', 'I') for table, _ in TABLES)
+DIRECTORY = struct.Struct('<' + 'QQ' * len(SECTIONS))
+
+SymbolRow = namedtuple('SymbolRow', TEXT_COLUMNS + ('strike', 'lotsize', 'tick_size', 'expiry_date'))
+
+
+class SnapshotError(Exception):
+    """The file is missing, truncated or written by another format version"""
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    return str(value)
+
+
+def _number(value, kind):
+    try:
+        if value is None or value != value:
+            return 0
+        return float(value) if kind == 'd' else int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _key(value, exchange):
+    return f"{value}\x00{exchange}".encode('utf-8')
+
+
+def _slot_count(rows):
+    slots = 8
+    while slots < rows * 2:
+        slots *= 2
+    return slots
+
+
+def write_snapshot(rows, path=SCRIP_SNAPSHOT_PATH, master_date=None, generation=0):
+    """
+    Write contracts to a snapshot file, replacing any previous one atomically
+
+    Args:
+        rows (iterable): Dicts with the SymToken columns (process_angel_json records
+            or symtoken rows); expiry_ordinal is derived from expiry_date when missing
+        path (str): Destination file
+        master_date (date): Date of the scrip master; defaults to today
+        generation (int): Publish counter recorded in the header
+
+    Returns:
+        int: Number of contracts written
+    """
+    strings = {'': 0}
+    text_columns = {column: array('I') for column in TEXT_COLUMNS}
+    number_columns = {column: array(kind) for column, kind in NUMBER_COLUMNS}
+
+    count = 0
+    for row in rows:
+        for column in TEXT_COLUMNS:
+            value = _text(row.get(column))
+            text_columns[column].append(strings.setdefault(value, len(strings)))
+        if not row.get('expiry_ordinal') and isinstance(row.get('expiry_date'), date):
+            row = dict(row, expiry_ordinal=row['expiry_date'].toordinal())
+        for column, kind in NUMBER_COLUMNS:
+            number_columns[column].append(_number(row.get(column), kind))
+        count += 1
+
+    texts = list(strings)  # dicts keep insertion order, so the list index is the string id
+    encoded = [value.encode('utf-8') for value in texts]
+    offsets = array('I', [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    blob = b''.join(encoded)
+
+    slots = _slot_count(count)
+    tables = {}
+    exchanges = text_columns['exchange']
+    for table, column in TABLES:
+        values = text_columns[column]
+        slot_rows = array('I', bytes(4 * slots))
+        seen = set()
+        for row_number in range(count):
+            key = _key(texts[values[row_number]], texts[exchanges[row_number]])
+            if key in seen:
+                continue  # first contract wins, like .first() on the table
+            seen.add(key)
+            slot = zlib.crc32(key) & (slots - 1)
+            while slot_rows[slot]:
+                slot = (slot + 1) & (slots - 1)
+            slot_rows[slot] = row_number + 1
+        tables[f'by_{table}'] = slot_rows
+
+    sections = dict(string_offsets=offsets.tobytes(), string_blob=blob)
+    sections.update((column, values.tobytes()) for column, values in text_columns.items())
+    sections.update((column, values.tobytes()) for column, values in number_columns.items())
+    sections.update((name, values.tobytes()) for name, values in tables.items())
+
+    header_size = HEADER.size + DIRECTORY.size
+    position = header_size + (-header_size % 8)
+    directory = []
+    for name, _ in SECTIONS:
+        directory += [position, len(sections[name])]
+        position += len(sections[name]) + (-len(sections[name]) % 8)
+
+    master_date = master_date or date.today()
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, header_size, master_date.toordinal(), count, time.time(),
+                            slots, len(encoded), generation))
+        f.write(DIRECTORY.pack(*directory))
+        for name, _ in SECTIONS:
+            f.write(b'\x00' * (-f.tell() % 8))
+            f.write(sections[name])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return count
+
+
+class ScripSnapshot:
+    """Read-only view of one snapshot file"""
+
+    def __init__(self, path=SCRIP_SNAPSHOT_PATH):
+        self.path = path
+        self.file_id = None
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Cannot map {path}: {str(e)}")
+        self.file_id = (stat.st_ino, stat.st_mtime_ns)
+
+        if len(self._map) < HEADER.size + DIRECTORY.size:
+            raise SnapshotError(f"{path} is truncated")
+        magic, version, _, master_date, self.rows, self.created_at, self.slots, _, self.generation = \
+            HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise SnapshotError(f"{path} is not a version {FORMAT_VERSION} scrip snapshot")
+        self.version = version
+        self.master_date = date.fromordinal(master_date)
+
+        directory = DIRECTORY.unpack_from(self._map, HEADER.size)
+        view = memoryview(self._map)
+        self._sections = {}
+        for (name, kind), offset, length in zip(SECTIONS, directory[0::2], directory[1::2]):
+            if offset + length > len(self._map):
+                raise SnapshotError(f"{path} is truncated")
+            self._sections[name] = view[offset:offset + length].cast(kind)
+        self._offsets = self._sections['string_offsets']
+        self._blob = self._sections['string_blob']
+
+    def __len__(self):
+        return self.rows
+
+    def _string(self, string_id):
+        return str(self._blob[self._offsets[string_id]:self._offsets[string_id + 1]], 'utf-8')
+
+    def _equals(self, string_id, encoded):
+        start, end = self._offsets[string_id], self._offsets[string_id + 1]
+        return end - start == len(encoded) and self._blob[start:end] == encoded
+
+    def find(self, table, value, exchange):
+        """
+        Row number of the contract with value in the table's column on exchange
+
+        Args:
+            table (str): symbol, token or brsymbol
+
+        Returns:
+            int: Or None if not listed
+        """
+        if not self.rows:
+            return None
+        column = self._sections[table]
+        exchanges = self._sections['exchange']
+        slot_rows = self._sections[f'by_{table}']
+        value, exchange = _text(value), _text(exchange)
+        encoded_value, encoded_exchange = value.encode('utf-8'), exchange.encode('utf-8')
+        mask = self.slots - 1
+        slot = zlib.crc32(_key(value, exchange)) & mask
+        while True:
+            row_number = slot_rows[slot]
+            if not row_number:
+                return None
+            row_number -= 1
+            if self._equals(column[row_number], encoded_value) and self._equals(exchanges[row_number], encoded_exchange):
+                return row_number
+            slot = (slot + 1) & mask
+
+    def value(self, row_number, column):
+        if column in TEXT_COLUMNS:
+            return self._string(self._sections[column][row_number])
+        return self._sections[column][row_number]
+
+    def row(self, row_number):
+        """All columns of one contract as a SymbolRow"""
+        ordinal = self._sections['expiry_ordinal'][row_number]
+        return SymbolRow(*(self._string(self._sections[column][row_number]) for column in TEXT_COLUMNS),
+                         self._sections['strike'][row_number], self._sections['lotsize'][row_number],
+                         self._sections['tick_size'][row_number], date.fromordinal(ordinal) if ordinal else None)
+
+    def __iter__(self):
+        return (self.row(row_number) for row_number in range(self.rows))
+
+    def select(self, column, values, columns):
+        """
+        Contracts whose text column holds one of the values, read straight from the mapped columns
+
+        Args:
+            column (str): Text column to filter on, e.g. instrumenttype
+            values (tuple): Accepted values, or None for every contract; only the
+                distinct string ids are decoded
+            columns (tuple): Columns to return; expiry_date gives the expiry as a date (or None)
+
+        Returns:
+            list: One tuple per matching contract, in file order
+        """
+        ids = self._sections[column]
+        wanted = None if values is None else {string_id for string_id in set(ids) if self._string(string_id) in values}
+        if wanted is not None and not wanted:
+            return []
+        ordinals = self._sections['expiry_ordinal']
+        readers = [(lambda row_number: date.fromordinal(ordinals[row_number]) if ordinals[row_number] else None)
+                   if name == 'expiry_date' else (lambda row_number, name=name: self.value(row_number, name))
+                   for name in columns]
+        return [tuple(read(row_number) for read in readers)
+                for row_number, string_id in enumerate(ids) if wanted is None or string_id in wanted]
+
+    def lookup(self, table, value, exchange, column):
+        row_number = self.find(table, value, exchange)
+        return None if row_number is None else self.value(row_number, column)
+
+
+class SnapshotLoader:
+    """The snapshot this process has mapped, kept in step with the shared generation counter"""
+
+    def __init__(self, path=SCRIP_SNAPSHOT_PATH):
+        self.path = path
+        self.control_path = f"{path}.gen"
+        self.current = None
+        self._control = None  # mmap of the shared generation counter, or None until one is published
+        self._control_writable = False
+        self._control_checked = 0.0  # monotonic time of the last attempt to find the counter
+        self._seen_generation = None
+        self._lock = threading.Lock()
+        self.metrics = {"loads": 0, "writes": 0, "swaps": 0, "hits": 0, "misses": 0, "load_ms": None, "write_ms": None}
+
+    def _open_control(self, create=False):
+        """
+        Map the generation counter: read-only, and only if a publisher already created it,
+        unless create is set (publishing), so merely loading the app writes nothing
+        """
+        if self._control is not None and (self._control_writable or not create):
+            return self._control
+        self._control_checked = time.monotonic()
+        try:
+            if create:
+                with open(self.control_path, 'a+b') as f:
+                    if os.fstat(f.fileno()).st_size < GENERATION.size:
+                        f.write(b'\x00' * GENERATION.size)
+                        f.flush()
+                    self._control = mmap.mmap(f.fileno(), GENERATION.size, access=mmap.ACCESS_WRITE)
+                    self._control_writable = True
+            elif os.path.exists(self.control_path):
+                with open(self.control_path, 'rb') as f:
+                    self._control = mmap.mmap(f.fileno(), GENERATION.size, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: scrip snapshot generation counter unavailable ({str(e)}), workers will not swap")
+        return self._control
+
+    def generation(self):
+        """Generation last published by any process, or None without a counter"""
+        control = self._control
+        return GENERATION.unpack_from(control)[0] if control is not None else None
+
+    def load(self):
+        """
+        Map the snapshot file, replacing any previously mapped one
+
+        Returns:
+            bool: Whether a snapshot is now mapped
+        """
+        self._open_control()
+        published = self.generation()
+        if not os.path.exists(self.path):
+            self._seen_generation = published
+            return self.current is not None
+        started = time.perf_counter()
+        try:
+            snapshot = ScripSnapshot(self.path)
+        except SnapshotError as e:
+            print(f"WARNING: scrip snapshot not loaded: {str(e)}")
+            self._seen_generation = published
+            return self.current is not None
+        # The previous mapping is unmapped once no reader holds it any more
+        with self._lock:
+            self.current = snapshot
+            self._seen_generation = max(snapshot.generation, published or 0)
+            self.metrics["loads"] += 1
+            self.metrics["load_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        print(f"Scrip snapshot mapped: generation {snapshot.generation}, {snapshot.rows} contracts from "
+              f"{snapshot.master_date.isoformat()} in {self.metrics['load_ms']} ms")
+        return True
+
+    def check(self):
+        """
+        Remap if another process published a newer generation; cheap enough to call per request
+
+        Returns:
+            bool: Whether this process swapped to a new snapshot
+        """
+        control = self._control
+        if control is None:
+            # Nothing published yet when this worker started; look for the counter now and then
+            if time.monotonic() - self._control_checked < CONTROL_RETRY_SECONDS:
+                return False
+            control = self._open_control()
+            if control is None:
+                return False
+        if GENERATION.unpack_from(control)[0] == self._seen_generation:
+            return False
+        previous = self.current
+        self.load()
+        if self.current is previous:
+            return False
+        with self._lock:
+            self.metrics["swaps"] += 1
+        self._drop_process_caches()
+        return True
+
+    def _drop_process_caches(self):
+        """Per-process structures built from the previous scrip master rebuild lazily"""
+        from database.token_db import token_cache
+        from database.option_chain import option_chain_index
+        from database.expiry_calendar import expiry_calendar
+
+        token_cache.clear()
+        option_chain_index.invalidate()
+        expiry_calendar.invalidate()
+
+    def publish(self, rows, master_date=None):
+        """
+        Write a new snapshot from contract dicts as the next generation, map it in this
+        process and signal the other workers
+
+        Returns:
+            int: Number of contracts written
+        """
+        started = time.perf_counter()
+        control = self._open_control(create=True)
+        try:
+            lock_file = open(self.control_path, 'rb') if control is not None and fcntl else None
+        except OSError:
+            lock_file = None
+        try:
+            if lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            generation = (self.generation() or 0) + 1
+            count = write_snapshot(rows, self.path, master_date, generation)
+            # Bump only after the rename, so a worker that sees the new generation maps the new file
+            if control is not None:
+                GENERATION.pack_into(control, 0, generation)
+                control.flush()
+        except OSError as e:
+            print(f"ERROR writing scrip snapshot: {str(e)}")
+            return 0
+        finally:
+            if lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+        with self._lock:
+            self.metrics["writes"] += 1
+            self.metrics["write_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        print(f"Scrip snapshot written: generation {generation}, {count} contracts in {self.metrics['write_ms']} ms")
+        self.load()
+        self._drop_process_caches()
+        return count
+
+    def publish_from_db(self, master_date=None):
+        """Write a new snapshot from the symtoken table (e.g. after pruning)"""
+        from database.master_contract_db import SymToken, db_session
+
+        columns = [getattr(SymToken, column) for column in TEXT_COLUMNS + ('strike', 'lotsize', 'tick_size', 'expiry_ordinal')]
+        try:
+            rows = [row._asdict() for row in db_session.query(*columns).order_by(SymToken.id).yield_per(10000)]
+        finally:
+            db_session.remove()
+        master_date = master_date or (self.current.master_date if self.current else None)
+        return self.publish(rows, master_date)
+
+    def is_current(self, today=None):
+        """Whether the published snapshot was made from today's scrip master"""
+        if self._control is not None:
+            self.check()
+        else:
+            try:
+                stat = os.stat(self.path)
+                if self.current is None or (stat.st_ino, stat.st_mtime_ns) != self.current.file_id:
+                    self.load()
+            except OSError:
+                pass
+        return self.current is not None and self.current.master_date == (today or date.today())
+
+    def _lookup(self, table, value, exchange, column):
+        self.check()
+        snapshot = self.current
+        if snapshot is None:
+            return None
+        found = snapshot.lookup(table, value, exchange, column)
+        self.metrics["hits" if found is not None else "misses"] += 1
+        return found
+
+    def get_token(self, symbol, exchange):
+        return self._lookup('symbol', symbol, exchange, 'token')
+
+    def get_symbol(self, token, exchange):
+        return self._lookup('token', token, exchange, 'symbol')
+
+    def get_oa_symbol(self, brsymbol, exchange):
+        return self._lookup('brsymbol', brsymbol, exchange, 'symbol')
+
+    def get_br_symbol(self, symbol, exchange):
+        return self._lookup('symbol', symbol, exchange, 'brsymbol')
+
+    def get_metrics(self):
+        snapshot = self.current
+        with self._lock:
+            return dict(self.metrics, path=self.path, loaded=snapshot is not None, pid=os.getpid(),
+                        generation=snapshot.generation if snapshot else None, published_generation=self.generation(),
+                        rows=snapshot.rows if snapshot else 0, version=snapshot.version if snapshot else None,
+                        master_date=snapshot.master_date.isoformat() if snapshot else None,
+                        created_at=datetime.fromtimestamp(snapshot.created_at).isoformat() if snapshot else None)
+
+
+# Global loader, mapped at app startup and republished by each master contract load
+scrip_snapshot = SnapshotLoader()
@@ -0,0 +1,392 @@
+# database/session_store.py
+
+"""
+Server-side session store with an in-memory LRU tier.
+
+Every authenticated request used to validate its session token with a
+query on user_sessions and load the user row with a second one. The store
+answers both from a bounded, TTL'd LRU in front of a durable backend:
+
+    sql   the user_sessions table (default)
+    file  a local shelve file, for single-process local runs
+
+Logins, logouts, extensions and revocations write through to the backend
+and update the LRU. "Last seen" updates are write-behind: touch() only
+records the time in memory and a background thread flushes the pending
+updates in one batched UPDATE every SESSION_TOUCH_FLUSH_SECONDS.
+
+With several worker processes each keeps its own LRU, so a session revoked
+in one process stays usable in the others until their entry ages out;
+SESSION_STORE_CACHE_TTL bounds that window.
+"""
+
+import atexit
+import os
+import shelve
+import threading
+from collections import namedtuple
+from datetime import datetime
+from cachetools import TTLCache
+
+SESSION_STORE_BACKEND = os.getenv('SESSION_STORE_BACKEND', 'sql')          # sql | file
+SESSION_STORE_PATH = os.getenv('SESSION_STORE_PATH', 'db/sessions.shelve')
+SESSION_STORE_CAPACITY = int(os.getenv('SESSION_STORE_CAPACITY', '10000'))
+SESSION_STORE_CACHE_TTL = int(os.getenv('SESSION_STORE_CACHE_TTL', '60'))     # seconds an entry is trusted
+SESSION_TOUCH_FLUSH_SECONDS = float(os.getenv('SESSION_TOUCH_FLUSH_SECONDS', '30'))  # 0 writes last-seen through
+
+# id is the user_sessions row ID; None for sessions not read from the sql backend
+SessionRecord = namedtuple('SessionRecord', ['user_id', 'session_token', 'expires_at', 'created_at', 'last_seen_at', 'id'],
+                           defaults=(None,))
+UserRecord = namedtuple('UserRecord', ['id', 'username', 'email', 'is_active', 'created_at'])
+
+
+class SqlSessionBackend:
+    """Sessions in the user_sessions table of the auth database"""
+
+    name = 'sql'
+
+    def get(self, session_token):
+        from database.auth_db import UserSessions
+        row = UserSessions.query.filter_by(session_token=session_token).first()
+        return _record(row) if row else None
+
+    def create(self, record):
+        """Store a session, replacing any other sessions of the same user"""
+        from database.auth_db import create_user_session
+        return create_user_session(record.user_id, record.session_token, record.expires_at)["status"] == "success"
+
+    def delete(self, session_token):
+        from database.auth_db import delete_user_session
+        return delete_user_session(session_token)["status"] == "success"
+
+    def delete_user(self, user_id, except_token=None):
+        from database.auth_db import UserSessions, db_session
+        query = UserSessions.query.filter_by(user_id=user_id)
+        if except_token:
+            query = query.filter(UserSessions.session_token != except_token)
+        try:
+            count = query.delete(synchronize_session=False)
+            db_session.commit()
+            return count
+        except Exception:
+            db_session.rollback()
+            raise
+
+    def for_user(self, user_id):
+        from database.auth_db import UserSessions
+        rows = UserSessions.query.filter_by(user_id=user_id).filter(UserSessions.expires_at > datetime.now()).all()
+        return [_record(row) for row in rows]
+
+    def update_expiry(self, session_token, expires_at):
+        from database.auth_db import UserSessions, db_session
+        try:
+            count = UserSessions.query.filter_by(session_token=session_token).update(
+                {UserSessions.expires_at: expires_at}, synchronize_session=False)
+            db_session.commit()
+            return count > 0
+        except Exception:
+            db_session.rollback()
+            raise
+
+    def touch_many(self, last_seen):
+        """Write {session_token: last_seen_at} with one executemany UPDATE"""
+        from sqlalchemy import bindparam
+        from database.auth_db import UserSessions, db_session
+        table = UserSessions.__table__
+        statement = table.update().where(table.c.session_token == bindparam('b_token')).values(
+            last_seen_at=bindparam('b_seen'))
+        try:
+            db_session.execute(statement, [{'b_token': token, 'b_seen': seen} for token, seen in last_seen.items()])
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        finally:
+            db_session.remove()
+
+    def delete_expired(self, batch_size, cutoff):
+        from database.auth_db import delete_expired_sessions
+        return delete_expired_sessions(batch_size, cutoff)
+
+    def get_user(self, user_id):
+        from database.auth_db import get_new_user_by_id
+        user = get_new_user_by_id(user_id)
+        if not user:
+            return None
+        return UserRecord(user.id, user.username, user.email, user.is_active, user.created_at)
+
+
+class FileSessionBackend(SqlSessionBackend):
+    """
+    Sessions in a local shelve file, keyed "token:<session_token>" with a
+    "user:<id>" index of each user's tokens. Users still come from the auth
+    database. Not safe for several processes sharing one file.
+    """
+
+    name = 'file'
+
+    def __init__(self, path=SESSION_STORE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = shelve.open(path)
+        self._lock = threading.Lock()
+
+    def get(self, session_token):
+        with self._lock:
+            fields = self._db.get(f"token:{session_token}")
+        return SessionRecord(*fields) if fields else None
+
+    def create(self, record):
+        with self._lock:
+            for token in self._db.get(f"user:{record.user_id}", []):
+                self._db.pop(f"token:{token}", None)
+            self._db[f"token:{record.session_token}"] = tuple(record)
+            self._db[f"user:{record.user_id}"] = [record.session_token]
+            self._db.sync()
+        return True
+
+    def delete(self, session_token):
+        with self._lock:
+            fields = self._db.pop(f"token:{session_token}", None)
+            if not fields:
+                return False
+            key = f"user:{fields[0]}"
+            self._db[key] = [token for token in self._db.get(key, []) if token != session_token]
+            self._db.sync()
+        return True
+
+    def delete_user(self, user_id, except_token=None):
+        with self._lock:
+            tokens = self._db.get(f"user:{user_id}", [])
+            removed = [token for token in tokens if token != except_token]
+            for token in removed:
+                self._db.pop(f"token:{token}", None)
+            self._db[f"user:{user_id}"] = [token for token in tokens if token == except_token]
+            self._db.sync()
+        return len(removed)
+
+    def for_user(self, user_id):
+        now = datetime.now()
+        with self._lock:
+            rows = [self._db.get(f"token:{token}") for token in self._db.get(f"user:{user_id}", [])]
+        records = [SessionRecord(*fields) for fields in rows if fields]
+        return [record for record in records if record.expires_at > now]
+
+    def update_expiry(self, session_token, expires_at):
+        return self._update(session_token, expires_at=expires_at)
+
+    def touch_many(self, last_seen):
+        for token, seen in last_seen.items():
+            self._update(token, last_seen_at=seen)
+
+    def _update(self, session_token, **fields):
+        with self._lock:
+            current = self._db.get(f"token:{session_token}")
+            if not current:
+                return False
+            self._db[f"token:{session_token}"] = tuple(SessionRecord(*current)._replace(**fields))
+            self._db.sync()
+        return True
+
+    def delete_expired(self, batch_size, cutoff):
+        with self._lock:
+            expired = [key[len("token:"):] for key, fields in self._db.items()
+                       if key.startswith("token:") and fields[2] < cutoff][:batch_size]
+        for token in expired:
+            self.delete(token)
+        return len(expired)
+
+
+class SessionStore:
+    """Bounded LRU of sessions and their users in front of a durable backend"""
+
+    def __init__(self, backend, capacity=SESSION_STORE_CAPACITY, ttl=SESSION_STORE_CACHE_TTL,
+                 flush_interval=SESSION_TOUCH_FLUSH_SECONDS):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._sessions = TTLCache(maxsize=capacity, ttl=ttl)
+        self._users = TTLCache(maxsize=capacity, ttl=ttl)
+        self._pending = {}  # session_token -> last_seen_at waiting to be flushed
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.metrics = {"hits": 0, "misses": 0, "user_hits": 0, "user_misses": 0,
+                        "evictions": 0, "flushes": 0, "flushed": 0, "flush_errors": 0}
+
+    def get(self, session_token):
+        """
+        Look up a live session
+
+        Args:
+            session_token (str): Token from the Flask session or Authorization header
+
+        Returns:
+            SessionRecord: Or None if the token is unknown or expired (expired sessions are deleted)
+        """
+        if not session_token:
+            return None
+        with self._lock:
+            record = self._sessions.get(session_token)
+            self.metrics["hits" if record else "misses"] += 1
+        if record is None:
+            record = self.backend.get(session_token)
+            if record is None:
+                return None
+            self._put(record)
+
+        if record.expires_at <= datetime.now():
+            self.delete(session_token)
+            return None
+        pending = self._pending.get(session_token)
+        return record._replace(last_seen_at=pending) if pending else record
+
+    def get_user(self, user_id):
+        """
+        User details for a session's user_id
+
+        Returns:
+            UserRecord: Or None if the user does not exist
+        """
+        with self._lock:
+            user = self._users.get(user_id)
+            self.metrics["user_hits" if user else "user_misses"] += 1
+        if user is None:
+            user = self.backend.get_user(user_id)
+            if user is not None:
+                with self._lock:
+                    self._users[user_id] = user
+        return user
+
+    def create(self, user_id, session_token, expires_at):
+        """
+        Store a new session, replacing the user's other sessions
+
+        Returns:
+            bool: True if the backend stored it
+        """
+        record = SessionRecord(user_id, session_token, expires_at, datetime.now(), None)
+        if not self.backend.create(record):
+            return False
+        self._drop_user_sessions(user_id)
+        self._put(record)
+        return True
+
+    def delete(self, session_token):
+        """Delete a session (logout); returns True if it existed"""
+        with self._lock:
+            self._sessions.pop(session_token, None)
+            self._pending.pop(session_token, None)
+        return self.backend.delete(session_token)
+
+    def delete_user(self, user_id, except_token=None):
+        """Revoke a user's sessions, optionally keeping one; returns the number revoked"""
+        self._drop_user_sessions(user_id, except_token)
+        return self.backend.delete_user(user_id, except_token)
+
+    def for_user(self, user_id):
+        """Live sessions of a user, straight from the backend"""
+        return self.backend.for_user(user_id)
+
+    def extend(self, session_token, expires_at):
+        """Move a session's expiry; returns True if the session exists"""
+        if not self.backend.update_expiry(session_token, expires_at):
+            return False
+        with self._lock:
+            record = self._sessions.get(session_token)
+            if record:
+                self._sessions[session_token] = record._replace(expires_at=expires_at)
+        return True
+
+    def touch(self, session_token, when=None):
+        """Record activity on a session; written to the backend by the next flush"""
+        when = when or datetime.now()
+        if self.flush_interval <= 0:
+            self.backend.touch_many({session_token: when})
+            return
+        with self._lock:
+            self._pending[session_token] = when
+        if not (self._thread and self._thread.is_alive()):
+            self._start_flusher()
+
+    def flush(self):
+        """
+        Write pending last-seen updates to the backend in one batch
+
+        Returns:
+            int: Number of sessions written
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                self.backend.touch_many(pending)
+            except Exception as e:
+                with self._lock:
+                    self.metrics["flush_errors"] += 1
+                    # Keep anything newer that arrived meanwhile
+                    for token, seen in pending.items():
+                        self._pending.setdefault(token, seen)
+                print(f"ERROR flushing session activity: {str(e)}")
+                return 0
+            with self._lock:
+                self.metrics["flushes"] += 1
+                self.metrics["flushed"] += len(pending)
+            return len(pending)
+
+    def delete_expired(self, batch_size, cutoff):
+        """Delete one batch of expired sessions from the backend; cached ones expire on read"""
+        return self.backend.delete_expired(batch_size, cutoff)
+
+    def get_metrics(self):
+        with self._lock:
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            return dict(self.metrics, backend=self.backend.name, sessions=len(self._sessions),
+                        users=len(self._users), pending=len(self._pending),
+                        hit_rate=round(self.metrics["hits"] / lookups, 3) if lookups else None)
+
+    def _put(self, record):
+        with self._lock:
+            if len(self._sessions) >= self._sessions.maxsize and record.session_token not in self._sessions:
+                self.metrics["evictions"] += 1
+            self._sessions[record.session_token] = record
+
+    def _drop_user_sessions(self, user_id, except_token=None):
+        with self._lock:
+            for token in [token for token, record in self._sessions.items()
+                          if record.user_id == user_id and token != except_token]:
+                self._sessions.pop(token, None)
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="session-touch-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+
+def _record(row):
+    return SessionRecord(row.user_id, row.session_token, row.expires_at, row.created_at, row.last_seen_at, row.id)
+
+
+def create_backend(kind=SESSION_STORE_BACKEND):
+    if kind == 'file':
+        return FileSessionBackend()
+    return SqlSessionBackend()
+
+
+# Global store used by the auth and session services
+session_store = SessionStore(create_backend())
+atexit.register(session_store.stop)
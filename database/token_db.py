@@ -1,19 +1,26 @@
 from database.master_contract_db import SymToken  # Import here to avoid circular imports
+from database.scrip_snapshot import scrip_snapshot
 from cachetools import TTLCache
 
-# Define a cache for the tokens, symbols with a max size and a 3600-second TTL
+# Lookups are served from the scrip snapshot, which every worker maps from one file. This
+# per-process cache only holds database results while no snapshot is mapped (and contracts
+# primed by the option chain resolver), so the symbol universe is not copied per worker
 token_cache = TTLCache(maxsize=1024, ttl=3600)
 
 def get_token(symbol, exchange):
     """
-    Retrieves a token for a given symbol and exchange, utilizing a cache to improve performance.
+    Retrieves a token for a given symbol and exchange,
+    from the shared scrip snapshot when one is mapped and otherwise from the
+    database, utilizing a cache to improve performance.
     """
+    token = scrip_snapshot.get_token(symbol, exchange)
+    if token is not None:
+        return token
     cache_key = f"{symbol}-{exchange}"
     # Attempt to retrieve from cache
     if cache_key in token_cache:
         return token_cache[cache_key]
     else:
-        # Query database if not in cache
         token = get_token_dbquery(symbol, exchange)
         # Cache the result for future requests
         if token is not None:
@@ -39,14 +46,18 @@ def get_token_dbquery(symbol, exchange):
 
 def get_symbol(token, exchange):
     """
-    Retrieves a symbol for a given token and exchange, utilizing a cache to improve performance.
+    Retrieves a symbol for a given token and exchange,
+    from the shared scrip snapshot when one is mapped and otherwise from the
+    database, utilizing a cache to improve performance.
     """
+    symbol = scrip_snapshot.get_symbol(token, exchange)
+    if symbol is not None:
+        return symbol
     cache_key = f"{token}-{exchange}"
     # Attempt to retrieve from cache
     if cache_key in token_cache:
         return token_cache[cache_key]
     else:
-        # Query database if not in cache
         symbol = get_symbol_dbquery(token, exchange)
         # Cache the result for future requests
         if symbol is not None:
@@ -70,14 +81,18 @@ def get_symbol_dbquery(token, exchange):
 
 def get_oa_symbol(symbol, exchange):
     """
-    Retrieves a symbol for a given token and exchange, utilizing a cache to improve performance.
+    Retrieves a symbol for a given token and exchange,
+    from the shared scrip snapshot when one is mapped and otherwise from the
+    database, utilizing a cache to improve performance.
     """
+    oasymbol = scrip_snapshot.get_oa_symbol(symbol, exchange)
+    if oasymbol is not None:
+        return oasymbol
     cache_key = f"oa{symbol}-{exchange}"
     # Attempt to retrieve from cache
     if cache_key in token_cache:
         return token_cache[cache_key]
     else:
-        # Query database if not in cache
         oasymbol = get_oa_symbol_dbquery(symbol, exchange)
         # Cache the result for future requests
         if oasymbol is not None:
@@ -101,14 +116,18 @@ def get_oa_symbol_dbquery(symbol, exchange):
 
 def get_br_symbol(symbol, exchange):
     """
-    Retrieves a symbol for a given token and exchange, utilizing a cache to improve performance.
+    Retrieves a symbol for a given token and exchange,
+    from the shared scrip snapshot when one is mapped and otherwise from the
+    database, utilizing a cache to improve performance.
     """
+    brsymbol = scrip_snapshot.get_br_symbol(symbol, exchange)
+    if brsymbol is not None:
+        return brsymbol
     cache_key = f"br{symbol}-{exchange}"
     # Attempt to retrieve from cache
     if cache_key in token_cache:
         return token_cache[cache_key]
     else:
-        # Query database if not in cache
         brsymbol = get_br_symbol_dbquery(symbol, exchange)
         # Cache the result for future requests
         if brsymbol is not None:
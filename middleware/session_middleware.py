@@ -1,5 +1,6 @@
 # middleware/session_middleware.py
 
+import os
 import threading
 import time
 from datetime import datetime, timedelta
@@ -11,14 +12,25 @@ class SessionCleanupMiddleware:
     def __init__(self, app=None):
         self.app = app
         self.cleanup_thread = None
-        self.cleanup_interval = 6 * 3600  # 6 hours in seconds
+        self.cleanup_interval = int(os.getenv('SESSION_CLEANUP_INTERVAL', str(6 * 3600)))  # 6 hours in seconds
+        # When a sweep stops at its batch limit, the rest of the backlog is cleared in
+        # further small sweeps this far apart instead of one long burst
+        self.backlog_interval = int(os.getenv('SESSION_CLEANUP_BACKLOG_INTERVAL', '60'))
         self.running = False
+        self._stop = threading.Event()
         
         if app is not None:
             self.init_app(app)
     
-    def init_app(self, app):
-        """Initialize the middleware with Flask app"""
+    def init_app(self, app, start_cleanup=True):
+        """
+        Initialize the middleware with Flask app
+
+        Args:
+            app (Flask): Application instance
+            start_cleanup (bool): Start the periodic cleanup thread (off on serverless,
+                where the process is frozen between requests)
+        """
         self.app = app
         
         # Register before_request and after_request handlers
@@ -26,7 +38,8 @@ class SessionCleanupMiddleware:
         app.after_request(self.after_request)
         
         # Start cleanup thread
-        self.start_cleanup_thread()
+        if start_cleanup:
+            self.start_cleanup_thread()
         
         # Register cleanup on app teardown
         app.teardown_appcontext(self.cleanup_on_teardown)
@@ -59,6 +72,7 @@ class SessionCleanupMiddleware:
             return
         
         self.running = True
+        self._stop.clear()
         self.cleanup_thread = threading.Thread(target=self._cleanup_worker, daemon=True)
         self.cleanup_thread.start()
         print("Session cleanup thread started")
@@ -66,19 +80,20 @@ class SessionCleanupMiddleware:
     def stop_cleanup_thread(self):
         """Stop the background cleanup thread"""
         self.running = False
+        self._stop.set()
         if self.cleanup_thread:
             self.cleanup_thread.join(timeout=5)
         print("Session cleanup thread stopped")
     
     def _cleanup_worker(self):
-        """Background worker for periodic session cleanup"""
+        """Background worker for periodic, incremental session cleanup"""
+        wait = self.cleanup_interval
         while self.running:
             try:
-                # Wait for the cleanup interval
-                time.sleep(self.cleanup_interval)
-                
-                if not self.running:
+                # Wait for the cleanup interval (or the shorter backlog interval)
+                if self._stop.wait(wait) or not self.running:
                     break
+                wait = self.cleanup_interval
                 
                 # Perform cleanup within app context
                 if self.app:
@@ -86,6 +101,8 @@ class SessionCleanupMiddleware:
                         result = session_service.cleanup_expired_sessions()
                         if result["status"] == "success":
                             print(f"Automatic cleanup: removed {result['count']} expired sessions")
+                            if not result["complete"]:
+                                wait = self.backlog_interval
                         else:
                             print(f"Automatic cleanup failed: {result.get('message', 'Unknown error')}")
                 
@@ -4,10 +4,11 @@ import os
 import re
 from datetime import datetime, timedelta
 from database.auth_db import (
-    create_new_user, get_new_user_by_email, get_new_user_by_username, get_new_user_by_id,
-    create_user_session, get_user_session, delete_user_session,
-    hash_password, verify_password, generate_session_token, validate_password_strength
+    create_new_user, get_new_user_by_email, get_new_user_by_username,
+    hash_password, verify_user_password, generate_session_token, validate_password_strength,
+    PasswordHasherBusy
 )
+from database.session_store import session_store
 
 class AuthService:
     """Service class for handling user authentication operations"""
@@ -50,7 +51,10 @@ class AuthService:
                 return {"status": "error", "message": password_validation["message"]}
             
             # Hash the password
-            password_hash = hash_password(password)
+            try:
+                password_hash = hash_password(password)
+            except PasswordHasherBusy:
+                return {"status": "error", "message": "Too many sign-ups in progress. Please try again in a moment.", "busy": True}
             if not password_hash:
                 return {"status": "error", "message": "Failed to process password"}
             
@@ -101,9 +105,12 @@ class AuthService:
             if not user.is_active:
                 return {"status": "error", "message": "Account is deactivated. Please contact support."}
             
-            # Verify password
-            if not verify_password(password, user.password_hash):
-                return {"status": "error", "message": "Invalid credentials"}
+            # Verify password (bcrypt runs on the password hasher's pool, not this thread)
+            try:
+                if not verify_user_password(user, password):
+                    return {"status": "error", "message": "Invalid credentials"}
+            except PasswordHasherBusy:
+                return {"status": "error", "message": "Too many sign-ins in progress. Please try again in a moment.", "busy": True}
             
             # Create session
             session_result = self.create_session(user.id)
@@ -146,10 +153,8 @@ class AuthService:
             # Calculate expiration time
             expires_at = datetime.now() + timedelta(hours=self.session_duration_hours)
             
-            # Create session in database
-            result = create_user_session(user_id, session_token, expires_at)
-            
-            if result["status"] == "success":
+            # Create session in the session store
+            if session_store.create(user_id, session_token, expires_at):
                 return {
                     "status": "success",
                     "message": "Session created successfully",
@@ -157,7 +162,7 @@ class AuthService:
                     "expires_at": expires_at.isoformat()
                 }
             else:
-                return result
+                return {"status": "error", "message": "Failed to create session"}
                 
         except Exception as e:
             print(f"ERROR in create_session: {str(e)}")
@@ -177,13 +182,13 @@ class AuthService:
             if not session_token:
                 return {"status": "error", "message": "Session token is required"}
             
-            # Get session from database
-            session = get_user_session(session_token)
+            # Get session from the session store
+            session = session_store.get(session_token)
             if not session:
                 return {"status": "error", "message": "Invalid or expired session"}
             
             # Get user information
-            user = get_new_user_by_id(session.user_id)
+            user = session_store.get_user(session.user_id)
             if not user:
                 return {"status": "error", "message": "User not found"}
             
@@ -191,6 +196,7 @@ class AuthService:
             if not user.is_active:
                 return {"status": "error", "message": "Account is deactivated"}
             
+            session_store.touch(session_token)
             return {
                 "status": "success",
                 "message": "Session is valid",
@@ -224,14 +230,12 @@ class AuthService:
             if not session_token:
                 return {"status": "error", "message": "Session token is required"}
             
-            # Delete session from database
-            result = delete_user_session(session_token)
-            
-            if result["status"] == "success":
+            # Delete session from the session store
+            if session_store.delete(session_token):
                 print(f"User logout successful")
                 return {"status": "success", "message": "Logged out successfully"}
             else:
-                return result
+                return {"status": "error", "message": "Session not found"}
                 
         except Exception as e:
             print(f"ERROR in logout_user: {str(e)}")
@@ -261,20 +265,14 @@ class AuthService:
             dict: Result with status and count of cleaned sessions
         """
         try:
-            from database.auth_db import UserSessions, db_session
-            
-            # Delete expired sessions
-            expired_sessions = UserSessions.query.filter(
-                UserSessions.expires_at < datetime.now()
-            ).all()
-            
-            count = len(expired_sessions)
-            for session in expired_sessions:
-                db_session.delete(session)
+            # Same bounded, batched sweep as the background cleanup
+            from services.session_service import session_service
             
-            db_session.commit()
+            result = session_service.cleanup_expired_sessions()
+            if result["status"] != "success":
+                return {"status": "error", "message": "Failed to cleanup expired sessions"}
             
-            print(f"Cleaned up {count} expired sessions")
+            count = result["count"]
             return {"status": "success", "message": f"Cleaned up {count} expired sessions", "count": count}
             
         except Exception as e:
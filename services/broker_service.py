@@ -3,9 +3,10 @@
 import os
 from datetime import datetime, timedelta
 from database.auth_db import (
-    create_broker_connection, get_user_broker_connections, store_broker_tokens, get_broker_tokens,
-    BrokerConnections, BrokerTokens, db_session
+    create_broker_connection, get_user_broker_views, store_broker_tokens, get_broker_tokens,
+    invalidate_broker_tokens, invalidate_user_brokers, BrokerConnections, BrokerTokens, db_session
 )
+from database.credential_store import token_expired
 from utils.encryption import encryption_service
 
 class BrokerService:
@@ -163,18 +164,18 @@ class BrokerService:
             dict: Result with status and list of broker connections
         """
         try:
-            connections = get_user_broker_connections(user_id)
+            # Connections and their token state come from one joined query (cached per user)
+            connections = get_user_broker_views(user_id)
             
             broker_list = []
             for connection in connections:
                 broker_info = self.supported_brokers.get(connection.broker_type, {})
                 
-                # Get token info for connection status
-                tokens = get_broker_tokens(connection.id)
+                # Token status is evaluated at read time, so a cached listing never shows a stale "connected"
                 is_token_valid = False
-                if tokens and tokens.expires_at:
-                    is_token_valid = tokens.expires_at > datetime.now()
-                elif tokens and tokens.access_token:
+                if connection.has_token and connection.token_expires_at:
+                    is_token_valid = not token_expired(connection.token_expires_at)
+                elif connection.has_token:
                     is_token_valid = True  # No expiration info, assume valid
                 
                 broker_data = {
@@ -235,6 +236,7 @@ class BrokerService:
                 db_session.delete(token)
             
             db_session.commit()
+            invalidate_broker_tokens(connection_id)
             
             broker_info = self.supported_brokers.get(connection.broker_type, {})
             broker_name = broker_info.get("display_name", connection.broker_type.title())
@@ -280,35 +282,9 @@ class BrokerService:
             if not tokens:
                 return {"status": "error", "message": "No tokens found for connection"}
             
-            # Use appropriate broker adapter to refresh
-            if connection.broker_type == "angel":
-                from brokers.angel_adapter import AngelAdapter
-                adapter = AngelAdapter()
-                refresh_result = adapter.refresh_token(tokens.refresh_token)
-            else:
-                return {"status": "error", "message": f"Token refresh not implemented for {connection.broker_type}"}
-            
-            if refresh_result["status"] != "success":
-                return {
-                    "status": "error",
-                    "message": f"Token refresh failed: {refresh_result['message']}"
-                }
-            
-            # Update tokens
-            token_result = store_broker_tokens(
-                connection_id=connection_id,
-                access_token=refresh_result["tokens"]["access_token"],
-                refresh_token=refresh_result["tokens"].get("refresh_token"),
-                feed_token=refresh_result["tokens"].get("feed_token"),
-                expires_at=refresh_result["tokens"].get("expires_at")
-            )
-            
-            if token_result["status"] != "success":
-                return {"status": "error", "message": "Failed to update tokens"}
-            
-            # Update last sync time
-            connection.last_sync_at = datetime.now()
-            db_session.commit()
+            result = self.refresh_connection_tokens(connection, tokens.refresh_token)
+            if result["status"] != "success":
+                return result
             
             broker_info = self.supported_brokers.get(connection.broker_type, {})
             broker_name = broker_info.get("display_name", connection.broker_type.title())
@@ -325,6 +301,50 @@ class BrokerService:
             traceback.print_exc()
             return {"status": "error", "message": "Failed to refresh broker tokens"}
     
+    def refresh_connection_tokens(self, connection, refresh_token):
+        """
+        Exchange a refresh token with the broker and store the new tokens
+        (shared by the user-triggered refresh and the background scheduler)
+        
+        Args:
+            connection (BrokerConnections): Connection being refreshed
+            refresh_token (str): Current refresh token
+            
+        Returns:
+            dict: Result with status and message
+        """
+        # Use appropriate broker adapter to refresh
+        if connection.broker_type == "angel":
+            from brokers.angel_adapter import AngelAdapter
+            adapter = AngelAdapter()
+            refresh_result = adapter.refresh_token(refresh_token)
+        else:
+            return {"status": "error", "message": f"Token refresh not implemented for {connection.broker_type}"}
+        
+        if refresh_result["status"] != "success":
+            return {
+                "status": "error",
+                "message": f"Token refresh failed: {refresh_result['message']}"
+            }
+        
+        # Update tokens (store_broker_tokens also refreshes the in-memory token cache)
+        token_result = store_broker_tokens(
+            connection_id=connection.id,
+            access_token=refresh_result["tokens"]["access_token"],
+            refresh_token=refresh_result["tokens"].get("refresh_token"),
+            feed_token=refresh_result["tokens"].get("feed_token"),
+            expires_at=refresh_result["tokens"].get("expires_at")
+        )
+        
+        if token_result["status"] != "success":
+            return {"status": "error", "message": "Failed to update tokens"}
+        
+        # Update last sync time
+        connection.last_sync_at = datetime.now()
+        db_session.commit()
+        invalidate_user_brokers(connection.user_id)
+        return {"status": "success", "message": "Tokens refreshed"}
+    
     def get_broker_connection_details(self, user_id, connection_id):
         """
         Get detailed information about a broker connection
@@ -353,7 +373,7 @@ class BrokerService:
             token_expires_at = None
             if tokens:
                 if tokens.expires_at:
-                    is_token_valid = tokens.expires_at > datetime.now()
+                    is_token_valid = not token_expired(tokens.expires_at)
                     token_expires_at = tokens.expires_at.isoformat()
                 elif tokens.access_token:
                     is_token_valid = True
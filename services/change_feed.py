@@ -0,0 +1,231 @@
+# services/change_feed.py
+
+"""
+Server-side change feed for order book and position updates.
+
+Dashboard clients join a per-user SocketIO room on connect. A background
+task hands each subscribed user's poll to a bounded worker pool, so tenants
+are polled concurrently and a slow broker response delays only its own user;
+a user whose previous poll is still running is skipped that round. Each poll
+fetches the broker order book and positions (through the shared book cache,
+so REST and feed reads coalesce), diffs them against the previous snapshot
+and emits only the changed rows:
+
+    order_book_delta  {"full": bool, "upserts": [...], "removed": [orderid, ...], "stats": {...}}
+    positions_delta   {"full": bool, "upserts": [...], "removed": [[symbol, exchange, product], ...]}
+
+A full snapshot ("full": true, client replaces its table) is sent when a client
+joins; clients can request another with the 'feed_resync' event.
+
+Polling only saves broker calls once the dashboard applies these deltas
+instead of refreshing the books over REST. Until the frontend consumes them,
+the feed stays off: set CHANGE_FEED_ENABLED=true to let sockets subscribe.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import request, session
+from flask_socketio import join_room
+from extensions import socketio
+from api.order_api import get_order_book, get_positions
+from mapping.order_data import build_order_book, build_positions
+
+CHANGE_FEED_ENABLED = os.getenv('CHANGE_FEED_ENABLED', 'False').lower() == 'true'
+FEED_POLL_INTERVAL = float(os.getenv('FEED_POLL_INTERVAL', '2'))
+FEED_POLL_WORKERS = int(os.getenv('FEED_POLL_WORKERS', '8'))  # users polled at the same time
+
+
+def _order_key(row):
+    return row.get('orderid')
+
+
+def _position_key(row):
+    return (row.get('symbol'), row.get('exchange'), row.get('product'))
+
+
+def _is_ok(response):
+    return isinstance(response, dict) and response.get('status') not in (False, 'error')
+
+
+def diff_rows(previous, rows, key):
+    """
+    Compare two snapshots of broker rows
+
+    Args:
+        previous (dict): key -> row from the last poll
+        rows (list): Rows from the current poll
+        key (callable): Row identity function
+
+    Returns:
+        tuple: (current snapshot dict, changed or new rows, keys no longer present)
+    """
+    current = {}
+    upserts = []
+    for row in rows:
+        row_key = key(row)
+        current[row_key] = row
+        if previous.get(row_key) != row:
+            upserts.append(row)
+    removed = [row_key for row_key in previous if row_key not in current]
+    return current, upserts, removed
+
+
+class _Subscription:
+    __slots__ = ('room', 'tenant', 'auth_token', 'api_key', 'sids', 'orders', 'positions', 'order_stats', 'resync',
+                 'polling')
+
+    def __init__(self, room, tenant, auth_token, api_key):
+        self.room = room
+        self.tenant = tenant  # broker account the polls are paced under
+        self.auth_token = auth_token
+        self.api_key = api_key
+        self.sids = set()
+        self.orders = {}
+        self.positions = {}
+        self.order_stats = None
+        self.resync = True
+        self.polling = False  # a poll is queued or running on the worker pool
+
+
+class ChangeFeed:
+    """Polls broker books per subscribed user and pushes row deltas to their room"""
+
+    def __init__(self, interval=FEED_POLL_INTERVAL, max_workers=FEED_POLL_WORKERS, enabled=CHANGE_FEED_ENABLED):
+        self.interval = interval
+        self.max_workers = max_workers
+        self.enabled = enabled
+        self.subscriptions = {}  # room -> _Subscription
+        self.polls = 0
+        self.skipped = 0
+        self.rows_sent = 0
+        self.full_rows = 0
+        self._lock = threading.Lock()
+        self._task = None
+        self._executor = None
+
+    @staticmethod
+    def room_for(user):
+        return f"feed:{user}"
+
+    def subscribe(self, sid, user, auth_token, api_key):
+        """Attach a socket to the user's room and make sure the poller is running"""
+        room = self.room_for(user)
+        with self._lock:
+            sub = self.subscriptions.get(room)
+            if sub is None or sub.auth_token != auth_token:
+                # New login means a new broker token; start from a full snapshot
+                previous_sids = sub.sids if sub else set()
+                sub = self.subscriptions[room] = _Subscription(room, user, auth_token, api_key)
+                sub.sids |= previous_sids
+            sub.sids.add(sid)
+            sub.resync = True
+            if self._task is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="change-feed")
+                self._task = socketio.start_background_task(self._run)
+        return room
+
+    def unsubscribe(self, sid):
+        """Detach a socket; the user's poll stops when the last socket leaves"""
+        with self._lock:
+            for room, sub in list(self.subscriptions.items()):
+                sub.sids.discard(sid)
+                if not sub.sids:
+                    del self.subscriptions[room]
+
+    def request_resync(self, user):
+        with self._lock:
+            sub = self.subscriptions.get(self.room_for(user))
+            if sub is not None:
+                sub.resync = True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                due = [sub for sub in self.subscriptions.values() if not sub.polling]
+                self.skipped += len(self.subscriptions) - len(due)
+                for sub in due:
+                    sub.polling = True
+            for sub in due:
+                self._executor.submit(self._poll_safely, sub)
+            socketio.sleep(self.interval)
+
+    def _poll_safely(self, sub):
+        try:
+            self.poll(sub)
+        except Exception as e:
+            print(f"Change feed poll failed for {sub.room}: {str(e)}")
+        finally:
+            with self._lock:
+                sub.polling = False
+
+    def poll(self, sub):
+        """Fetch, diff and emit one round for a subscription"""
+        with self._lock:
+            self.polls += 1
+            full = sub.resync
+            sub.resync = False
+
+        order_response = get_order_book(auth_token=sub.auth_token, api_key=sub.api_key, tenant=sub.tenant)
+        if _is_ok(order_response):
+            rows, stats = build_order_book(order_response)
+            previous = {} if full else sub.orders
+            sub.orders, upserts, removed = diff_rows(previous, rows, _order_key)
+            if full or upserts or removed or stats != sub.order_stats:
+                sub.order_stats = stats
+                self._emit('order_book_delta', {'full': full, 'upserts': upserts, 'removed': removed, 'stats': stats}, sub, len(rows))
+
+        position_response = get_positions(auth_token=sub.auth_token, api_key=sub.api_key, tenant=sub.tenant)
+        if _is_ok(position_response):
+            rows = build_positions(position_response)
+            previous = {} if full else sub.positions
+            sub.positions, upserts, removed = diff_rows(previous, rows, _position_key)
+            if full or upserts or removed:
+                self._emit('positions_delta', {'full': full, 'upserts': upserts, 'removed': [list(k) for k in removed]}, sub, len(rows))
+
+    def _emit(self, event, payload, sub, snapshot_rows):
+        with self._lock:
+            self.rows_sent += len(payload['upserts']) + len(payload['removed'])
+            self.full_rows += snapshot_rows
+        socketio.emit(event, payload, to=sub.room)
+
+    def get_metrics(self):
+        """Subscriber count and rows pushed vs rows a full refresh would have sent"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "subscribers": len(self.subscriptions),
+                "sockets": sum(len(sub.sids) for sub in self.subscriptions.values()),
+                "interval_seconds": self.interval,
+                "workers": self.max_workers,
+                "polls": self.polls,
+                "skipped_busy": self.skipped,
+                "rows_sent": self.rows_sent,
+                "full_refresh_rows": self.full_rows
+            }
+
+# Global change feed shared by all socket connections in this process
+change_feed = ChangeFeed()
+
+
+@socketio.on('connect')
+def feed_connect():
+    if not change_feed.enabled or not session.get('logged_in') or session.get('user_id') == 'TEST123':
+        return
+    auth_token = session.get('AUTH_TOKEN')
+    api_key = session.get('apikey')
+    if not auth_token or not api_key:
+        return
+    room = change_feed.subscribe(request.sid, session.get('user'), auth_token, api_key)
+    join_room(room)
+
+
+@socketio.on('disconnect')
+def feed_disconnect():
+    change_feed.unsubscribe(request.sid)
+
+
+@socketio.on('feed_resync')
+def feed_resync():
+    if session.get('logged_in') and session.get('user'):
+        change_feed.request_resync(session.get('user'))
@@ -0,0 +1,169 @@
+# services/contract_maintenance.py
+
+"""
+Daily pruning of expired contracts from the scrip master.
+
+symtoken keeps every derivative until the next full master contract load,
+and an incremental load would keep them forever, so lookups, LIKE searches
+and the in-memory option chains would grow with history rather than with
+the live universe. Once a day, before the market opens, the job:
+
+1. deletes every contract that expired before today in one statement;
+2. compacts symtoken and its indexes (VACUUM/ANALYZE, see compact_symtoken);
+3. republishes the scrip snapshot (other workers swap to it), rebuilds the
+   option chain index and expiry calendar and drops the token cache, so
+   pruned contracts are no longer served.
+
+Steps 2 and 3 are skipped when nothing was pruned. The job is started in
+every worker process, but only the worker holding the leader lock runs
+it, and each run also holds a run lock (see utils.process_lock), so the
+DELETE, VACUUM/REINDEX and snapshot publish happen once per host and never
+overlap with a cron-triggered run. On serverless
+deployments, where background threads do not survive, run it from a cron
+job instead:
+
+    python -m services.contract_maintenance --once
+"""
+
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from utils.process_lock import ProcessLock
+
+CONTRACT_MAINTENANCE_TIME = os.getenv('CONTRACT_MAINTENANCE_TIME', '07:30')  # local HH:MM, daily
+CONTRACT_PRUNE_GRACE_DAYS = int(os.getenv('CONTRACT_PRUNE_GRACE_DAYS', '0'))  # keep contracts this many days past expiry
+CONTRACT_REINDEX_FRACTION = float(os.getenv('CONTRACT_REINDEX_FRACTION', '0.2'))  # rebuild indexes past this share pruned
+
+
+class ContractMaintenance:
+    """Prunes expired contracts, compacts symtoken and refreshes the lookup structures"""
+
+    def __init__(self, run_at=CONTRACT_MAINTENANCE_TIME, grace_days=CONTRACT_PRUNE_GRACE_DAYS,
+                 reindex_fraction=CONTRACT_REINDEX_FRACTION):
+        hour, minute = run_at.split(':')
+        self.run_at = (int(hour), int(minute))
+        self.grace = timedelta(days=grace_days)
+        self.reindex_fraction = reindex_fraction
+        self.metrics = {"runs": 0, "pruned": 0, "skipped": 0, "last_run": None, "last_pruned": 0,
+                        "last_remaining": None, "last_compaction": [], "last_ms": None, "next_run": None}
+        self._lock = threading.Lock()
+        self._running = threading.Lock()
+        self._leader = ProcessLock('contract-maintenance-leader')  # held for life by the scheduling worker
+        self._run_lock = ProcessLock('contract-maintenance')  # held across processes for the length of a run
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the daily loop in a daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="contract-maintenance", daemon=True)
+        self._thread.start()
+        print("Contract maintenance scheduled daily at %02d:%02d" % self.run_at)
+
+    def stop(self):
+        self._stop.set()
+
+    def seconds_until_next_run(self, now=None):
+        now = now or datetime.now()
+        next_run = now.replace(hour=self.run_at[0], minute=self.run_at[1], second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        with self._lock:
+            self.metrics["next_run"] = next_run.isoformat()
+        return (next_run - now).total_seconds()
+
+    def _run(self):
+        while not self._stop.wait(self.seconds_until_next_run()):
+            if not self._leader.acquire():
+                continue  # Another worker on this host runs the job
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"ERROR in contract maintenance: {str(e)}")
+
+    def run_once(self, today=None, force_compact=False):
+        """
+        Prune, compact and refresh once
+
+        Args:
+            today (date): Contracts expiring before this date (less the grace period) are pruned
+            force_compact (bool): Compact even when nothing was pruned
+
+        Returns:
+            dict: {"pruned": int, "remaining": int, "compaction": [statements], "refreshed": bool}
+                or {"skipped": True} when another run is in progress in this or another process
+        """
+        from database.master_contract_db import (
+            SymToken, db_session, prune_expired_contracts, compact_symtoken
+        )
+
+        if not self._running.acquire(blocking=False):
+            return {"skipped": True}
+        if not self._run_lock.acquire():
+            self._running.release()
+            with self._lock:
+                self.metrics["skipped"] += 1
+            return {"skipped": True}
+        started = time.perf_counter()
+        try:
+            pruned = prune_expired_contracts((today or date.today()) - self.grace)
+            try:
+                remaining = SymToken.query.count()
+            finally:
+                db_session.remove()
+
+            compaction = []
+            if pruned or force_compact:
+                reindex = pruned > (pruned + remaining) * self.reindex_fraction
+                compaction = compact_symtoken(reindex=reindex)
+                self.refresh_lookups()
+
+            with self._lock:
+                self.metrics.update(
+                    runs=self.metrics["runs"] + 1, pruned=self.metrics["pruned"] + pruned,
+                    last_run=datetime.now().isoformat(), last_pruned=pruned, last_remaining=remaining,
+                    last_compaction=compaction, last_ms=round((time.perf_counter() - started) * 1000, 1)
+                )
+            return {"pruned": pruned, "remaining": remaining, "compaction": compaction,
+                    "refreshed": bool(pruned or force_compact)}
+        finally:
+            self._run_lock.release()
+            self._running.release()
+
+    def refresh_lookups(self):
+        """Rebuild the in-memory structures from the pruned table"""
+        from database.option_chain import option_chain_index
+        from database.expiry_calendar import expiry_calendar
+        from database.scrip_snapshot import scrip_snapshot
+        from database.token_db import token_cache
+
+        # Publishing first: it signals the other workers, which drop their own copies
+        if scrip_snapshot.current is not None:
+            scrip_snapshot.publish_from_db()
+        option_chain_index.build()
+        expiry_calendar.build()
+        token_cache.clear()
+
+    def get_metrics(self):
+        with self._lock:
+            return dict(self.metrics, run_at="%02d:%02d" % self.run_at, grace_days=self.grace.days,
+                        leader=self._leader.held)
+
+
+# Global job, started by the app factory outside serverless deployments
+contract_maintenance = ContractMaintenance()
+
+
+if __name__ == '__main__':
+    import sys
+    if '--once' in sys.argv:
+        print(contract_maintenance.run_once(force_compact='--compact' in sys.argv))
+        print(contract_maintenance.get_metrics())
+    else:
+        contract_maintenance.start()
+        while True:
+            time.sleep(3600)
@@ -1,12 +1,17 @@
 # services/session_service.py
 
 import os
+import time
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import session, request, jsonify, g
-from database.auth_db import (
-    get_user_session, get_new_user_by_id, UserSessions, db_session
-)
+from database.session_store import session_store
+
+# Expired-session sweeps delete in bounded batches with a pause in between, and stop
+# after a bounded number of batches; any backlog is picked up by the next sweep
+SESSION_CLEANUP_BATCH_SIZE = int(os.getenv('SESSION_CLEANUP_BATCH_SIZE', '1000'))
+SESSION_CLEANUP_MAX_BATCHES = int(os.getenv('SESSION_CLEANUP_MAX_BATCHES', '50'))
+SESSION_CLEANUP_PAUSE_SECONDS = float(os.getenv('SESSION_CLEANUP_PAUSE_SECONDS', '0.1'))
 
 class SessionService:
     """Service class for handling session management operations"""
@@ -29,15 +34,15 @@ class SessionService:
             
             session_token = session.get('new_auth_session_token')
             
-            # Validate session token
-            session_obj = get_user_session(session_token)
+            # Validate session token (served from the session store's memory tier)
+            session_obj = session_store.get(session_token)
             if not session_obj:
                 # Session is invalid, clear session data
                 self.clear_session()
                 return None
             
             # Get user information
-            user = get_new_user_by_id(session_obj.user_id)
+            user = session_store.get_user(session_obj.user_id)
             if not user or not user.is_active:
                 # User not found or inactive, clear session
                 self.clear_session()
@@ -47,6 +52,7 @@ class SessionService:
             session['new_auth_user_id'] = user.id
             session['new_auth_username'] = user.username
             session['new_auth_email'] = user.email
+            session_store.touch(session_token)
             
             return {
                 "id": user.id,
@@ -92,7 +98,7 @@ class SessionService:
                 return None
             
             session_token = session.get('new_auth_session_token')
-            session_obj = get_user_session(session_token)
+            session_obj = session_store.get(session_token)
             
             if not session_obj:
                 return None
@@ -102,6 +108,7 @@ class SessionService:
                 "user_id": session_obj.user_id,
                 "expires_at": session_obj.expires_at.isoformat() if session_obj.expires_at else None,
                 "created_at": session_obj.created_at.isoformat() if session_obj.created_at else None,
+                "last_seen_at": session_obj.last_seen_at.isoformat() if session_obj.last_seen_at else None,
                 "time_remaining": self._get_time_remaining(session_obj.expires_at)
             }
             
@@ -144,7 +151,7 @@ class SessionService:
                 return {"status": "error", "message": "No active session"}
             
             session_token = session.get('new_auth_session_token')
-            session_obj = get_user_session(session_token)
+            session_obj = session_store.get(session_token)
             
             if not session_obj:
                 return {"status": "error", "message": "Session not found"}
@@ -153,9 +160,9 @@ class SessionService:
             extension_hours = hours or self.session_duration_hours
             new_expires_at = datetime.now() + timedelta(hours=extension_hours)
             
-            # Update session in database
-            session_obj.expires_at = new_expires_at
-            db_session.commit()
+            # Update session in the store and its backend
+            if not session_store.extend(session_token, new_expires_at):
+                return {"status": "error", "message": "Session not found"}
             
             print(f"Session extended for user {session_obj.user_id} until {new_expires_at}")
             
@@ -169,31 +176,44 @@ class SessionService:
             print(f"ERROR extending session: {str(e)}")
             return {"status": "error", "message": "Failed to extend session"}
     
-    def cleanup_expired_sessions(self):
+    def cleanup_expired_sessions(self, batch_size=None, max_batches=None, pause=None):
         """
-        Clean up expired sessions from the database
+        Clean up expired sessions from the database incrementally
         
+        Args:
+            batch_size (int): Rows deleted per transaction (default SESSION_CLEANUP_BATCH_SIZE)
+            max_batches (int): Batches per call before yielding (default SESSION_CLEANUP_MAX_BATCHES)
+            pause (float): Seconds to sleep between batches (default SESSION_CLEANUP_PAUSE_SECONDS)
+            
         Returns:
-            dict: Result with count of cleaned sessions
+            dict: Result with count of cleaned sessions, batches run and whether the
+                backlog was fully cleared ("complete")
         """
+        batch_size = batch_size or SESSION_CLEANUP_BATCH_SIZE
+        max_batches = max_batches or SESSION_CLEANUP_MAX_BATCHES
+        pause = SESSION_CLEANUP_PAUSE_SECONDS if pause is None else pause
+        count = 0
+        batches = 0
+        complete = False
         try:
-            # Delete expired sessions
-            expired_sessions = UserSessions.query.filter(
-                UserSessions.expires_at < datetime.now()
-            ).all()
-            
-            count = len(expired_sessions)
-            for session_obj in expired_sessions:
-                db_session.delete(session_obj)
-            
-            db_session.commit()
-            
-            print(f"Cleaned up {count} expired sessions")
-            return {"status": "success", "count": count}
+            # A fixed cutoff keeps the sweep from chasing sessions that expire while it runs
+            cutoff = datetime.now()
+            while batches < max_batches:
+                deleted = session_store.delete_expired(batch_size, cutoff)
+                batches += 1
+                count += deleted
+                if deleted < batch_size:
+                    complete = True
+                    break
+                if pause:
+                    time.sleep(pause)
+            
+            print(f"Cleaned up {count} expired sessions in {batches} batch(es)" + ("" if complete else ", backlog remaining"))
+            return {"status": "success", "count": count, "batches": batches, "complete": complete}
             
         except Exception as e:
             print(f"ERROR in cleanup_expired_sessions: {str(e)}")
-            return {"status": "error", "message": "Failed to cleanup sessions"}
+            return {"status": "error", "message": "Failed to cleanup sessions", "count": count}
     
     def get_all_user_sessions(self, user_id):
         """
@@ -206,9 +226,7 @@ class SessionService:
             list: List of active sessions
         """
         try:
-            sessions = UserSessions.query.filter_by(user_id=user_id).filter(
-                UserSessions.expires_at > datetime.now()
-            ).all()
+            sessions = session_store.for_user(user_id)
             
             return [{
                 "id": s.id,
@@ -235,20 +253,7 @@ class SessionService:
         try:
             current_token = session.get('new_auth_session_token') if except_current else None
             
-            sessions_to_delete = UserSessions.query.filter_by(user_id=user_id)
-            
-            if current_token:
-                sessions_to_delete = sessions_to_delete.filter(
-                    UserSessions.session_token != current_token
-                )
-            
-            sessions = sessions_to_delete.all()
-            count = len(sessions)
-            
-            for session_obj in sessions:
-                db_session.delete(session_obj)
-            
-            db_session.commit()
+            count = session_store.delete_user(user_id, except_token=current_token)
             
             print(f"Revoked {count} sessions for user {user_id}")
             return {"status": "success", "count": count}
@@ -0,0 +1,178 @@
+# services/token_refresh.py
+
+"""
+Background refresh of broker tokens ahead of expiry.
+
+A scheduler thread periodically selects active connections whose
+BrokerTokens.expires_at falls within the lead window (an indexed range scan)
+and refreshes them through the broker adapter on a small worker pool.
+store_broker_tokens writes the new tokens through to this worker's token
+cache and bumps the connection's shared generation (see
+database.credential_store), so the other workers reload them on their next
+read. Request handlers always read a valid token and never refresh on the
+order path. Failed refreshes back off before being retried.
+
+The scheduler is started in every worker process, but only the worker
+holding the leader lock (see utils.process_lock) scans, so each connection
+is refreshed once per host rather than once per worker.
+
+On serverless deployments, where background threads do not survive, run one
+sweep from a cron job instead:
+
+    python -m services.token_refresh --once
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from database.auth_db import BrokerConnections, BrokerTokens, db_session
+from services.broker_service import broker_service
+from utils.process_lock import ProcessLock
+
+TOKEN_REFRESH_INTERVAL = int(os.getenv('TOKEN_REFRESH_INTERVAL', '300'))        # seconds between scans
+TOKEN_REFRESH_LEAD_MINUTES = int(os.getenv('TOKEN_REFRESH_LEAD_MINUTES', '120'))  # refresh this long before expiry
+TOKEN_REFRESH_CONCURRENCY = int(os.getenv('TOKEN_REFRESH_CONCURRENCY', '4'))
+TOKEN_REFRESH_RETRY_SECONDS = int(os.getenv('TOKEN_REFRESH_RETRY_SECONDS', '600'))
+
+
+class TokenRefreshScheduler:
+    """Refreshes broker tokens before they expire with bounded concurrency"""
+
+    def __init__(self, interval=TOKEN_REFRESH_INTERVAL, lead_minutes=TOKEN_REFRESH_LEAD_MINUTES,
+                 max_concurrency=TOKEN_REFRESH_CONCURRENCY, retry_seconds=TOKEN_REFRESH_RETRY_SECONDS):
+        self.interval = interval
+        self.lead = timedelta(minutes=lead_minutes)
+        self.max_concurrency = max_concurrency
+        self.retry_seconds = retry_seconds
+        self.retry_after = {}  # connection_id -> monotonic time before which it is skipped
+        self.in_progress = set()
+        self.metrics = {"scans": 0, "refreshed": 0, "failed": 0, "last_scan": None, "last_due": 0}
+        self._lock = threading.Lock()
+        self._leader = ProcessLock('token-refresh-leader')  # held for life by the scanning worker
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    def start(self):
+        """Start the scan loop in a daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="token-refresh")
+        self._thread = threading.Thread(target=self._run, name="token-refresh-scheduler", daemon=True)
+        self._thread.start()
+        print("Token refresh scheduler started")
+
+    def stop(self):
+        self._stop.set()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._leader.acquire():
+                # Another worker on this host scans; try again in case it has exited
+                self._stop.wait(self.interval)
+                continue
+            try:
+                self.run_once(self._executor)
+            except Exception as e:
+                print(f"ERROR in token refresh scan: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def due_connections(self):
+        """
+        Active connections whose tokens expire within the lead window
+
+        Returns:
+            list: (BrokerConnections, refresh_token) pairs
+        """
+        # expires_at is stored in UTC
+        cutoff = datetime.now(timezone.utc) + self.lead
+        try:
+            rows = db_session.query(BrokerConnections, BrokerTokens.refresh_token).join(
+                BrokerTokens, BrokerTokens.connection_id == BrokerConnections.id
+            ).filter(
+                BrokerTokens.expires_at <= cutoff,
+                BrokerTokens.refresh_token.isnot(None),
+                BrokerConnections.is_active == True
+            ).all()
+            # The rows are handed to worker threads, so keep their attributes loaded
+            db_session.expunge_all()
+            return rows
+        finally:
+            db_session.remove()
+
+    def run_once(self, executor=None):
+        """
+        Scan and refresh every due connection once
+
+        Args:
+            executor (ThreadPoolExecutor): Pool to refresh on; a temporary one is used when omitted
+
+        Returns:
+            dict: {"due": int, "submitted": int}
+        """
+        now = time.monotonic()
+        due = self.due_connections()
+        with self._lock:
+            self.metrics["scans"] += 1
+            self.metrics["last_scan"] = datetime.now().isoformat()
+            self.metrics["last_due"] = len(due)
+            jobs = [(connection, refresh_token) for connection, refresh_token in due
+                    if connection.id not in self.in_progress and self.retry_after.get(connection.id, 0) <= now]
+            self.in_progress.update(connection.id for connection, _ in jobs)
+
+        if executor is None:
+            with ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="token-refresh") as pool:
+                list(pool.map(lambda job: self._refresh(*job), jobs))
+        else:
+            for job in jobs:
+                executor.submit(self._refresh, *job)
+        return {"due": len(due), "submitted": len(jobs)}
+
+    def _refresh(self, connection, refresh_token):
+        connection_id = connection.id
+        try:
+            # Re-attach to this worker thread's session so last_sync_at can be updated
+            connection = db_session.merge(connection, load=False)
+            result = broker_service.refresh_connection_tokens(connection, refresh_token)
+        except Exception as e:
+            db_session.rollback()
+            result = {"status": "error", "message": str(e)}
+        finally:
+            db_session.remove()
+
+        with self._lock:
+            self.in_progress.discard(connection_id)
+            if result["status"] == "success":
+                self.metrics["refreshed"] += 1
+                self.retry_after.pop(connection_id, None)
+            else:
+                self.metrics["failed"] += 1
+                self.retry_after[connection_id] = time.monotonic() + self.retry_seconds
+        if result["status"] != "success":
+            print(f"Token refresh failed for connection {connection_id}: {result['message']}")
+
+    def get_metrics(self):
+        with self._lock:
+            return dict(self.metrics, in_progress=len(self.in_progress), backing_off=len(self.retry_after),
+                        lead_minutes=int(self.lead.total_seconds() // 60), interval_seconds=self.interval,
+                        leader=self._leader.held)
+
+
+# Global scheduler, started by the app factory outside serverless deployments
+token_refresh_scheduler = TokenRefreshScheduler()
+
+
+if __name__ == '__main__':
+    import sys
+    if '--once' in sys.argv:
+        print(token_refresh_scheduler.run_once())
+        print(token_refresh_scheduler.get_metrics())
+    else:
+        token_refresh_scheduler.start()
+        while True:
+            time.sleep(3600)
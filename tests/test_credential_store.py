@@ -0,0 +1,155 @@
+# tests/test_credential_store.py
+
+"""
+Simple test script for the credential store's caching and invalidation
+The database loaders are replaced with counters, so this can be run manually
+without the Flask app or a database, and also under pytest
+"""
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database.credential_store as store_module
+from database.credential_store import CredentialStore, Credentials, Route, token_expired
+from utils.shared_generation import SharedGenerations
+
+def check(name, passed):
+    print(f"  ✅ {name}" if passed else f"  ❌ {name}")
+    assert passed, name
+
+class FakeDatabase:
+    """Stands in for the module's loaders; counts loads and serves the current token"""
+
+    def __init__(self):
+        self.loads = 0
+        self.token = 'token-1'
+        self.expires_at = datetime.now(timezone.utc) + timedelta(hours=8)
+        self.routes = {'tm-key': Route('7', 42, None)}
+        self.route_queries = 0
+
+    def load_connection(self, connection_id):
+        self.loads += 1
+        return Credentials(self.token, 'broker-key', connection_id, self.expires_at)
+
+    def resolve_route(self, api_key):
+        self.route_queries += 1
+        return self.routes.get(api_key)
+
+@contextmanager
+def fake_store(workers=1):
+    """
+    Fresh stores (one per simulated worker process) sharing generation counters in a temporary
+    directory, whose loaders read FakeDatabase; the real loaders are restored afterwards
+    """
+    database = FakeDatabase()
+    loaders = store_module._load_connection, store_module._resolve_route
+    store_module._load_connection = database.load_connection
+    store_module._resolve_route = database.resolve_route
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            stores = [CredentialStore(ttl=60, generations=SharedGenerations('test-credentials', directory=directory))
+                      for _ in range(workers)]
+            yield (stores[0] if workers == 1 else stores), database
+    finally:
+        store_module._load_connection, store_module._resolve_route = loaders
+
+def test_connection_invalidation():
+    print("Testing connection invalidation...")
+    with fake_store() as (store, database):
+        first = store.for_connection(42)
+        store.for_connection(42)
+        check("Second lookup served from the store", database.loads == 1)
+
+        database.token = 'token-2'
+        check("Stale token kept until invalidated", store.for_connection(42).auth_token == first.auth_token)
+        store.invalidate_connection(42)
+        check("Reloaded after invalidation", store.for_connection(42).auth_token == 'token-2' and database.loads == 2)
+        check("Invalidation counted", store.get_metrics()['invalidations'] == 1)
+
+def test_expired_token_reloads():
+    print("\nTesting expired token reload...")
+    with fake_store() as (store, database):
+        database.expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+        store.for_connection(42)
+        store.for_connection(42)
+        check("Expired entry reloaded on every lookup", database.loads == 2)
+
+        database.expires_at = (datetime.now(timezone.utc) + timedelta(hours=1)).replace(tzinfo=None)
+        store.invalidate_connection(42)
+        store.for_connection(42)
+        store.for_connection(42)
+        check("Naive (SQLite) expiry read as UTC", database.loads == 3)
+
+def test_api_key_routes():
+    print("\nTesting API key routes...")
+    with fake_store() as (store, database):
+        check("Key routed to its user's connection", store.for_api_key('tm-key').connection_id == 42)
+        check("Unknown key rejected", store.for_api_key('other-key') is None)
+
+        database.routes['tm-key'] = Route('7', 43, None)
+        check("Route cached until invalidated", store.for_api_key('tm-key').connection_id == 42)
+        store.invalidate_user(7)
+        check("User invalidation drops the route", store.for_api_key('tm-key').connection_id == 43)
+
+        store.clear()
+        check("Clear empties the store", store.get_metrics()['entries'] == 0 and store.get_metrics()['routes'] == 0)
+
+def test_invalidation_across_workers():
+    print("\nTesting invalidation across worker processes...")
+    with fake_store(workers=2) as (stores, database):
+        writer, reader = stores
+        reader.for_connection(42)
+        reader.for_api_key('tm-key')
+        loads, route_queries = database.loads, database.route_queries
+
+        database.token = 'token-2'
+        writer.invalidate_connection(42)
+        check("Other worker reloads a changed connection", reader.for_connection(42).auth_token == 'token-2')
+        check("Reloaded once", database.loads == loads + 1)
+
+        database.routes['tm-key'] = Route('7', 43, None)
+        writer.invalidate_user(7)
+        check("Other worker re-resolves a changed route", reader.for_api_key('tm-key').connection_id == 43)
+        check("Route resolved once", database.route_queries == route_queries + 1)
+
+def test_unknown_keys_cached():
+    print("\nTesting unknown API keys...")
+    with fake_store(workers=2) as (stores, database):
+        writer, reader = stores
+        for _ in range(3):
+            reader.for_api_key('bad-key')
+        check("Unknown key queried once", database.route_queries == 1)
+        check("Rejections counted", reader.get_metrics()['rejected'] == 2)
+
+        database.routes['bad-key'] = Route('8', 44, None)
+        writer.invalidate_user(8)
+        check("Key accepted once its user changes", reader.for_api_key('bad-key').connection_id == 44)
+
+def test_token_expired():
+    print("\nTesting token_expired...")
+    now = datetime(2024, 3, 28, 9, 15, tzinfo=timezone.utc)
+    check("No expiry never expires", not token_expired(None, now))
+    check("Past expiry", token_expired(now - timedelta(minutes=1), now))
+    check("Future expiry", not token_expired(now + timedelta(minutes=1), now))
+    check("Naive expiry compared as UTC", token_expired(datetime(2024, 3, 28, 9, 14), now))
+
+if __name__ == "__main__":
+    print("🧪 Testing Credential Store")
+    print("=" * 50)
+
+    test_connection_invalidation()
+    test_expired_token_reloads()
+    test_api_key_routes()
+    test_invalidation_across_workers()
+    test_unknown_keys_cached()
+    test_token_expired()
+
+    print("\n" + "=" * 50)
+    print("✅ Credential store tests completed!")
+    print("\nTo run these tests:")
+    print("Run: python tests/test_credential_store.py")
@@ -0,0 +1,182 @@
+# tests/test_option_chain.py
+
+"""
+Simple test script for resolving relative option specs (underlying + expiry +
+strike offset) against the in-memory option chain index, and futures and
+rollover expiries against the expiry calendar. Both are filled by hand, so
+this can be run manually without the Flask app or a database, and also under pytest
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.option_chain import OptionChainIndex, OptionLeg, ExpirySeries, Underlying, strike_steps
+from database.expiry_calendar import ExpiryCalendar, FutureContract
+from database.scrip_snapshot import ScripSnapshot, scrip_snapshot, write_snapshot
+
+TODAY = date(2024, 3, 10)
+EXPIRIES = [date(2024, 3, 7), date(2024, 3, 14), date(2024, 3, 21), date(2024, 3, 28), date(2024, 4, 4), date(2024, 4, 25)]
+STRIKES = [21900.0, 22000.0, 22100.0]
+
+def check(name, passed):
+    print(f"  ✅ {name}" if passed else f"  ❌ {name}")
+    assert passed, name
+
+def raises_value_error(func, *args, **kwargs):
+    try:
+        func(*args, **kwargs)
+    except ValueError:
+        return True
+    return False
+
+def make_index():
+    """NIFTY on NFO: every expiry lists CE and PE at each strike, except no PE at the top strike"""
+    series = []
+    for expiry in EXPIRIES:
+        code = expiry.strftime('%d%b%y').upper()
+        legs = {}
+        for strike in STRIKES:
+            legs[strike] = {option_type: OptionLeg(f"NIFTY{code}{strike:g}{option_type}", f"NIFTY{code}{strike:g}{option_type}",
+                                                   str(int(strike)), 50, 0.05)
+                            for option_type in ('CE', 'PE') if not (option_type == 'PE' and strike == STRIKES[-1])}
+        series.append(ExpirySeries(expiry, STRIKES, legs))
+    index = OptionChainIndex()
+    index._chains = {('NFO', 'NIFTY'): Underlying(EXPIRIES, series)}
+    return index
+
+def test_strike_steps():
+    print("Testing strike_steps...")
+    check("Integer offsets pass through", strike_steps(-2, 'CE') == -2)
+    check("ATM and empty are zero", strike_steps('ATM', 'CE') == 0 and strike_steps('', 'PE') == 0 and strike_steps(None, 'PE') == 0)
+    check("Signed strings", strike_steps('+1', 'CE') == 1 and strike_steps('-3', 'PE') == -3)
+    check("OTM calls go up, OTM puts go down", strike_steps('OTM2', 'CE') == 2 and strike_steps('otm2', 'PE') == -2)
+    check("ITM calls go down, ITM puts go up", strike_steps('ITM1', 'CE') == -1 and strike_steps('ITM', 'PE') == 1)
+    check("Unknown offsets rejected", raises_value_error(strike_steps, 'DEEP', 'CE'))
+
+def test_select_expiry():
+    print("\nTesting select_expiry...")
+    index = make_index()
+    check("current_week is the nearest live expiry", index.select_expiry('NIFTY', today=TODAY) == date(2024, 3, 14))
+    check("next_week", index.select_expiry('nifty', 'next_week', today=TODAY) == date(2024, 3, 21))
+    check("current_month is the month's last expiry", index.select_expiry('NIFTY', 'current_month', today=TODAY) == date(2024, 3, 28))
+    check("next_month", index.select_expiry('NIFTY', 'next_month', today=TODAY) == date(2024, 4, 25))
+    check("Explicit expiry", index.select_expiry('NIFTY', '21-MAR-24', today=TODAY) == date(2024, 3, 21))
+    check("Expired explicit expiry rejected", index.select_expiry('NIFTY', '07-MAR-24', today=TODAY) is None)
+    check("Expiry day still live", index.select_expiry('NIFTY', today=date(2024, 3, 14)) == date(2024, 3, 14))
+    check("Nothing after the last expiry", index.select_expiry('NIFTY', today=date(2024, 5, 1)) is None)
+    check("Unknown underlying", index.select_expiry('BANKNIFTY', today=TODAY) is None)
+
+def test_resolve_bisect_edges():
+    print("\nTesting resolve strike selection...")
+    index = make_index()
+
+    def strike(reference_price, option_type='CE', offset=0):
+        return index.resolve('NIFTY', option_type, reference_price, '14-MAR-24', offset, today=TODAY)[2]
+
+    check("Nearest strike below", strike(22049) == 22000.0)
+    check("Halfway rounds down", strike(22050) == 22000.0)
+    check("Nearest strike above", strike(22051) == 22100.0)
+    check("Exact strike", strike(22100) == 22100.0)
+    check("Below the ladder clamps to the lowest strike", strike(100) == 21900.0)
+    check("Above the ladder clamps to the highest strike", strike(99999) == 22100.0)
+    check("Offset from ATM", strike(22000, 'CE', 'OTM1') == 22100.0 and strike(22000, 'PE', 'OTM1') == 21900.0)
+    check("Offset past the top rejected", raises_value_error(strike, 22100, 'CE', 1))
+    check("Offset past the bottom rejected", raises_value_error(strike, 21900, 'CE', -1))
+    check("Missing leg rejected", raises_value_error(strike, 22100, 'PE'))
+    check("Bad option type rejected", raises_value_error(strike, 22000, 'XX'))
+
+    exchange, expiry, _, leg = index.resolve('NIFTY', 'PE', 21990, today=TODAY)
+    check("Nearest expiry by default", (exchange, expiry, leg.symbol) == ('NFO', date(2024, 3, 14), 'NIFTY14MAR2422000PE'))
+    check("No live expiry rejected", raises_value_error(index.resolve, 'NIFTY', 'CE', 22000, today=date(2024, 5, 1)))
+
+def make_calendar():
+    """NIFTY monthly futures next to the weekly options"""
+    calendar = ExpiryCalendar()
+    futures = [date(2024, 2, 29), date(2024, 3, 28), date(2024, 4, 25), date(2024, 5, 30)]
+    calendar._calendar = {('NFO', 'NIFTY'): {'FUTIDX': futures, 'OPTIDX': EXPIRIES}}
+    calendar._futures = {('NFO', 'NIFTY'): {
+        expiry: FutureContract(f"NIFTY{expiry.strftime('%d%b%y').upper()}FUT", f"NIFTY{expiry.strftime('%d%b%y').upper()}FUT",
+                               str(expiry.toordinal()), 50, 0.05)
+        for expiry in futures}}
+    return calendar
+
+def test_expiry_calendar():
+    print("\nTesting expiry calendar...")
+    calendar = make_calendar()
+    check("Nearest future", calendar.nearest('NIFTY', 'FUTIDX', today=TODAY) == date(2024, 3, 28))
+    check("Nearest of any type", calendar.nearest('NIFTY', today=TODAY) == date(2024, 3, 14))
+    check("Rollover target", calendar.next_after('NIFTY', '28-MAR-24', 'FUTIDX') == date(2024, 4, 25))
+    check("No rollover after the last expiry", calendar.next_after('NIFTY', date(2024, 5, 30), 'FUTIDX') is None)
+    summary = calendar.summary('nifty', 'FUTIDX', today=TODAY)
+    check("Summary", (summary['nearest'], summary['rollover'], len(summary['expiries'])) == ('28-MAR-24', '25-APR-24', 3))
+    check("Unknown underlying", calendar.summary('BANKNIFTY', today=TODAY) is None)
+
+def test_resolve_future():
+    print("\nTesting futures resolution...")
+    calendar = make_calendar()
+    exchange, expiry, contract = calendar.resolve_future('NIFTY', today=TODAY)
+    check("Nearest futures contract", (exchange, expiry, contract.symbol) == ('NFO', date(2024, 3, 28), 'NIFTY28MAR24FUT'))
+    check("next_month is the rollover contract",
+          calendar.resolve_future('NIFTY', 'next_month', today=TODAY)[2].symbol == 'NIFTY25APR24FUT')
+    check("Explicit expiry", calendar.resolve_future('NIFTY', '30-MAY-24', today=TODAY)[1] == date(2024, 5, 30))
+    check("Expired contract rejected", raises_value_error(calendar.resolve_future, 'NIFTY', '29-FEB-24', today=TODAY))
+    check("Unknown underlying rejected", raises_value_error(calendar.resolve_future, 'BANKNIFTY', today=TODAY))
+
+def snapshot_rows():
+    """Contracts as the master contract load writes them: options, futures and an equity"""
+    rows = [dict(symbol='RELIANCE', brsymbol='RELIANCE-EQ', name='RELIANCE', exchange='NSE', token='2885',
+                 instrumenttype='')]
+    for expiry in EXPIRIES[1:3]:
+        code = expiry.strftime('%d%b%y').upper()
+        for strike in STRIKES:
+            for option_type in ('CE', 'PE'):
+                rows.append(dict(symbol=f"NIFTY{code}{strike:g}{option_type}", brsymbol=f"NIFTY{code}{strike:g}{option_type}",
+                                 name='NIFTY', exchange='NFO', token=f"{expiry.day}{int(strike)}{option_type}",
+                                 expiry=expiry.strftime('%d-%b-%y').upper(), expiry_date=expiry,
+                                 instrumenttype='OPTIDX', strike=strike, lotsize=50, tick_size=0.05))
+    rows.append(dict(symbol='NIFTY28MAR24FUT', brsymbol='NIFTY28MAR24FUT', name='NIFTY', exchange='NFO', token='53001',
+                     expiry='28-MAR-24', expiry_date=date(2024, 3, 28), instrumenttype='FUTIDX', lotsize=50, tick_size=0.05))
+    return rows
+
+def test_build_from_snapshot():
+    print("\nTesting index and calendar built from the mapped snapshot...")
+    previous = scrip_snapshot.current
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'scrip_master.snap')
+        write_snapshot(snapshot_rows(), path)
+        scrip_snapshot.current = ScripSnapshot(path)
+        try:
+            index = OptionChainIndex()
+            check("Every option contract indexed", index.build() == 12 and index.metrics["source"] == 'snapshot')
+            exchange, expiry, strike, leg = index.resolve('NIFTY', 'CE', 22010, today=TODAY)
+            check("Legs read from the snapshot", (exchange, expiry, strike, leg.symbol, leg.lotsize) ==
+                  ('NFO', date(2024, 3, 14), 22000.0, 'NIFTY14MAR2422000CE', 50))
+
+            calendar = ExpiryCalendar()
+            calendar.build()
+            check("Calendar built from the snapshot", calendar.metrics["source"] == 'snapshot')
+            check("Distinct expiries per type", calendar.expiries('NIFTY', 'OPTIDX', today=TODAY) == EXPIRIES[1:3])
+            check("Futures contract listed", calendar.resolve_future('NIFTY', today=TODAY)[2].token == '53001')
+            check("Contracts without expiry skipped", calendar.expiries('RELIANCE', exchange='NSE') == [])
+        finally:
+            scrip_snapshot.current = previous
+
+if __name__ == "__main__":
+    print("🧪 Testing Option Chain Resolution")
+    print("=" * 50)
+
+    test_strike_steps()
+    test_select_expiry()
+    test_resolve_bisect_edges()
+    test_expiry_calendar()
+    test_resolve_future()
+    test_build_from_snapshot()
+
+    print("\n" + "=" * 50)
+    print("✅ Option chain tests completed!")
+    print("\nTo run these tests:")
+    print("Run: python tests/test_option_chain.py")
@@ -0,0 +1,129 @@
+# tests/test_order_mapping.py
+
+"""
+Simple test script for the single-pass order book, trade book, positions and
+holdings builders: the expected rows and statistics below are what the former
+map -> statistics -> transform mappers produced for the same responses
+This can be run manually (no Flask app or broker needed) and also under pytest
+"""
+
+import copy
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Symbols are served from the token cache below; no snapshot is mapped and the database is never queried
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'tm-test-mapping.db'))
+os.environ['SCRIP_SNAPSHOT_PATH'] = os.path.join(tempfile.gettempdir(), 'tm-test-mapping-missing.snap')
+
+from database.token_db import token_cache
+from mapping.order_data import build_order_book, build_trade_book, build_positions, build_holdings
+
+# (token, exchange, symbol, broker symbol)
+UNIVERSE = [
+    ('2885', 'NSE', 'RELIANCE', 'RELIANCE-EQ'),
+    ('500325', 'BSE', 'RELIANCE', 'RELIANCE'),
+    ('43854', 'NFO', 'NIFTY28MAR2422000CE', 'NIFTY28MAR2422000CE'),
+    ('234230', 'MCX', 'CRUDEOIL19APR24FUT', 'CRUDEOIL19APR24FUT'),
+]
+for token, exchange, symbol, brsymbol in UNIVERSE:
+    token_cache[f"{token}-{exchange}"] = symbol
+    token_cache[f"oa{brsymbol}-{exchange}"] = symbol
+
+def check(name, passed):
+    print(f"  ✅ {name}" if passed else f"  ❌ {name}")
+    assert passed, name
+
+def order_rows():
+    rows = []
+    for i, (token, exchange, _, brsymbol) in enumerate(UNIVERSE * 2):
+        rows.append({
+            'orderid': str(240000000 + i), 'symboltoken': token, 'tradingsymbol': brsymbol,
+            'exchange': exchange, 'producttype': ['DELIVERY', 'INTRADAY', 'CARRYFORWARD'][i % 3],
+            'transactiontype': ['BUY', 'SELL'][i % 2], 'ordertype': 'LIMIT', 'quantity': str(10 * (i + 1)),
+            'price': 100.5 + i, 'triggerprice': 0.0,
+            'status': ['complete', 'open', 'rejected', 'cancelled'][i % 4],
+            'updatetime': '15-Jan-2024 10:30:00', 'fillprice': 100.0 + i, 'tradevalue': 1000.0 * (i + 1),
+            'filltime': '10:30:00', 'avgnetprice': 99.5 + i
+        })
+    return rows
+
+# Products of order_rows() after mapping: DELIVERY -> CNC on NSE/BSE only, INTRADAY -> MIS,
+# CARRYFORWARD -> NRML on derivative exchanges only
+PRODUCTS = ['CNC', 'MIS', 'NRML', 'DELIVERY', 'MIS', 'CARRYFORWARD', 'DELIVERY', 'MIS']
+SYMBOLS = [symbol for _, _, symbol, _ in UNIVERSE] * 2
+
+def test_order_book():
+    print("Testing build_order_book...")
+    response = {'status': True, 'message': 'SUCCESS', 'data': order_rows()}
+    original = copy.deepcopy(response)
+    orders, stats = build_order_book(response)
+    check("Symbols resolved from tokens", [order['symbol'] for order in orders] == SYMBOLS)
+    check("Product types mapped", [order['product'] for order in orders] == PRODUCTS)
+    check("Row fields", orders[1] == {
+        'symbol': 'RELIANCE', 'exchange': 'BSE', 'action': 'SELL', 'quantity': '20', 'price': 101.5,
+        'trigger_price': 0.0, 'pricetype': 'LIMIT', 'product': 'MIS', 'orderid': '240000001',
+        'order_status': 'open', 'timestamp': '15-Jan-2024 10:30:00'})
+    check("Statistics counted", stats == {
+        'total_buy_orders': 4, 'total_sell_orders': 4, 'total_completed_orders': 2,
+        'total_open_orders': 2, 'total_rejected_orders': 2})
+    check("Broker response left untouched", response == original)
+    unknown = dict(order_rows()[1], symboltoken='999999')
+    orders, _ = build_order_book({'status': True, 'data': [unknown]})
+    check("Unknown token keeps the broker symbol and product",
+          (orders[0]['symbol'], orders[0]['product']) == ('RELIANCE', 'INTRADAY'))
+    check("Empty book", build_order_book({'status': True, 'data': None}) == ([], {
+        'total_buy_orders': 0, 'total_sell_orders': 0, 'total_completed_orders': 0,
+        'total_open_orders': 0, 'total_rejected_orders': 0}))
+
+def test_trade_book():
+    print("\nTesting build_trade_book...")
+    trades = build_trade_book({'status': True, 'data': order_rows()})
+    check("Symbols resolved from broker symbols", [trade['symbol'] for trade in trades] == SYMBOLS)
+    check("Product types mapped", [trade['product'] for trade in trades] == PRODUCTS)
+    check("Row fields", trades[0] == {
+        'symbol': 'RELIANCE', 'exchange': 'NSE', 'product': 'CNC', 'action': 'BUY', 'quantity': '10',
+        'average_price': 100.0, 'trade_value': 1000.0, 'orderid': '240000000', 'timestamp': '10:30:00'})
+    check("Error response gives no rows", build_trade_book({'status': 'error', 'message': 'Invalid token'}) == [])
+
+def test_positions():
+    print("\nTesting build_positions...")
+    positions = build_positions({'status': True, 'data': order_rows()})
+    check("Product types mapped", [position['product'] for position in positions] == PRODUCTS)
+    check("NFO carry forward shown as NRML", positions[2] == {
+        'symbol': 'NIFTY28MAR2422000CE', 'exchange': 'NFO', 'product': 'NRML', 'quantity': '30',
+        'average_price': 101.5})
+
+def test_holdings():
+    print("\nTesting build_holdings...")
+    holdings = [{'tradingsymbol': brsymbol, 'exchange': exchange, 'quantity': 5 * (i + 1), 'product': 'DELIVERY',
+                 'profitandloss': 12.5 * i - 20, 'pnlpercentage': 1.5 * i - 2}
+                for i, (_, exchange, _, brsymbol) in enumerate(UNIVERSE[:2])]
+    totals = {'totalholdingvalue': 25000.0, 'totalinvvalue': 24000.0, 'totalprofitandloss': 1000.0,
+              'totalpnlpercentage': 4.17}
+    zeros = {'totalholdingvalue': 0, 'totalinvvalue': 0, 'totalprofitandloss': 0, 'totalpnlpercentage': 0}
+    rows, stats = build_holdings({'status': True, 'data': {'holdings': holdings, 'totalholding': totals}})
+    check("Rows mapped, DELIVERY shown as CNC", rows == [
+        {'symbol': 'RELIANCE', 'exchange': 'NSE', 'quantity': 5, 'product': 'CNC', 'pnl': -20.0, 'pnlpercent': -2.0},
+        {'symbol': 'RELIANCE', 'exchange': 'BSE', 'quantity': 10, 'product': 'CNC', 'pnl': -7.5, 'pnlpercent': -0.5}])
+    check("Totals from totalholding", stats == totals)
+    check("Totals kept when holdings is null",
+          build_holdings({'status': True, 'data': {'holdings': None, 'totalholding': totals}}) == ([], totals))
+    check("No holdings key gives no totals",
+          build_holdings({'status': True, 'data': {'totalholding': totals}}) == ([], zeros))
+    check("No data", build_holdings({'status': True, 'data': None}) == ([], zeros))
+
+if __name__ == "__main__":
+    print("🧪 Testing Order Data Builders")
+    print("=" * 50)
+
+    test_order_book()
+    test_trade_book()
+    test_positions()
+    test_holdings()
+
+    print("\n" + "=" * 50)
+    print("✅ Order mapping tests completed!")
+    print("\nTo run these tests:")
+    print("Run: python tests/test_order_mapping.py")
@@ -0,0 +1,122 @@
+# tests/test_rate_limiter.py
+
+"""
+Simple test script for the GCRA rate limiter backends
+This can be run manually (no Flask app or database needed) and also under pytest
+"""
+
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.rate_limiter import MemoryRateLimitBackend, SocketRateLimitBackend
+
+def check(name, passed):
+    print(f"  ✅ {name}" if passed else f"  ❌ {name}")
+    assert passed, name
+
+def socket_path():
+    """Each test gets its own directory, so it elects its own host"""
+    return os.path.join(tempfile.mkdtemp(prefix='tm-rate-limit-'), 'rate-limit.sock')
+
+def test_gcra_limit():
+    """5 requests per 60 s: five pass, the sixth waits one emission interval (12 s)"""
+    print("Testing GCRA limit...")
+    backend = MemoryRateLimitBackend()
+
+    results = [backend.acquire('login:1.2.3.4', 5, 60) for _ in range(6)]
+    check("First 5 requests allowed", results[:5] == [True] * 5)
+    check("6th request limited", results[5] is False)
+    check("Key reported exhausted", backend.is_exhausted('login:1.2.3.4', 5, 60))
+    check("Retry after one interval", 11.5 < backend.retry_after('login:1.2.3.4', 5, 60) <= 12)
+    check("Other keys unaffected", backend.acquire('login:5.6.7.8', 5, 60))
+
+    backend.reset('login:1.2.3.4')
+    check("Reset key allowed again", backend.acquire('login:1.2.3.4', 5, 60))
+    check("Fresh key has no retry delay", backend.retry_after('login:9.9.9.9', 5, 60) == 0)
+
+def test_gcra_consume_cap():
+    """consume() never pushes a key's debt past one window"""
+    print("\nTesting consume cap...")
+    backend = MemoryRateLimitBackend()
+
+    for _ in range(100):
+        backend.consume('failed:user', 5, 60)
+    check("Key exhausted after repeated failures", backend.is_exhausted('failed:user', 5, 60))
+    check("Lockout capped at one interval", backend.retry_after('failed:user', 5, 60) <= 12)
+
+def test_idle_sweep():
+    """Keys idle past idle_ttl are dropped on the next sweep"""
+    print("\nTesting idle key sweep...")
+    backend = MemoryRateLimitBackend(idle_ttl=0, sweep_interval=0)
+
+    backend.acquire('burst', 1000, 0.001)
+    backend.tats['burst'] -= 1  # idle for a second
+    backend.acquire('other', 5, 60)
+    check("Idle key swept", 'burst' not in backend.tats)
+    check("Active key kept", 'other' in backend.tats)
+
+def test_socket_backend_shared():
+    """Two backends on one socket share the limit through the hosting process"""
+    print("\nTesting shared socket backend...")
+    path = socket_path()
+    first = SocketRateLimitBackend(path=path)
+    second = SocketRateLimitBackend(path=path)
+
+    results = [first.acquire('api:key', 3, 60), second.acquire('api:key', 3, 60),
+               first.acquire('api:key', 3, 60), second.acquire('api:key', 3, 60)]
+    check("Limit applied across both backends", results == [True, True, True, False])
+    check("Only one backend hosts the server", (first._server is None) != (second._server is None))
+    second.reset('api:key')
+    check("Reset visible to the other backend", first.acquire('api:key', 3, 60))
+    check("Socket restricted to the owner", stat.S_IMODE(os.stat(path).st_mode) == 0o600)
+
+def test_socket_backend_takeover():
+    """A socket file left by a dead host is replaced by the next host"""
+    print("\nTesting takeover of a stale socket...")
+    path = socket_path()
+    with socket.socket(socket.AF_UNIX) as stale:
+        stale.bind(path)  # bound but never listening, like the file of a host that died
+    backend = SocketRateLimitBackend(path=path)
+    check("Stale socket replaced", backend.acquire('api:key', 1, 60) is True and backend._server is not None)
+    check("Limit served by the new host", backend.acquire('api:key', 1, 60) is False)
+
+def test_socket_backend_rejects_unknown_ops():
+    """The server only dispatches reset and SocketRateLimitBackend.OPS"""
+    print("\nTesting unknown op rejection...")
+    path = socket_path()
+    backend = SocketRateLimitBackend(path=path)
+    backend.acquire('api:key', 3, 60)
+
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(path)
+        conn = sock.makefile('rwb')
+        for op in ('__init__', '_sweep', 'acquire'):
+            conn.write(json.dumps({'op': op, 'key': 'api:key', 'limit': 3, 'window': 60}).encode() + b'\n')
+            conn.flush()
+            reply = json.loads(conn.readline())
+            if op == 'acquire':
+                check("Known op served", reply.get('result') is True)
+            else:
+                check(f"{op} rejected", 'error' in reply)
+
+if __name__ == "__main__":
+    print("🧪 Testing Rate Limiter Backends")
+    print("=" * 50)
+
+    test_gcra_limit()
+    test_gcra_consume_cap()
+    test_idle_sweep()
+    test_socket_backend_shared()
+    test_socket_backend_takeover()
+    test_socket_backend_rejects_unknown_ops()
+
+    print("\n" + "=" * 50)
+    print("✅ Rate limiter tests completed!")
+    print("\nTo run these tests:")
+    print("Run: python tests/test_rate_limiter.py")
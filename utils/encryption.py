@@ -5,29 +5,99 @@ from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.backends import default_backend
 import base64
+import functools
+import hashlib
 import os
+import tempfile
+
+KDF_SALT = b'tradingbridge_salt_2024'  # In production, use a secure random salt
+KDF_ITERATIONS = 100000
+
+# Credential fields that are stored encrypted
+SENSITIVE_FIELDS = frozenset(['client_id', 'api_key', 'pin', 'password', 'secret'])
+
+# Directory for the cross-process derived key cache (off unless set). Workers and
+# short-lived processes (serverless instances, admin scripts) then read the key
+# instead of repeating the 100k-iteration derivation. The cached key is as
+# sensitive as SECRET_KEY: the directory is created 0700 and files 0600.
+KEY_CACHE_DIR = os.getenv('ENCRYPTION_KEY_CACHE_DIR')
+
+def _key_cache_path(secret: str, cache_dir: str) -> str:
+    fingerprint = hashlib.sha256(KDF_SALT + secret.encode() + str(KDF_ITERATIONS).encode()).hexdigest()[:32]
+    return os.path.join(cache_dir, f"fernet-{fingerprint}.key")
+
+def _read_cached_key(path):
+    try:
+        with open(path, 'rb') as f:
+            key = f.read().strip()
+        Fernet(key)  # Reject truncated or corrupt cache files
+        return key
+    except (OSError, ValueError):
+        return None
+
+def _write_cached_key(path, key):
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.fernet-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)  # Atomic, so concurrent workers never read a partial key
+    except OSError as e:
+        print(f"WARNING: could not cache derived encryption key: {str(e)}")
+
+@functools.lru_cache(maxsize=8)
+def derive_key(secret: str, cache_dir: str = None) -> bytes:
+    """
+    Derive the Fernet key from a secret (100k PBKDF2 iterations, so memoised per
+    process and optionally cached on disk across processes)
+
+    Args:
+        secret (str): Application secret
+        cache_dir (str): Cross-process key cache directory, defaults to ENCRYPTION_KEY_CACHE_DIR
+
+    Returns:
+        bytes: urlsafe base64-encoded 32-byte key
+    """
+    cache_dir = cache_dir or KEY_CACHE_DIR
+    path = _key_cache_path(secret, cache_dir) if cache_dir else None
+    if path:
+        key = _read_cached_key(path)
+        if key:
+            return key
+
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=KDF_SALT,
+        iterations=KDF_ITERATIONS,
+        backend=default_backend()
+    )
+    key = base64.urlsafe_b64encode(kdf.derive(secret.encode()))
+    if path:
+        _write_cached_key(path, key)
+    return key
 
 class EncryptionService:
     """Service for encrypting and decrypting sensitive data"""
     
     def __init__(self):
-        # Get encryption key from environment variable or generate one
-        self.encryption_key = os.getenv('ENCRYPTION_KEY')
-        if not self.encryption_key:
+        # Key derivation is deferred to first use so importing this module stays cheap
+        self._encryption_key = os.getenv('ENCRYPTION_KEY')
+        self._cipher = None
+
+    @property
+    def encryption_key(self):
+        if not self._encryption_key:
             # Generate a key from a secret (in production, use a secure secret)
-            secret = os.getenv('SECRET_KEY', 'default-secret-key-change-in-production')
-            salt = b'tradingbridge_salt_2024'  # In production, use a secure random salt
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=100000,
-                backend=default_backend()
-            )
-            key = base64.urlsafe_b64encode(kdf.derive(secret.encode()))
-            self.encryption_key = key
-        
-        self.cipher = Fernet(self.encryption_key)
+            self._encryption_key = derive_key(os.getenv('SECRET_KEY', 'default-secret-key-change-in-production'))
+        return self._encryption_key
+
+    @property
+    def cipher(self):
+        if self._cipher is None:
+            self._cipher = Fernet(self.encryption_key)
+        return self._cipher
     
     def encrypt(self, data: str) -> str:
         """
@@ -80,10 +150,8 @@ class EncryptionService:
             dict: Dictionary with encrypted credentials
         """
         encrypted = {}
-        sensitive_fields = ['client_id', 'api_key', 'pin', 'password', 'secret']
-        
         for key, value in credentials.items():
-            if key in sensitive_fields and value:
+            if key in SENSITIVE_FIELDS and value:
                 encrypted[key] = self.encrypt(str(value))
             else:
                 encrypted[key] = value
@@ -101,10 +169,8 @@ class EncryptionService:
             dict: Dictionary with decrypted credentials
         """
         decrypted = {}
-        sensitive_fields = ['client_id', 'api_key', 'pin', 'password', 'secret']
-        
         for key, value in encrypted_credentials.items():
-            if key in sensitive_fields and value:
+            if key in SENSITIVE_FIELDS and value:
                 try:
                     decrypted[key] = self.decrypt(value)
                 except:
@@ -118,3 +184,7 @@ class EncryptionService:
 
 # Create a singleton instance
 encryption_service = EncryptionService()
+
+if __name__ == '__main__':
+    # Print the derived key so it can be precomputed once and set as ENCRYPTION_KEY
+    print(derive_key(os.getenv('SECRET_KEY', 'default-secret-key-change-in-production')).decode())
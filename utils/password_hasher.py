@@ -0,0 +1,191 @@
+# utils/password_hasher.py
+
+"""
+bcrypt hashing off the request threads.
+
+bcrypt is deliberately CPU-bound (~250 ms at cost 12). Run inline, a burst of
+logins at market open occupies every web worker thread and the cores they
+run on, and order webhooks queue behind them. The hasher runs bcrypt in a
+small dedicated process pool instead:
+
+- at most PASSWORD_HASH_CONCURRENCY hashes run or wait in the pool at once;
+- a request that cannot get a slot within PASSWORD_HASH_QUEUE_TIMEOUT
+  seconds fails fast with PasswordHasherBusy instead of piling up;
+- hashes made with a cost other than PASSWORD_HASH_ROUNDS are reported by
+  verify_and_update so callers can store a rehash after a successful login;
+- queue wait and hashing latency are kept for /metrics/sessions.
+
+The pool is created on first use in the process that hashes, so each web
+worker gets its own after the server has forked it; a pool inherited across
+a fork is discarded. Its workers are started with spawn rather than fork,
+so they never inherit the app's threads, locks or database connections
+(a forkserver would be shared state that a later fork cannot reuse).
+
+Where worker processes cannot be started (some serverless sandboxes) the
+pool falls back to threads; bcrypt releases the GIL while hashing.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+PASSWORD_HASH_ROUNDS = int(os.getenv('PASSWORD_HASH_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(2, os.cpu_count() or 1))))
+PASSWORD_HASH_CONCURRENCY = int(os.getenv('PASSWORD_HASH_CONCURRENCY', str(PASSWORD_HASH_WORKERS * 4)))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', '5'))
+PASSWORD_HASH_POOL = os.getenv('PASSWORD_HASH_POOL', 'process')  # process | thread
+
+
+class PasswordHasherBusy(Exception):
+    """No hashing slot became free within the queue timeout"""
+
+
+def _to_bytes(value):
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verify(password, password_hash):
+    return bcrypt.checkpw(password, password_hash)
+
+
+def hash_rounds(password_hash):
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12), or None if it is not one"""
+    try:
+        return int(_to_bytes(password_hash).split(b'$')[2])
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+class PasswordHasher:
+    """bcrypt hash/verify on a bounded worker pool"""
+
+    def __init__(self, rounds=PASSWORD_HASH_ROUNDS, workers=PASSWORD_HASH_WORKERS,
+                 max_concurrency=PASSWORD_HASH_CONCURRENCY, queue_timeout=PASSWORD_HASH_QUEUE_TIMEOUT,
+                 pool=PASSWORD_HASH_POOL):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.pool_kind = pool
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = None
+        self._pid = None  # process that created _executor
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)  # (queue wait, total) seconds
+        self.metrics = {"hashed": 0, "verified": 0, "rejected": 0, "busy": 0, "rehash_needed": 0, "pool_restarts": 0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Created before the server forked this worker: the pool's processes and
+                # threads belong to the parent, and slots held there are never released here
+                self._executor = None
+                self._slots = threading.BoundedSemaphore(self.max_concurrency)
+                self._pid = os.getpid()
+            if self._executor is None:
+                if self.pool_kind == 'process':
+                    try:
+                        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                    except (OSError, NotImplementedError, ImportError) as e:
+                        print(f"WARNING: password hashing process pool unavailable ({str(e)}), using threads")
+                        self.pool_kind = 'thread'
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    def _submit(self, fn, *args):
+        try:
+            return self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); replace the pool once
+            with self._lock:
+                self._executor = None
+                self.metrics["pool_restarts"] += 1
+            return self._get_executor().submit(fn, *args)
+
+    def _run(self, fn, *args):
+        started = time.perf_counter()
+        self._get_executor()  # replaces a pool and slots inherited across a fork
+        slots = self._slots
+        if not slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.metrics["busy"] += 1
+            raise PasswordHasherBusy("Too many password checks in progress")
+        try:
+            waited = time.perf_counter() - started
+            return self._submit(fn, *args).result()
+        finally:
+            slots.release()
+            self._latencies.append((waited, time.perf_counter() - started))
+
+    def hash(self, password):
+        """
+        Hash a password with the configured cost
+
+        Args:
+            password (str): Plain text password
+
+        Returns:
+            str: bcrypt hash
+
+        Raises:
+            PasswordHasherBusy: No slot within the queue timeout
+        """
+        password_hash = self._run(_hash, _to_bytes(password), self.rounds)
+        with self._lock:
+            self.metrics["hashed"] += 1
+        return password_hash
+
+    def verify(self, password, password_hash):
+        """Check a password against a bcrypt hash (raises PasswordHasherBusy like hash)"""
+        valid, _ = self.verify_and_update(password, password_hash, rehash=False)
+        return valid
+
+    def verify_and_update(self, password, password_hash, rehash=True):
+        """
+        Check a password and, when it matches a hash of a different cost, produce a
+        replacement hash at the configured cost
+
+        Returns:
+            tuple: (valid, new_hash or None)
+        """
+        valid = self._run(_verify, _to_bytes(password), _to_bytes(password_hash))
+        with self._lock:
+            self.metrics["verified" if valid else "rejected"] += 1
+        if not valid or hash_rounds(password_hash) == self.rounds:
+            return valid, None
+        with self._lock:
+            self.metrics["rehash_needed"] += 1
+        return True, (self.hash(password) if rehash else None)
+
+    def get_metrics(self):
+        latencies = list(self._latencies)
+
+        def percentile(values, pct):
+            if not values:
+                return None
+            values = sorted(values)
+            return round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 1)
+
+        waits = [wait for wait, _ in latencies]
+        totals = [total for _, total in latencies]
+        with self._lock:
+            return dict(self.metrics, pool=self.pool_kind, workers=self.workers, rounds=self.rounds,
+                        max_concurrency=self.max_concurrency, queue_timeout_seconds=self.queue_timeout,
+                        wait_ms_p50=percentile(waits, 50), wait_ms_p95=percentile(waits, 95),
+                        total_ms_p50=percentile(totals, 50), total_ms_p95=percentile(totals, 95),
+                        total_ms_p99=percentile(totals, 99))
+
+
+# Global hasher used by database.auth_db
+password_hasher = PasswordHasher()
@@ -0,0 +1,77 @@
+# utils/process_lock.py
+
+"""
+Non-blocking lock shared by the worker processes on one host.
+
+Background jobs (contract maintenance, token refresh) start in every worker
+process, but each should run in only one. ProcessLock takes an exclusive
+flock on a file in PROCESS_LOCK_DIR (the system temp directory by default,
+never the working tree). The kernel releases it when the holder exits, so a
+worker that keeps it held acts as the elected runner, and another worker
+takes over on its next attempt after that one dies.
+
+The file name includes a hash of DATABASE_URL, so separate deployments on
+one host do not block each other. Where fcntl is unavailable (Windows
+development), every acquire succeeds.
+"""
+
+import os
+import tempfile
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+PROCESS_LOCK_DIR = os.getenv('PROCESS_LOCK_DIR', tempfile.gettempdir())
+
+
+class ProcessLock:
+    """Exclusive, non-blocking, cross-process lock identified by name"""
+
+    def __init__(self, name, directory=PROCESS_LOCK_DIR):
+        scope = zlib.crc32((os.getenv('DATABASE_URL') or '').encode('utf-8'))
+        self.path = os.path.join(directory, f"tradingmaven-{name}-{scope:08x}.lock")
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        """
+        Take the lock if no other process holds it
+
+        Returns:
+            bool: Whether this process holds the lock (also True if it already did)
+        """
+        with self._lock:
+            if self._file is not None:
+                return True
+            if fcntl is None:
+                self._file = True
+                return True
+            try:
+                lock_file = open(self.path, 'a+b')
+            except OSError as e:
+                print(f"WARNING: cannot open lock file {self.path}: {str(e)}")
+                return False
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._file = lock_file
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._file is None:
+                return
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+                self._file.close()
+            self._file = None
@@ -1,22 +1,254 @@
 # utils/rate_limiter.py
 
 """
-Simple rate limiting utility for authentication endpoints
+Rate limiting utility for authentication endpoints.
+
+Limits are enforced with GCRA on a pluggable backend: an in-process store by
+default, or a store shared by all workers on the host over a Unix socket
+that only the app's own user can connect to (RATE_LIMIT_BACKEND=socket).
 """
 
+import json
+import os
+import socket
+import socketserver
+import threading
 import time
-from collections import defaultdict, deque
+import zlib
 from functools import wraps
 from flask import request, jsonify
 
+from utils.process_lock import PROCESS_LOCK_DIR, ProcessLock
+
+# Next to the process locks, scoped by DATABASE_URL like them
+RATE_LIMIT_SOCKET_PATH = os.getenv('RATE_LIMIT_SOCKET_PATH') or os.path.join(
+    PROCESS_LOCK_DIR, f"tradingmaven-rate-limit-{zlib.crc32((os.getenv('DATABASE_URL') or '').encode('utf-8')):08x}.sock")
+
+class MemoryRateLimitBackend:
+    """
+    In-process GCRA (generic cell rate algorithm) store.
+
+    Each key holds a single float - its theoretical arrival time (TAT) - so
+    memory is constant per key and every check is O(1). A key whose TAT is in
+    the past is indistinguishable from a fresh key, so idle keys are swept once
+    they have been idle for `idle_ttl` seconds.
+    """
+    
+    def __init__(self, idle_ttl=60, sweep_interval=60):
+        self.tats = {}
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.time()
+        self._lock = threading.Lock()
+    
+    def _sweep(self, now):
+        """Evict keys that have been idle past their TAT plus idle_ttl"""
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        cutoff = now - self.idle_ttl
+        for key in [key for key, tat in self.tats.items() if tat < cutoff]:
+            del self.tats[key]
+        self._last_sweep = now
+    
+    def acquire(self, key, limit, window):
+        """
+        Consume one request for `key` if the limit allows it
+        
+        Args:
+            key (str): Identifier being limited
+            limit (int): Maximum requests per window
+            window (float): Window length in seconds
+            
+        Returns:
+            bool: True if the request is allowed, False if rate limited
+        """
+        interval = window / limit
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            tat = max(self.tats.get(key, now), now)
+            if tat + interval - now > window:
+                return False
+            self.tats[key] = tat + interval
+            return True
+    
+    def is_exhausted(self, key, limit, window):
+        """Check whether the next request for `key` would be limited, without consuming"""
+        interval = window / limit
+        now = time.time()
+        with self._lock:
+            tat = max(self.tats.get(key, now), now)
+            return tat + interval - now > window
+    
+    def consume(self, key, limit, window):
+        """Record one request for `key` unconditionally (e.g. a failed login)"""
+        interval = window / limit
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            tat = max(self.tats.get(key, now), now)
+            # Cap the debt at one window so a flood of failures cannot lock a key out forever
+            self.tats[key] = min(tat + interval, now + window)
+    
+    def reset(self, key):
+        """Forget all state for `key`"""
+        with self._lock:
+            self.tats.pop(key, None)
+    
+    def retry_after(self, key, limit, window):
+        """Seconds until the next request for `key` would be allowed"""
+        interval = window / limit
+        now = time.time()
+        with self._lock:
+            tat = self.tats.get(key)
+        if tat is None:
+            return 0
+        return max(0, tat + interval - window - now)
+    
+    def __len__(self):
+        return len(self.tats)
+
+class _RateLimitRequestHandler(socketserver.StreamRequestHandler):
+    """Serves newline-delimited JSON commands against the shared memory backend"""
+    
+    def handle(self):
+        backend = self.server.backend
+        for line in self.rfile:
+            try:
+                command = json.loads(line)
+                op = command['op']
+                key = command['key']
+                if op == 'reset':
+                    result = backend.reset(key)
+                elif op in SocketRateLimitBackend.OPS:
+                    result = getattr(backend, op)(key, command['limit'], command['window'])
+                else:
+                    raise ValueError(f"Unknown rate limit op: {op}")
+                self.wfile.write(json.dumps({'result': result}).encode() + b'\n')
+            except Exception as e:
+                self.wfile.write(json.dumps({'error': str(e)}).encode() + b'\n')
+
+# Unix only; elsewhere create_backend falls back to process-local limits
+class _RateLimitServer(getattr(socketserver, 'ThreadingUnixStreamServer', object)):
+    daemon_threads = True
+
+class SocketRateLimitBackend:
+    """
+    Rate limit backend shared by every worker process on the host.
+
+    The worker holding the socket's ProcessLock hosts a MemoryRateLimitBackend
+    on a daemon thread, listening on a Unix socket with mode 0600; every other
+    worker connects to it, so limits hold across gunicorn/socketio workers,
+    while other local users cannot connect to reset or exhaust them. If the
+    host process goes away, the kernel releases its lock and the next worker
+    to notice takes over, replacing the stale socket file. When no server can
+    be reached the backend falls back to a local in-memory store (fail open per
+    process rather than failing the request).
+    """
+    
+    OPS = ('acquire', 'is_exhausted', 'consume', 'retry_after')
+    
+    def __init__(self, path=RATE_LIMIT_SOCKET_PATH, timeout=0.5):
+        self.path = path
+        self.timeout = timeout
+        self.fallback = MemoryRateLimitBackend()
+        self._server = None
+        self._host_lock = ProcessLock('rate-limit', directory=os.path.dirname(os.path.abspath(path)))
+        self._local = threading.local()
+        self._server_lock = threading.Lock()
+    
+    def _start_server(self):
+        """Try to become the host process for the shared limiter"""
+        with self._server_lock:
+            if self._server is not None or not self._host_lock.acquire():
+                return  # Already hosting, or another worker is
+            try:
+                # Left behind by a host that died; only the lock holder may remove it
+                if os.path.exists(self.path):
+                    os.unlink(self.path)
+                server = _RateLimitServer(self.path, _RateLimitRequestHandler)
+                os.chmod(self.path, 0o600)
+            except OSError as e:
+                print(f"WARNING: shared rate limiter cannot listen on {self.path}: {str(e)}")
+                self._host_lock.release()
+                return
+            server.backend = MemoryRateLimitBackend()
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._server = server
+            print(f"Shared rate limiter listening on {self.path}")
+    
+    def _open_socket(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                sock = self._open_socket()
+            except OSError:
+                self._start_server()
+                sock = self._open_socket()
+            conn = sock.makefile('rwb')
+            self._local.conn = conn
+        return conn
+    
+    def _call(self, op, key, limit=None, window=None):
+        command = json.dumps({'op': op, 'key': key, 'limit': limit, 'window': window}).encode() + b'\n'
+        for _ in range(2):
+            try:
+                conn = self._connection()
+                conn.write(command)
+                conn.flush()
+                reply = json.loads(conn.readline())
+                if 'error' in reply:
+                    raise RuntimeError(reply['error'])
+                return reply['result']
+            except (OSError, ValueError, RuntimeError):
+                self._local.conn = None
+        print("WARNING: shared rate limiter unreachable, using process-local limits")
+        if op == 'reset':
+            return self.fallback.reset(key)
+        return getattr(self.fallback, op)(key, limit, window)
+    
+    def acquire(self, key, limit, window):
+        return self._call('acquire', key, limit, window)
+    
+    def is_exhausted(self, key, limit, window):
+        return self._call('is_exhausted', key, limit, window)
+    
+    def consume(self, key, limit, window):
+        return self._call('consume', key, limit, window)
+    
+    def reset(self, key):
+        return self._call('reset', key)
+    
+    def retry_after(self, key, limit, window):
+        return self._call('retry_after', key, limit, window)
+
+def create_backend():
+    """
+    Build the rate limit backend selected by RATE_LIMIT_BACKEND
+    ('memory' (default) or 'socket'; socket listens on RATE_LIMIT_SOCKET_PATH)
+    """
+    backend_type = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()
+    if backend_type == 'socket':
+        if hasattr(socket, 'AF_UNIX'):
+            return SocketRateLimitBackend()
+        print("WARNING: Unix sockets unavailable, using process-local rate limits")
+    return MemoryRateLimitBackend()
+
 class RateLimiter:
-    """Simple in-memory rate limiter"""
+    """Rate limiter for authentication and general endpoints on a pluggable backend"""
     
-    def __init__(self):
-        # Store request timestamps for each IP
-        self.requests = defaultdict(deque)
-        # Store failed login attempts for each IP
-        self.failed_attempts = defaultdict(deque)
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryRateLimitBackend()
     
     def is_rate_limited(self, key, max_requests, window_seconds):
         """
@@ -30,20 +262,7 @@ class RateLimiter:
         Returns:
             bool: True if rate limited, False otherwise
         """
-        now = time.time()
-        window_start = now - window_seconds
-        
-        # Clean old requests
-        while self.requests[key] and self.requests[key][0] < window_start:
-            self.requests[key].popleft()
-        
-        # Check if limit exceeded
-        if len(self.requests[key]) >= max_requests:
-            return True
-        
-        # Add current request
-        self.requests[key].append(now)
-        return False
+        return not self.backend.acquire(f"req:{key}:{max_requests}/{window_seconds}", max_requests, window_seconds)
     
     def is_login_rate_limited(self, key, max_attempts=5, window_seconds=300):
         """
@@ -57,38 +276,22 @@ class RateLimiter:
         Returns:
             bool: True if rate limited, False otherwise
         """
-        now = time.time()
-        window_start = now - window_seconds
-        
-        # Clean old failed attempts
-        while self.failed_attempts[key] and self.failed_attempts[key][0] < window_start:
-            self.failed_attempts[key].popleft()
-        
-        # Check if limit exceeded
-        return len(self.failed_attempts[key]) >= max_attempts
+        return self.backend.is_exhausted(f"login:{key}", max_attempts, window_seconds)
     
-    def record_failed_login(self, key):
+    def record_failed_login(self, key, max_attempts=5, window_seconds=300):
         """Record a failed login attempt"""
-        now = time.time()
-        self.failed_attempts[key].append(now)
+        self.backend.consume(f"login:{key}", max_attempts, window_seconds)
     
     def clear_failed_attempts(self, key):
         """Clear failed attempts for a key (on successful login)"""
-        if key in self.failed_attempts:
-            self.failed_attempts[key].clear()
+        self.backend.reset(f"login:{key}")
     
-    def get_remaining_time(self, key, window_seconds):
+    def get_remaining_time(self, key, window_seconds, max_attempts=5):
         """Get remaining time until rate limit resets"""
-        if not self.failed_attempts[key]:
-            return 0
-        
-        oldest_attempt = self.failed_attempts[key][0]
-        elapsed = time.time() - oldest_attempt
-        remaining = max(0, window_seconds - elapsed)
-        return int(remaining)
+        return int(self.backend.retry_after(f"login:{key}", max_attempts, window_seconds))
 
 # Global rate limiter instance
-rate_limiter = RateLimiter()
+rate_limiter = RateLimiter(create_backend())
 
 def login_rate_limit(max_attempts=5, window_seconds=300):
     """
@@ -110,7 +313,7 @@ def login_rate_limit(max_attempts=5, window_seconds=300):
             
             # Check if rate limited
             if rate_limiter.is_login_rate_limited(client_ip, max_attempts, window_seconds):
-                remaining_time = rate_limiter.get_remaining_time(client_ip, window_seconds)
+                remaining_time = rate_limiter.get_remaining_time(client_ip, window_seconds, max_attempts)
                 return jsonify({
                     'status': 'error',
                     'message': f'Too many failed login attempts. Please try again in {remaining_time} seconds.',
@@ -123,7 +326,7 @@ def login_rate_limit(max_attempts=5, window_seconds=300):
             
             # If it's a failed login, record it
             if hasattr(response, 'status_code') and response.status_code == 401:
-                rate_limiter.record_failed_login(client_ip)
+                rate_limiter.record_failed_login(client_ip, max_attempts, window_seconds)
             elif hasattr(response, 'status_code') and response.status_code == 200:
                 # Successful login, clear failed attempts
                 rate_limiter.clear_failed_attempts(client_ip)
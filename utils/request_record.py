@@ -0,0 +1,53 @@
+# utils/request_record.py
+
+"""
+Lightweight, read-only request record used for order logging
+"""
+
+import json
+from collections.abc import Mapping
+
+# Fields that must never reach the order log
+REDACTED_FIELDS = frozenset(['apikey'])
+
+class RequestRecord(Mapping):
+    """
+    Read-only view over an incoming API payload with sensitive fields hidden.
+
+    The view shares the underlying dict instead of copying it, and the JSON
+    form is produced once and reused by every consumer (log writer, debug output).
+    """
+
+    __slots__ = ('_data', '_redacted', '_encoded')
+
+    def __init__(self, data, redacted=REDACTED_FIELDS):
+        self._data = data if data is not None else {}
+        self._redacted = redacted
+        self._encoded = None
+
+    def __getitem__(self, key):
+        if key in self._redacted:
+            raise KeyError(key)
+        return self._data[key]
+
+    def __iter__(self):
+        redacted = self._redacted
+        return (key for key in self._data if key not in redacted)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"RequestRecord({self.to_json()})"
+
+    def to_json(self):
+        """
+        Serialise the redacted payload, caching the result
+
+        Returns:
+            str: JSON document without the redacted fields
+        """
+        if self._encoded is None:
+            redacted = self._redacted
+            self._encoded = json.dumps({key: value for key, value in self._data.items() if key not in redacted})
+        return self._encoded
@@ -0,0 +1,98 @@
+# utils/shared_generation.py
+
+"""
+Invalidation counters shared by the worker processes on one host.
+
+Per-process caches (credentials, broker tokens, broker listings) can only
+be invalidated directly in the worker that made the change. SharedGenerations
+maps a small file of 64-bit counters into every worker, as the scrip
+snapshot does with its .gen file: a writer bumps the counter of the key it
+changed, and a reader stores the counter's value next to each cached entry
+and treats the entry as stale once the two differ. Checking an entry is one
+read from shared memory, with no DB access.
+
+Keys are hashed onto SHARED_GENERATION_SLOTS counters, so two keys can
+share a counter. A collision only costs an extra reload. The file lives in
+PROCESS_LOCK_DIR and its name includes a hash of DATABASE_URL, like the
+process locks. Other hosts do not see it; the TTL of each cache bounds how
+long they keep a changed entry. Where the file cannot be mapped, the
+counters are kept per process.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import zlib
+from array import array
+
+from utils.process_lock import PROCESS_LOCK_DIR
+
+try:
+    import fcntl  # Serialises increments across processes; not available on Windows
+except ImportError:
+    fcntl = None
+
+SHARED_GENERATION_SLOTS = int(os.getenv('SHARED_GENERATION_SLOTS', '4096'))
+
+COUNTER = struct.Struct('<Q')
+
+
+class SharedGenerations:
+    """Per-key generation counters in a file mapped by every worker on the host"""
+
+    def __init__(self, name, slots=SHARED_GENERATION_SLOTS, directory=PROCESS_LOCK_DIR):
+        scope = zlib.crc32((os.getenv('DATABASE_URL') or '').encode('utf-8'))
+        self.path = os.path.join(directory, f"tradingmaven-{name}-{scope:08x}.gen")
+        self.slots = slots
+        self._map = None
+        self._local = None  # Fallback counters when the file cannot be mapped
+        self._lock = threading.Lock()
+
+    def _counters(self):
+        if self._map is not None or self._local is not None:
+            return self._map if self._map is not None else self._local
+        with self._lock:
+            if self._map is None and self._local is None:
+                try:
+                    with open(self.path, 'a+b') as f:
+                        if os.fstat(f.fileno()).st_size < self.slots * COUNTER.size:
+                            os.ftruncate(f.fileno(), self.slots * COUNTER.size)
+                        self._map = mmap.mmap(f.fileno(), self.slots * COUNTER.size, access=mmap.ACCESS_WRITE)
+                except (OSError, ValueError) as e:
+                    print(f"WARNING: shared generations {self.path} unavailable ({str(e)}), invalidation stays per process")
+                    self._local = array('Q', bytes(self.slots * COUNTER.size))
+        return self._map if self._map is not None else self._local
+
+    def _slot(self, key):
+        return zlib.crc32(str(key).encode('utf-8')) % self.slots
+
+    def current(self, key):
+        """
+        Generation of a key; store it with the cached entry before loading the entry
+
+        Returns:
+            int: Counter value, changed by every bump of the key
+        """
+        counters = self._counters()
+        slot = self._slot(key)
+        if counters is self._local:
+            return counters[slot]
+        return COUNTER.unpack_from(counters, slot * COUNTER.size)[0]
+
+    def bump(self, *keys):
+        """Mark the entries cached under these keys stale in every worker on the host"""
+        counters = self._counters()
+        slots = {self._slot(key) for key in keys}
+        with self._lock:
+            if counters is self._local:
+                for slot in slots:
+                    counters[slot] += 1
+                return
+            # A fresh descriptor per bump: flock locks are shared by descriptors inherited across fork
+            with open(self.path, 'rb') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                for slot in slots:
+                    offset = slot * COUNTER.size
+                    COUNTER.pack_into(counters, offset, COUNTER.unpack_from(counters, offset)[0] + 1)